@@ -0,0 +1,152 @@
+"""
+Newsletter campaign throughput against an in-process SMTP stand-in
+Run this from the project root: python benchmarks/bench_campaign_sender.py
+
+The stand-in delays every reply by LATENCY seconds to mimic a network round
+trip, advertises PIPELINING only when asked to, and permanently rejects
+addresses containing "bounce", so the per-recipient results include failures.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py opens ./gaeinova.db, so build a scratch copy instead of touching the real one
+os.chdir(tempfile.mkdtemp(prefix="bench_campaign_"))
+
+from sqlalchemy import func, insert, select
+
+import models
+from database import Base, SessionLocal, engine
+from services.campaigns import send_campaign
+from services.smtp import SMTPConnection
+
+SUBSCRIBERS = 2000
+BOUNCE_EVERY = 50
+LATENCY = 0.002
+
+
+class SMTPStandIn:
+    def __init__(self, pipelining):
+        self.pipelining = pipelining
+        self.delivered = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._session, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _session(self, reader, writer):
+        # Replies leave in order, each LATENCY after its command arrived
+        outbox = asyncio.Queue()
+
+        async def send_replies():
+            while True:
+                due, data = await outbox.get()
+                if data is None:
+                    return
+                await asyncio.sleep(max(0, due - time.monotonic()))
+                writer.write(data)
+
+        def reply(text):
+            outbox.put_nowait((time.monotonic() + LATENCY, f"{text}\r\n".encode()))
+
+        sender = asyncio.create_task(send_replies())
+        reply("220 stand-in ESMTP")
+        recipient_ok = False
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode().strip().upper()
+                if command.startswith("EHLO"):
+                    reply("250-stand-in\r\n250-PIPELINING\r\n250 8BITMIME" if self.pipelining else "250-stand-in\r\n250 8BITMIME")
+                elif command.startswith("MAIL"):
+                    recipient_ok = False
+                    reply("250 OK")
+                elif command.startswith("RCPT"):
+                    recipient_ok = "BOUNCE" not in command
+                    reply("250 OK" if recipient_ok else "550 No such user")
+                elif command == "DATA":
+                    if not recipient_ok:
+                        reply("554 No valid recipients")
+                        continue
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    while await reader.readline() != b".\r\n":
+                        pass
+                    self.delivered += 1
+                    reply("250 Queued")
+                elif command == "RSET":
+                    reply("250 OK")
+                elif command == "QUIT":
+                    reply("221 Bye")
+                    break
+                else:
+                    reply("502 Not implemented")
+        finally:
+            outbox.put_nowait((0, None))
+            await sender
+            writer.close()
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Newsletter.__table__), [
+            {"email": f"bounce{i}@example.com" if i % BOUNCE_EVERY == 0 else f"reader{i}@example.com"}
+            for i in range(SUBSCRIBERS)
+        ])
+
+
+def new_campaign():
+    with SessionLocal() as db:
+        campaign = models.NewsletterCampaign(subject="Diwali collection is here", body="New candles, new combos.\n.\nSee you soon!")
+        db.add(campaign)
+        db.commit()
+        return campaign.id
+
+
+async def run(pipelining, connections, rate):
+    standin = SMTPStandIn(pipelining)
+    port = await standin.start()
+    campaign_id = new_campaign()
+    start = time.perf_counter()
+    await send_campaign(
+        campaign_id,
+        connection_factory=lambda: SMTPConnection(host="127.0.0.1", port=port, security="", username=""),
+        connections=connections,
+        rate=rate,
+    )
+    elapsed = time.perf_counter() - start
+    await standin.stop()
+
+    with SessionLocal() as db:
+        campaign = db.get(models.NewsletterCampaign, campaign_id)
+        recorded = db.scalar(
+            select(func.count()).select_from(models.CampaignDelivery).where(models.CampaignDelivery.campaign_id == campaign_id)
+        )
+        return campaign, recorded, standin.delivered, SUBSCRIBERS / elapsed
+
+
+if __name__ == "__main__":
+    seed()
+    print(f"🔍 Campaign to {SUBSCRIBERS} subscribers, {LATENCY * 1000:.0f} ms per SMTP round trip\n")
+    print(f"  {'pipelining':10s} {'conns':>5s} {'rate cap':>8s} {'msg/s':>8s} {'sent':>6s} {'failed':>6s} {'results':>7s} {'status':>10s}")
+    for pipelining, connections, rate in (
+        (False, 1, 0), (True, 1, 0),
+        (False, 4, 0), (True, 4, 0),
+        (True, 8, 0), (True, 8, 200),
+    ):
+        campaign, recorded, delivered, per_second = asyncio.run(run(pipelining, connections, rate))
+        cap = f"{rate:.0f}/s" if rate else "none"
+        print(f"  {str(pipelining):10s} {connections:5d} {cap:>8s} {per_second:8.0f} {campaign.sent_count:6d} "
+              f"{campaign.failed_count:6d} {recorded:7d} {campaign.status:>10s}")
+        assert delivered == campaign.sent_count
@@ -0,0 +1,133 @@
+"""
+Storefront listings from SQLite + ORM + response model against the in-memory
+catalog model in services/catalog_model.py, plus memory held per product
+Run this from the project root: python benchmarks/bench_catalog_model.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py opens ./gaeinova.db, so build a scratch copy instead of touching the real one
+os.chdir(tempfile.mkdtemp(prefix="bench_catalog_"))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert
+
+import models
+import schemas
+from database import Base, ReadSessionLocal, engine
+from services.catalog_model import CatalogModel
+
+PRODUCTS = 20000
+ITERATIONS = 300
+CATEGORIES = ["Candles", "Diya", "Gift Combos", "Lanterns", "Holders"]
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Category.__table__), [
+            {"id": i + 1, "name": name, "product_count": 0} for i, name in enumerate(CATEGORIES)
+        ])
+        conn.execute(insert(models.Product.__table__), [
+            {
+                "name": f"{'Rose' if i % 4 else 'Lavender'} Candle {i}",
+                "description": "Hand-poured soy wax candle with a cotton wick, about 40 hours of burn time.",
+                "price": 49 + (i * 37) % 1200,
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "category_id": i % len(CATEGORIES) + 1,
+                "image_url": f"/static/uploads/{i}.jpg",
+                "stock": 25,
+                "reserved": i % 3,
+                "is_available": i % 20 != 0,
+                "is_featured": i % 500 == 0,
+            }
+            for i in range(PRODUCTS)
+        ])
+
+
+def old_listing(db, params):
+    """What get_products did per request: filtered Query, ORM rows, response model, JSON."""
+    query = db.query(models.Product).filter(models.Product.is_available == True)
+    if params.get("category"):
+        category_id = db.query(models.Category.id).filter(models.Category.name == params["category"]).scalar()
+        query = query.filter(models.Product.category_id == category_id)
+    if params.get("min_price"):
+        query = query.filter(models.Product.price >= params["min_price"])
+    if params.get("max_price"):
+        query = query.filter(models.Product.price <= params["max_price"])
+    if params.get("search"):
+        query = query.filter(models.Product.name.contains(params["search"]))
+    products = query.offset(params.get("skip", 0)).limit(params.get("limit", 100)).all()
+    body = [schemas.Product.model_validate(product).model_dump(mode="json") for product in products]
+    return json.dumps(jsonable_encoder(body)).encode()
+
+
+def new_listing(catalog, db, params):
+    snapshot = catalog.ensure_fresh(db)
+    rows = snapshot.select(params.get("category"), params.get("min_price"), params.get("max_price"), params.get("search"))
+    start = params.get("skip", 0)
+    return snapshot.render(rows[start:start + params.get("limit", 100)])
+
+
+def ms_per_call(fn, params):
+    db = ReadSessionLocal()
+    try:
+        fn(db, params)
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            fn(db, params)
+            db.expunge_all()
+        return (time.perf_counter() - start) / ITERATIONS * 1000
+    finally:
+        db.close()
+
+
+def bytes_per_product():
+    db = ReadSessionLocal()
+    try:
+        tracemalloc.start()
+        products = db.query(models.Product).all()
+        orm = tracemalloc.get_traced_memory()[0] / len(products)
+        del products
+        db.expunge_all()
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        catalog = CatalogModel()
+        catalog.rebuild(db)
+        model = tracemalloc.get_traced_memory()[0] / PRODUCTS
+        tracemalloc.stop()
+        return orm, model
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    seed()
+    catalog = CatalogModel(stock_ttl=3600)
+    with ReadSessionLocal() as db:
+        catalog.rebuild(db)
+
+    print(f"🔍 {PRODUCTS} products, {ITERATIONS} requests per case (ms per listing, query to JSON bytes)\n")
+    print(f"  {'listing':36s} {'ORM':>8s} {'model':>8s} {'speedup':>8s}")
+    for label, params in (
+        ("first page", {}),
+        ("page 50", {"skip": 5000}),
+        ("category", {"category": "Diya"}),
+        ("price range, 20 per page", {"min_price": 200, "max_price": 400, "limit": 20}),
+        ("search 'lavender'", {"search": "lavender"}),
+        ("search + category, no hits", {"search": "zzz", "category": "Diya"}),
+    ):
+        before = ms_per_call(old_listing, params)
+        after = ms_per_call(lambda db, p: new_listing(catalog, db, p), params)
+        assert json.loads(old_listing(ReadSessionLocal(), params)) == json.loads(new_listing(catalog, None, params))
+        print(f"  {label:36s} {before:8.2f} {after:8.2f} {before / after:7.0f}x")
+
+    orm, model = bytes_per_product()
+    print(f"\nMemory per product: ORM instance {orm:.0f} B, catalog model {model:.0f} B ({model / orm:.0%})")
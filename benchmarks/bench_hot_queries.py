@@ -0,0 +1,108 @@
+"""
+Per-call CPU of the hottest lookups: the old ad-hoc Query objects against the
+cached lambda statements in services/hot_queries.py
+Run this from the project root: python benchmarks/bench_hot_queries.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py opens ./gaeinova.db, so build a scratch copy instead of touching the real one
+os.chdir(tempfile.mkdtemp(prefix="bench_hot_"))
+
+import models
+from database import Base, SessionLocal, engine
+from services import hot_queries
+
+ITERATIONS = 5000
+CART_LINES = 5
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(models.User(email="bench@example.com", username="bench", hashed_password="x"))
+        db.add_all(models.Product(name=f"Candle {i}", price=99, stock=100, reserved=0) for i in range(100))
+        db.flush()
+        db.add_all(models.CartItem(user_id=1, product_id=i + 1, quantity=1) for i in range(CART_LINES))
+        db.commit()
+
+
+def old_product(db, n):
+    return db.query(models.Product).filter(models.Product.id == n % 100 + 1).first()
+
+
+def old_user(db, n):
+    return db.query(models.User).filter(models.User.username == "bench").first()
+
+
+def old_cart(db, n):
+    items = db.query(models.CartItem).filter(models.CartItem.user_id == 1).all()
+    # The response model touches every line's product
+    return [item.product for item in items]
+
+
+def old_cart_item(db, n):
+    return db.query(models.CartItem).filter(models.CartItem.id == n % CART_LINES + 1, models.CartItem.user_id == 1).first()
+
+
+def new_product(db, n):
+    return hot_queries.product_by_id(db, n % 100 + 1)
+
+
+def new_user(db, n):
+    return hot_queries.user_by_username(db, "bench")
+
+
+def new_cart(db, n):
+    return [item.product for item in hot_queries.cart_items_for_user(db, 1)]
+
+
+def new_cart_item(db, n):
+    return hot_queries.cart_item_for_user(db, n % CART_LINES + 1, 1)
+
+
+def cpu_us(fn):
+    db = SessionLocal()
+    try:
+        for n in range(200):
+            fn(db, n)
+            db.expunge_all()
+        start = time.process_time()
+        for n in range(ITERATIONS):
+            fn(db, n)
+            # A fresh request session starts with an empty identity map
+            db.expunge_all()
+        return (time.process_time() - start) / ITERATIONS * 1e6
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    seed()
+    print(f"🔍 CPU per lookup, {ITERATIONS} calls each (µs)\n")
+    print(f"  {'lookup':34s} {'Query':>8s} {'lambda':>8s} {'saved':>7s}")
+    results = {}
+    for label, old, new in (
+        ("product by id", old_product, new_product),
+        ("user by username (every auth)", old_user, new_user),
+        (f"cart by user ({CART_LINES} lines + products)", old_cart, new_cart),
+        ("cart line by id + user", old_cart_item, new_cart_item),
+    ):
+        before, after = cpu_us(old), cpu_us(new)
+        results[label] = (before, after)
+        print(f"  {label:34s} {before:8.1f} {after:8.1f} {1 - after / before:6.0%}")
+
+    print("\nPer request, lookups only:")
+    for endpoint, lookups in (
+        ("GET /api/products/{id}", ["product by id"]),
+        ("GET /api/cart", ["user by username (every auth)", f"cart by user ({CART_LINES} lines + products)"]),
+        ("POST /api/cart", ["user by username (every auth)", "product by id"]),
+        ("PUT /api/cart/{id}", ["user by username (every auth)", "cart line by id + user"]),
+    ):
+        before = sum(results[name][0] for name in lookups)
+        after = sum(results[name][1] for name in lookups)
+        print(f"  {endpoint:24s} {before:8.1f} -> {after:6.1f} µs  ({before - after:5.1f} µs saved)")
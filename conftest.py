@@ -0,0 +1,58 @@
+"""
+Shared pytest fixtures: one app on a scratch database for the whole run
+"""
+import os
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(scope="session")
+def app_dir(tmp_path_factory):
+    # database.py opens ./gaeinova.db and main.py mounts ./static and ./frontend,
+    # so run against a scratch database next to links to the real directories
+    path = tmp_path_factory.mktemp("app")
+    for directory in ("static", "frontend"):
+        os.symlink(os.path.join(ROOT, directory), path / directory)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(path)
+        monkeypatch.syspath_prepend(ROOT)
+        yield path
+
+
+@pytest.fixture(scope="session")
+def client(app_dir):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # Startup seeds the admin user, so the app is started once per run
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    response = client.post("/api/login", json={
+        "username": os.getenv("ADMIN_USERNAME", "admin"),
+        "password": os.getenv("ADMIN_PASSWORD", "change_this_password"),
+    })
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def product_id(client):
+    """A fresh product with 10 in stock, so tests don't share stock."""
+    import models
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        product = models.Product(
+            name=f"Test Candle {uuid.uuid4().hex[:8]}", description="Soy wax", category="Candles",
+            price=100, stock=10, is_available=True,
+        )
+        db.add(product)
+        db.commit()
+        return product.id
@@ -1,14 +1,47 @@
 # database.py
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./gaeinova.db"
 
+# SQLite allows one writer at a time, so writers get a small pool of their own and
+# catalog reads can't be starved of connections by checkouts queued on the write lock
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=int(os.getenv("DB_WRITE_POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("DB_WRITE_MAX_OVERFLOW", "10")),
+)
+
+read_engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=int(os.getenv("DB_READ_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("DB_READ_MAX_OVERFLOW", "20")),
 )
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # Only takes effect on a brand-new file (before WAL writes the header); existing
+    # files are switched once with POST /api/admin/maintenance/vacuum
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets readers run alongside a writer; the maintenance job checkpoints it
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+@event.listens_for(read_engine, "connect")
+def set_read_only_pragmas(dbapi_connection, connection_record):
+    # Any write through the read path fails instead of taking the write lock
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -17,4 +50,11 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
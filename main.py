@@ -12,9 +12,22 @@ from sqlalchemy import inspect
 import os
 import hashlib
 
-from database import engine, get_db, Base
+from database import engine, get_db, get_read_db, Base
+from migrations import run_migrations
 import models
 import schemas
+from services.admission import AdmissionControlMiddleware
+from services.idempotency import IdempotencyMiddleware
+from services.write_buffer import start_write_buffers, stop_write_buffers
+from services.categories import set_product_category
+from services.scheduler import scheduler
+from services.maintenance import AUTO_VACUUM_OFF, auto_vacuum_enabled, register_maintenance_jobs
+from services.suggest_index import suggest_index
+from services.catalog_model import catalog_model
+from services.hot_queries import user_by_username
+from services.campaigns import stop_campaigns
+from services.outbox import outbox_worker
+from services.order_side_effects import register_order_handlers
 
 # Create tables
 # --- Create DB and ensure all tables exist ---
@@ -27,9 +40,18 @@ else:
 # Always ensure all tables exist (creates missing ones, doesn't touch existing)
 Base.metadata.create_all(bind=engine)
 print("✅ All database tables verified/created.")
+# New columns / indexes / backfills on existing databases
+run_migrations(engine)
+if not auto_vacuum_enabled():
+    print(f"⚠ {AUTO_VACUUM_OFF}")
 
 app = FastAPI(title="Gaeinova Magic API")
 
+# Idempotency-Key replay for POSTs; added first so it runs inside admission control
+app.add_middleware(IdempotencyMiddleware)
+# Concurrency budgets per traffic class; sheds with 503 + Retry-After under load
+app.add_middleware(AdmissionControlMiddleware)
+
 # Create directories
 os.makedirs("static", exist_ok=True)
 os.makedirs("static/uploads", exist_ok=True)
@@ -82,7 +104,7 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -91,11 +113,12 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        # Scoped tokens (order stream tickets) are not access tokens
+        if username is None or payload.get("scope") is not None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = user_by_username(db, username)
     if user is None:
         raise credentials_exception
     return user
@@ -209,19 +232,40 @@ async def startup_event():
         ]
         
         for product_data in demo_products:
+            category_name = product_data.pop("category")
             product = models.Product(**product_data)
+            set_product_category(db, product, category_name)
             db.add(product)
         db.commit()
     
+    # Warm the autocomplete index and catalog model so the first request doesn't pay for the build
+    suggest_index.rebuild(db)
+    catalog_model.rebuild(db)
     db.close()
+    start_write_buffers()
+    register_order_handlers()
+    outbox_worker.start()
+    register_maintenance_jobs()
+    scheduler.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Flush buffered contact messages / newsletter signups before exiting
+    stop_write_buffers()
+    scheduler.stop()
+    outbox_worker.stop()
+    # Running campaigns are marked paused and resume from their last checkpoint
+    stop_campaigns()
 
 # Include routes
-from routes import products, users, cart, orders
+from routes import products, users, cart, orders, admin, campaigns
 
 app.include_router(products.router, prefix="/api", tags=["products"])
 app.include_router(users.router, prefix="/api", tags=["users"])
 app.include_router(cart.router, prefix="/api", tags=["cart"])
 app.include_router(orders.router, prefix="/api", tags=["orders"])
+app.include_router(admin.router, prefix="/api", tags=["admin"])
+app.include_router(campaigns.router, prefix="/api", tags=["campaigns"])
 
 # Frontend routes
 @app.get("/")
@@ -0,0 +1,205 @@
+# migrations.py
+# Base.metadata.create_all only creates missing tables, so new columns, indexes
+# and backfills on existing databases go here. Each migration runs once.
+import os
+import re
+from sqlalchemy import inspect, text
+from datetime import datetime, timezone
+
+# How long a worker waits for another worker's migrations to finish at startup
+MIGRATION_LOCK_TIMEOUT = int(os.getenv("MIGRATION_LOCK_TIMEOUT", "300"))
+
+MIGRATIONS = []
+
+def migration(name):
+    def register(fn):
+        MIGRATIONS.append((name, fn))
+        return fn
+    return register
+
+def add_column(conn, table, column, ddl):
+    columns = {col["name"] for col in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def run_migrations(engine):
+    # Reading the applied set, running and recording all happen in one BEGIN IMMEDIATE
+    # transaction. Workers starting together queue on the write lock and then find
+    # nothing left to do. pysqlite would otherwise autocommit DDL, so this is also
+    # what rolls back a migration that fails partway.
+    ran = []
+    with engine.connect() as conn:
+        busy_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {MIGRATION_LOCK_TIMEOUT * 1000}")
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR PRIMARY KEY, applied_at DATETIME)"
+                ))
+                applied = {row[0] for row in conn.execute(text("SELECT name FROM schema_migrations"))}
+                for name, fn in MIGRATIONS:
+                    if name in applied:
+                        continue
+                    fn(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :applied_at)"),
+                        {"name": name, "applied_at": datetime.now(timezone.utc)}
+                    )
+                    ran.append(name)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        finally:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+    
+    for name in ran:
+        print(f"✅ Applied migration: {name}")
+
+@migration("0001_product_category_fk")
+def product_category_fk(conn):
+    add_column(conn, "products", "category_id", "INTEGER REFERENCES categories (id)")
+    add_column(conn, "categories", "product_count", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id)"))
+    
+    # Every free-text category gets a Category row, then products point at it
+    conn.execute(text("""
+        INSERT INTO categories (name, created_at, product_count)
+        SELECT DISTINCT category, :now, 0 FROM products
+        WHERE category IS NOT NULL AND category != ''
+          AND NOT EXISTS (SELECT 1 FROM categories WHERE categories.name = products.category)
+    """), {"now": datetime.now(timezone.utc)})
+    conn.execute(text("""
+        UPDATE products SET category_id = (
+            SELECT categories.id FROM categories WHERE categories.name = products.category
+        )
+        WHERE category_id IS NULL
+    """))
+    conn.execute(text("""
+        UPDATE categories SET product_count = (
+            SELECT COUNT(*) FROM products WHERE products.category_id = categories.id
+        )
+    """))
+
+@migration("0002_product_reserved_stock")
+def product_reserved_stock(conn):
+    # stock_reservations itself is created by create_all; holds start empty
+    add_column(conn, "products", "reserved", "INTEGER NOT NULL DEFAULT 0")
+
+@migration("0003_cart_items_updated_at")
+def cart_items_updated_at(conn):
+    add_column(conn, "cart_items", "updated_at", "DATETIME")
+    conn.execute(text("UPDATE cart_items SET updated_at = created_at WHERE updated_at IS NULL"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cart_items_updated_at ON cart_items (updated_at)"))
+
+@migration("0004_incremental_auto_vacuum")
+def incremental_auto_vacuum(conn):
+    # auto_vacuum can only be switched by rebuilding the file with a full VACUUM,
+    # which locks and rewrites the whole database, so it is not done at startup.
+    # Recording this changes nothing: startup and the incremental_vacuum job keep
+    # reporting it until POST /api/admin/maintenance/vacuum has been run
+    pass
+
+@migration("0005_order_archival_indexes")
+def order_archival_indexes(conn):
+    # The archive tables themselves are created by create_all
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_status_created_at ON orders (status, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders (user_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)"))
+
+@migration("0006_cart_items_unique_line")
+def cart_items_unique_line(conn):
+    # Fold any duplicate lines into the oldest one before enforcing uniqueness
+    conn.execute(text("""
+        UPDATE cart_items SET quantity = (
+            SELECT SUM(c2.quantity) FROM cart_items c2
+            WHERE c2.user_id = cart_items.user_id AND c2.product_id = cart_items.product_id
+        )
+        WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1)
+    """))
+    conn.execute(text("""
+        DELETE FROM cart_items
+        WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id)
+    """))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_user_product ON cart_items (user_id, product_id)"
+    ))
+
+@migration("0007_order_history_summaries")
+def order_history_summaries(conn):
+    for table, items in (("orders", "order_items"), ("orders_archive", "order_items_archive")):
+        add_column(conn, table, "item_count", "INTEGER NOT NULL DEFAULT 0")
+        conn.execute(text(f"""
+            UPDATE {table} SET item_count = (
+                SELECT COALESCE(SUM(quantity), 0) FROM {items} WHERE {items}.order_id = {table}.id
+            )
+        """))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_user_history "
+            f"ON {table} (user_id, id, created_at, status, total_amount, item_count)"
+        ))
+    
+    add_column(conn, "users", "order_count", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "users", "total_spent", "FLOAT NOT NULL DEFAULT 0")
+    conn.execute(text("""
+        UPDATE users SET
+            order_count = (SELECT COUNT(*) FROM orders WHERE orders.user_id = users.id)
+                        + (SELECT COUNT(*) FROM orders_archive WHERE orders_archive.user_id = users.id),
+            total_spent = (SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE orders.user_id = users.id)
+                        + (SELECT COALESCE(SUM(total_amount), 0) FROM orders_archive WHERE orders_archive.user_id = users.id)
+    """))
+
+@migration("0008_newsletter_lowercase_emails")
+def newsletter_lowercase_emails(conn):
+    # Signups are stored lowercased now; fold older mixed-case duplicates into the first one
+    conn.execute(text("""
+        DELETE FROM newsletter
+        WHERE id NOT IN (SELECT MIN(id) FROM newsletter GROUP BY lower(email))
+    """))
+    conn.execute(text("UPDATE newsletter SET email = lower(email) WHERE email != lower(email)"))
+
+def rebuild_with_autoincrement(conn, table):
+    """Recreate an id-keyed table as INTEGER PRIMARY KEY AUTOINCREMENT, keeping rows and indexes."""
+    sql = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table}
+    ).scalar()
+    if "AUTOINCREMENT" in sql.upper():
+        return
+    # create_all writes "id INTEGER NOT NULL, ..., PRIMARY KEY (id)"; move the key onto the column
+    new_sql, columns_moved = re.subn(r"\bid INTEGER NOT NULL\b", "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT", sql, count=1)
+    new_sql, keys_dropped = re.subn(r",\s*PRIMARY KEY \(id\)", "", new_sql, count=1)
+    if not (columns_moved and keys_dropped):
+        raise RuntimeError(f"Unexpected schema for {table}, rebuild it by hand: {sql}")
+    new_sql = re.sub(rf"^CREATE TABLE \"?{table}\"?", f"CREATE TABLE {table}_rebuild", new_sql, count=1)
+    
+    indexes = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"),
+        {"name": table}
+    ).scalars().all()
+    columns = ", ".join(col["name"] for col in inspect(conn).get_columns(table))
+    conn.execute(text(new_sql))
+    conn.execute(text(f"INSERT INTO {table}_rebuild ({columns}) SELECT {columns} FROM {table}"))
+    conn.execute(text(f"DROP TABLE {table}"))
+    conn.execute(text(f"ALTER TABLE {table}_rebuild RENAME TO {table}"))
+    for index_sql in indexes:
+        conn.execute(text(index_sql))
+
+def seed_sequence(conn, table, archive):
+    """Start `table`'s AUTOINCREMENT counter after every id it or its archive has used."""
+    seq = conn.execute(text(
+        f"SELECT MAX(COALESCE((SELECT MAX(id) FROM {table}), 0), COALESCE((SELECT MAX(id) FROM {archive}), 0))"
+    )).scalar()
+    current = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {"name": table}).scalar()
+    if current is None:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": table, "seq": seq})
+    elif current < seq:
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :name"), {"name": table, "seq": seq})
+
+@migration("0009_order_ids_autoincrement")
+def order_ids_autoincrement(conn):
+    # Without AUTOINCREMENT SQLite reuses max(id) + 1, so once archival moved the
+    # newest orders out, new orders got ids that already exist in the archive
+    for table, archive in (("orders", "orders_archive"), ("order_items", "order_items_archive")):
+        rebuild_with_autoincrement(conn, table)
+        seed_sequence(conn, table, archive)
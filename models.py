@@ -1,6 +1,6 @@
 # models.py
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, LargeBinary, String, Float, DateTime, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from database import Base
@@ -17,6 +17,9 @@ class User(Base):
     phone = Column(String)
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    # Lifetime totals over every order placed, bumped by create_order
+    order_count = Column(Integer, nullable=False, default=0)
+    total_spent = Column(Float, nullable=False, default=0)
     
     orders = relationship("Order", back_populates="user")
     cart_items = relationship("CartItem", back_populates="user")
@@ -28,49 +31,87 @@ class Product(Base):
     name = Column(String, index=True)
     description = Column(Text)
     price = Column(Float)
-    category = Column(String)
+    category = Column(String)  # denormalized name, kept in sync with category_id
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     image_url = Column(String)
     stock = Column(Integer, default=0)
+    reserved = Column(Integer, default=0, nullable=False)  # units held in carts, see StockReservation
     is_available = Column(Boolean, default=True)
     is_featured = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     
     cart_items = relationship("CartItem", back_populates="product")
     order_items = relationship("OrderItem", back_populates="product")
+    category_ref = relationship("Category", back_populates="products")
+    
+    @property
+    def available(self):
+        return max(0, (self.stock or 0) - (self.reserved or 0))
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    # One line per product per user, so guest carts can be merged with an upsert
+    __table_args__ = (Index("uq_cart_items_user_product", "user_id", "product_id", unique=True),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, default=1)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    # Last time the shopper touched this line; old ones are purged as abandoned
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True
+    )
     
     user = relationship("User", back_populates="cart_items")
     product = relationship("Product", back_populates="cart_items")
 
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+    __table_args__ = (UniqueConstraint("user_id", "product_id", name="uq_stock_reservations_user_product"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
 class Order(Base):
     __tablename__ = "orders"
+    # Lets the archival job find finished orders without scanning the table; the
+    # second covers order-history summaries, so they never touch the table itself.
+    # AUTOINCREMENT: archiving the newest orders must not hand their ids out again
+    __table_args__ = (
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_user_history", "user_id", "id", "created_at", "status", "total_amount", "item_count"),
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     total_amount = Column(Float)
     status = Column(String, default="pending")
     payment_method = Column(String)
     payment_status = Column(String, default="pending")
     shipping_address = Column(Text)
     phone = Column(String)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Units across all lines, so history lists don't have to load items
+    item_count = Column(Integer, nullable=False, default=0)
     
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer)
     price = Column(Float)
@@ -78,6 +119,56 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
 
+# Cold storage for finished orders, moved out of orders / order_items by the
+# archival job. Rows keep their original ids.
+class ArchivedOrder(Base):
+    __tablename__ = "orders_archive"
+    __table_args__ = (
+        Index("ix_orders_archive_user_history", "user_id", "id", "created_at", "status", "total_amount", "item_count"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    total_amount = Column(Float)
+    status = Column(String)
+    payment_method = Column(String)
+    payment_status = Column(String)
+    shipping_address = Column(Text)
+    phone = Column(String)
+    created_at = Column(DateTime, index=True)
+    item_count = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    items = relationship("ArchivedOrderItem", back_populates="order")
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+    
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    quantity = Column(Integer)
+    price = Column(Float)
+    
+    order = relationship("ArchivedOrder", back_populates="items")
+    product = relationship("Product")
+
+class ProductCoPurchase(Base):
+    __tablename__ = "product_co_purchases"
+    
+    # How many orders contained both products; rebuilt and pruned to the top K per product
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    related_product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class CoPurchaseOrder(Base):
+    __tablename__ = "co_purchase_orders"
+    
+    # Orders whose pairs checkout already counted, written in the same transaction
+    # as the counts, so a redelivered order_created event is skipped
+    order_id = Column(Integer, primary_key=True)
+    counted_at = Column(DateTime, nullable=False, index=True)
+
 class Newsletter(Base):
     __tablename__ = "newsletter"
     
@@ -85,6 +176,39 @@ class Newsletter(Base):
     email = Column(String, unique=True, index=True)
     subscribed_at = Column(DateTime, default=datetime.now(timezone.utc))
 
+class NewsletterCampaign(Base):
+    __tablename__ = "newsletter_campaigns"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, default="draft", nullable=False)  # draft, sending, paused, completed, failed
+    # Checkpoint: subscribers are sent in id order, everything up to here is done
+    last_subscriber_id = Column(Integer, default=0, nullable=False)
+    total_recipients = Column(Integer, default=0, nullable=False)
+    sent_count = Column(Integer, default=0, nullable=False)
+    failed_count = Column(Integer, default=0, nullable=False)
+    messages_per_second = Column(Float)
+    error = Column(Text)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # Bumped at every checkpoint; a "sending" campaign with an old heartbeat lost its worker
+    heartbeat_at = Column(DateTime)
+
+class CampaignDelivery(Base):
+    __tablename__ = "campaign_deliveries"
+    __table_args__ = (UniqueConstraint("campaign_id", "subscriber_id", name="uq_campaign_deliveries_campaign_subscriber"),)
+    
+    id = Column(Integer, primary_key=True)
+    campaign_id = Column(Integer, ForeignKey("newsletter_campaigns.id"), nullable=False)
+    subscriber_id = Column(Integer, nullable=False)
+    email = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # sent, failed
+    attempts = Column(Integer, default=1, nullable=False)
+    error = Column(Text)
+    sent_at = Column(DateTime)
+
 class ContactMessage(Base):
     __tablename__ = "contact_messages"
     
@@ -100,4 +224,78 @@ class Category(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
\ No newline at end of file
+    product_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    
+    products = relationship("Product", back_populates="category_ref")
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("scope", "key", name="uq_idempotency_keys_scope_key"),)
+    
+    id = Column(Integer, primary_key=True)
+    # Hash of the caller's credentials, so keys from different users never collide
+    scope = Column(String(32), nullable=False)
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(32), nullable=False)
+    # NULL while the first request is still executing
+    status_code = Column(Integer)
+    headers = Column(Text)
+    body = Column(LargeBinary)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class OrderEvent(Base):
+    __tablename__ = "order_events"
+    # The id is the SSE event id; AUTOINCREMENT keeps it from going back after a purge
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String, nullable=False)
+    order_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON order summary
+    created_at = Column(DateTime, nullable=False, index=True)
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    # The worker polls for due pending events
+    __table_args__ = (Index("ix_outbox_events_status_available_at", "status", "available_at"),)
+    
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String, default="pending", nullable=False)  # pending, done, dead
+    attempts = Column(Integer, default=0, nullable=False)
+    # Comma-separated handler names that already succeeded; retries skip them
+    completed_handlers = Column(Text)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    available_at = Column(DateTime, nullable=False)
+    locked_by = Column(String)
+    locked_until = Column(DateTime)
+    processed_at = Column(DateTime, index=True)
+
+class ScheduledJob(Base):
+    __tablename__ = "scheduled_jobs"
+    
+    # One row per job; the lease columns make sure only one worker runs it at a time
+    name = Column(String, primary_key=True)
+    owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    last_started_at = Column(DateTime)
+    last_finished_at = Column(DateTime)
+    last_duration_ms = Column(Float)
+    last_rows_affected = Column(Integer)
+    last_status = Column(String)
+    last_error = Column(Text)
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String, index=True)
+    started_at = Column(DateTime, index=True)
+    duration_ms = Column(Float)
+    rows_affected = Column(Integer)
+    status = Column(String)
+    error = Column(Text)
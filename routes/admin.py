@@ -0,0 +1,152 @@
+# routes/admin.py
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+import models
+from main import get_current_user
+from services.admission import admission_controller
+from services.write_buffer import contact_buffer, newsletter_buffer
+from services.scheduler import scheduler
+from services.maintenance import enable_incremental_vacuum
+from services.backup import list_backups
+from services.profiler import PROFILE_MAX_SECONDS, ProfilerBusy, profile
+from services.outbox import outbox_worker, retry_dead_events
+from services.sales_snapshot import GROUP_BY, SORT_BY, SnapshotMissing, sales_report
+
+router = APIRouter()
+
+@router.get("/admin/admission")
+def get_admission_stats(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return admission_controller.stats()
+
+@router.get("/admin/write-buffers")
+def get_write_buffer_stats(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return {
+        "contact_messages": contact_buffer.stats(),
+        "newsletter": newsletter_buffer.stats(),
+    }
+
+@router.get("/admin/maintenance/jobs")
+def get_maintenance_jobs(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return scheduler.status()
+
+@router.post("/admin/maintenance/jobs/{job_name}/run")
+def run_maintenance_job(job_name: str, current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if job_name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    run = scheduler.run_job(job_name, force=True)
+    if run is None:
+        raise HTTPException(status_code=409, detail="Job is already running on another worker")
+    return run
+
+@router.post("/admin/maintenance/vacuum")
+def vacuum_database(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # One-off: rewrites the whole file under an exclusive lock, writers wait until it is done
+    return enable_incremental_vacuum()
+
+@router.get("/admin/outbox")
+def get_outbox_stats(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return outbox_worker.stats()
+
+@router.post("/admin/outbox/retry-dead")
+def retry_dead_outbox_events(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return {"requeued": retry_dead_events()}
+
+@router.get("/admin/profile")
+def profile_worker(
+    seconds: float = 5,
+    interval_ms: float = 10,
+    include_idle: bool = False,
+    top: int = 30,
+    format: str = "json",
+    current_user: models.User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}")
+    if format not in ("json", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be json or collapsed")
+    
+    # Samples the worker that serves this request; with several workers, repeat to cover the others
+    try:
+        result = profile(seconds, interval_ms / 1000, include_idle, max(1, min(top, 100)))
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    if format == "collapsed":
+        # Feed straight into flamegraph.pl or speedscope
+        return PlainTextResponse(result["collapsed"] + "\n")
+    return result
+
+@router.get("/admin/backups")
+def get_backups(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return list_backups()
+
+@router.post("/admin/backups")
+def create_backup(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # Goes through the scheduler lease so it never overlaps a scheduled backup
+    run = scheduler.run_job("online_backup", force=True)
+    if run is None:
+        raise HTTPException(status_code=409, detail="A backup is already running")
+    if run["status"] != "ok":
+        raise HTTPException(status_code=500, detail=f"Backup failed: {run['error']}")
+    return list_backups()[0]
+
+@router.get("/admin/reports")
+def get_sales_report(
+    group_by: str = "none",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    status: Optional[str] = None,
+    category_id: Optional[int] = None,
+    sort: str = "revenue",
+    limit: int = 20,
+    current_user: models.User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(GROUP_BY)}")
+    if sort not in SORT_BY:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SORT_BY)}")
+    
+    # Comma-separated; by default every status except cancelled
+    statuses = [s.strip() for s in status.split(",") if s.strip()] if status else None
+    try:
+        return sales_report(group_by, start, end, statuses, category_id, sort, max(1, min(limit, 500)))
+    except SnapshotMissing:
+        raise HTTPException(
+            status_code=503,
+            detail="Sales snapshot not built yet, run the sales_snapshot maintenance job"
+        )
@@ -0,0 +1,83 @@
+# routes/campaigns.py
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import models, schemas
+from database import get_db, get_read_db
+from main import get_current_user
+from services.campaigns import CampaignBusy, pause_campaign, start_campaign
+
+router = APIRouter()
+
+def _get_campaign(db, campaign_id):
+    campaign = db.get(models.NewsletterCampaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+@router.post("/admin/campaigns", response_model=schemas.Campaign)
+def create_campaign(
+    campaign: schemas.CampaignCreate,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    db_campaign = models.NewsletterCampaign(subject=campaign.subject, body=campaign.body)
+    db.add(db_campaign)
+    db.commit()
+    db.refresh(db_campaign)
+    return db_campaign
+
+@router.get("/admin/campaigns", response_model=List[schemas.Campaign])
+def get_campaigns(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return db.query(models.NewsletterCampaign).order_by(models.NewsletterCampaign.id.desc()).all()
+
+@router.get("/admin/campaigns/{campaign_id}", response_model=schemas.Campaign)
+def get_campaign(campaign_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return _get_campaign(db, campaign_id)
+
+@router.post("/admin/campaigns/{campaign_id}/send")
+async def send_newsletter_campaign(campaign_id: int, current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # Async so the sender task lands on the server's event loop; it resumes from the checkpoint
+    try:
+        await start_campaign(campaign_id)
+    except CampaignBusy:
+        raise HTTPException(status_code=409, detail="Campaign is already sending, completed or missing")
+    return {"message": "Campaign sending started", "campaign_id": campaign_id}
+
+@router.post("/admin/campaigns/{campaign_id}/pause", response_model=schemas.Campaign)
+def pause_newsletter_campaign(campaign_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if not pause_campaign(campaign_id):
+        raise HTTPException(status_code=409, detail="Campaign is not sending")
+    return _get_campaign(db, campaign_id)
+
+@router.get("/admin/campaigns/{campaign_id}/deliveries", response_model=List[schemas.CampaignDelivery])
+def get_campaign_deliveries(
+    campaign_id: int,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    query = db.query(models.CampaignDelivery).filter(models.CampaignDelivery.campaign_id == campaign_id)
+    if status:
+        query = query.filter(models.CampaignDelivery.status == status)
+    return query.order_by(models.CampaignDelivery.subscriber_id).offset(skip).limit(min(limit, 1000)).all()
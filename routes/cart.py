@@ -1,22 +1,106 @@
 # routes/cart.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from main import get_current_user
+from services.reservations import hold_stock, set_hold, release_holds
+from services.hot_queries import cart_item_for_user, cart_items_for_user, cart_line, product_by_id
+from services.guest_cart import (
+    GUEST_CART_COOKIE, GUEST_CART_MAX_LINES, GUEST_CART_MAX_QUANTITY, GUEST_CART_TTL_DAYS,
+    decode_cart, encode_cart
+)
 
 router = APIRouter()
 
+# Guest cart: the cart is the signed cookie itself; these endpoints only read products
+def _guest_cart_items(db, lines):
+    if not lines:
+        return []
+    products = {
+        product.id: product
+        for product in db.query(models.Product).filter(models.Product.id.in_(list(lines))).all()
+    }
+    return [
+        {"product_id": pid, "quantity": quantity, "product": products[pid]}
+        for pid, quantity in lines.items() if pid in products
+    ]
+
+def _save_guest_cart(response, lines):
+    if lines:
+        response.set_cookie(
+            GUEST_CART_COOKIE, encode_cart(lines),
+            max_age=GUEST_CART_TTL_DAYS * 86400, httponly=True, samesite="lax"
+        )
+    else:
+        response.delete_cookie(GUEST_CART_COOKIE)
+
+def _check_guest_quantity(db, product_id, quantity):
+    product = db.query(models.Product).filter(
+        models.Product.id == product_id,
+        models.Product.is_available == True
+    ).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if quantity > GUEST_CART_MAX_QUANTITY or quantity > product.available:
+        raise HTTPException(status_code=400, detail="Insufficient stock")
+
+@router.get("/cart/guest", response_model=List[schemas.GuestCartItem])
+def get_guest_cart(guest_cart: Optional[str] = Cookie(None), db: Session = Depends(get_read_db)):
+    return _guest_cart_items(db, decode_cart(guest_cart))
+
+@router.post("/cart/guest", response_model=List[schemas.GuestCartItem])
+def add_to_guest_cart(
+    item: schemas.CartItemCreate,
+    response: Response,
+    guest_cart: Optional[str] = Cookie(None),
+    db: Session = Depends(get_read_db)
+):
+    if item.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    
+    lines = decode_cart(guest_cart)
+    if item.product_id not in lines and len(lines) >= GUEST_CART_MAX_LINES:
+        raise HTTPException(status_code=400, detail="Cart is full")
+    
+    quantity = lines.get(item.product_id, 0) + item.quantity
+    _check_guest_quantity(db, item.product_id, quantity)
+    lines[item.product_id] = quantity
+    _save_guest_cart(response, lines)
+    return _guest_cart_items(db, lines)
+
+@router.put("/cart/guest/{product_id}", response_model=List[schemas.GuestCartItem])
+def update_guest_cart_item(
+    product_id: int,
+    quantity: int,
+    response: Response,
+    guest_cart: Optional[str] = Cookie(None),
+    db: Session = Depends(get_read_db)
+):
+    lines = decode_cart(guest_cart)
+    if product_id not in lines:
+        raise HTTPException(status_code=404, detail="Cart item not found")
+    
+    if quantity <= 0:
+        del lines[product_id]
+    else:
+        _check_guest_quantity(db, product_id, quantity)
+        lines[product_id] = quantity
+    _save_guest_cart(response, lines)
+    return _guest_cart_items(db, lines)
+
+@router.delete("/cart/guest")
+def clear_guest_cart(response: Response):
+    response.delete_cookie(GUEST_CART_COOKIE)
+    return {"message": "Cart cleared"}
+
 @router.get("/cart", response_model=List[schemas.CartItem])
 def get_cart(
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    cart_items = db.query(models.CartItem).filter(
-        models.CartItem.user_id == current_user.id
-    ).all()
-    return cart_items
+    return cart_items_for_user(db, current_user.id)
 
 @router.post("/cart", response_model=schemas.CartItem)
 def add_to_cart(
@@ -24,19 +108,21 @@ def add_to_cart(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    if item.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    
     # Check if product exists
-    product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
+    product = product_by_id(db, item.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    if product.stock < item.quantity:
+    # Hold the units now so they can't be sold to someone else while in the cart
+    if not hold_stock(db, current_user.id, item.product_id, item.quantity):
+        db.rollback()
         raise HTTPException(status_code=400, detail="Insufficient stock")
     
     # Check if item already in cart
-    existing_item = db.query(models.CartItem).filter(
-        models.CartItem.user_id == current_user.id,
-        models.CartItem.product_id == item.product_id
-    ).first()
+    existing_item = cart_line(db, current_user.id, item.product_id)
     
     if existing_item:
         existing_item.quantity += item.quantity
@@ -62,21 +148,20 @@ def update_cart_item(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    cart_item = db.query(models.CartItem).filter(
-        models.CartItem.id == cart_item_id,
-        models.CartItem.user_id == current_user.id
-    ).first()
+    cart_item = cart_item_for_user(db, cart_item_id, current_user.id)
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
     if quantity <= 0:
+        release_holds(db, current_user.id, cart_item.product_id)
         db.delete(cart_item)
         db.commit()
         return cart_item
     
-    product = db.query(models.Product).filter(models.Product.id == cart_item.product_id).first()
-    if product.stock < quantity:
+    # Re-hold the new quantity; rolling back restores the previous hold
+    if not set_hold(db, current_user.id, cart_item.product_id, quantity):
+        db.rollback()
         raise HTTPException(status_code=400, detail="Insufficient stock")
     
     cart_item.quantity = quantity
@@ -90,14 +175,12 @@ def delete_cart_item(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    cart_item = db.query(models.CartItem).filter(
-        models.CartItem.id == cart_item_id,
-        models.CartItem.user_id == current_user.id
-    ).first()
+    cart_item = cart_item_for_user(db, cart_item_id, current_user.id)
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
+    release_holds(db, current_user.id, cart_item.product_id)
     db.delete(cart_item)
     db.commit()
     return {"message": "Item removed from cart"}
@@ -107,6 +190,7 @@ def clear_cart(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    release_holds(db, current_user.id)
     db.query(models.CartItem).filter(
         models.CartItem.user_id == current_user.id
     ).delete()
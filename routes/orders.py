@@ -1,13 +1,41 @@
 # routes/orders.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, union_all, update
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
+from datetime import datetime, date, timedelta
+import asyncio
+import csv
+import io
+import json
 import models, schemas
-from database import get_db
-from main import get_current_user
+from database import get_db, get_read_db, ReadSessionLocal
+from jose import JWTError, jwt
+from main import get_current_user, SECRET_KEY, ALGORITHM
+from services.hot_queries import user_by_username
+from services.reservations import release_holds, take_stock
+from services.outbox import enqueue, outbox_worker
+from services.order_events import order_events, order_summary, TooManySubscribers, ORDER_STREAM_POLL_SECONDS
 
 router = APIRouter()
 
+# Allowed status changes for bulk updates; delivered and cancelled are final
+ORDER_STATUS_TRANSITIONS = {
+    "pending": {"confirmed", "cancelled"},
+    "confirmed": {"processing", "shipped", "cancelled"},
+    "processing": {"shipped", "cancelled"},
+    "shipped": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+BULK_STATUS_MAX_ORDERS = 1000
+STREAM_KEEPALIVE_SECONDS = 15
+# Lifetime of a ticket for opening the order stream; it is only checked on connect
+STREAM_TICKET_SECONDS = 60
+STREAM_TICKET_SCOPE = "order_stream"
+
 @router.post("/orders", response_model=schemas.Order)
 def create_order(
     order: schemas.OrderCreate,
@@ -22,13 +50,19 @@ def create_order(
     if not cart_items:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
+    # Convert the cart's holds into sales: drop this user's holds, then take the
+    # stock. It all happens in one transaction, so a rollback puts the holds back.
+    release_holds(db, current_user.id)
+    
     # Calculate total
     total_amount = 0
+    item_count = 0
     order_items = []
     
     for cart_item in cart_items:
         product = cart_item.product
-        if product.stock < cart_item.quantity:
+        if not take_stock(db, product.id, cart_item.quantity):
+            db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail=f"Insufficient stock for {product.name}"
@@ -36,6 +70,7 @@ def create_order(
         
         item_total = product.price * cart_item.quantity
         total_amount += item_total
+        item_count += cart_item.quantity
         
         order_items.append({
             "product_id": product.id,
@@ -51,25 +86,36 @@ def create_order(
         phone=order.phone,
         payment_method=order.payment_method,
         status="confirmed",
-        payment_status="pending" if order.payment_method != "cod" else "cod"
+        payment_status="pending" if order.payment_method != "cod" else "cod",
+        item_count=item_count
     )
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    db.flush()
     
-    # Create order items and update stock
+    # Lifetime aggregates move in the same transaction as the order
+    users = models.User.__table__
+    db.execute(
+        update(users)
+        .where(users.c.id == current_user.id)
+        .values(order_count=users.c.order_count + 1, total_spent=users.c.total_spent + total_amount)
+    )
+    
+    # Create order items
     for item_data in order_items:
         order_item = models.OrderItem(
             order_id=db_order.id,
             **item_data
         )
         db.add(order_item)
-        
-        # Update product stock
-        product = db.query(models.Product).filter(
-            models.Product.id == item_data["product_id"]
-        ).first()
-        product.stock -= item_data["quantity"]
+    # Side effects run on the outbox worker once this commits, not in the request
+    enqueue(db, "order_created", {
+        "order_id": db_order.id,
+        "user_id": current_user.id,
+        "total_amount": total_amount,
+        "product_ids": [item["product_id"] for item in order_items],
+    })
+    
+    order_events.record(db, "order_created", [order_summary(db_order)])
     
     # Clear cart
     db.query(models.CartItem).filter(
@@ -77,30 +123,63 @@ def create_order(
     ).delete()
     
     db.commit()
+    outbox_worker.wake()
+    order_events.notify()
     db.refresh(db_order)
     return db_order
 
-@router.get("/orders", response_model=List[schemas.Order])
+def _order_summaries(table, user_id):
+    # Served entirely from the (user_id, id, ...) covering index
+    return select(
+        table.c.id, table.c.created_at, table.c.status, table.c.total_amount, table.c.item_count
+    ).where(table.c.user_id == user_id)
+
+@router.get("/orders", response_model=Union[List[schemas.Order], schemas.OrderHistory])
 def get_orders(
+    summary: bool = False,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
+    if summary:
+        # One range read per table, archived orders included; items are never loaded
+        summaries = db.execute(
+            union_all(
+                _order_summaries(models.ArchivedOrder.__table__, current_user.id),
+                _order_summaries(models.Order.__table__, current_user.id)
+            ).order_by("id")
+        ).all()
+        return {
+            "order_count": current_user.order_count,
+            "total_spent": current_user.total_spent,
+            "orders": summaries,
+        }
+    
     orders = db.query(models.Order).filter(
         models.Order.user_id == current_user.id
     ).all()
-    return orders
+    # Older finished orders live in the archive tables
+    archived = db.query(models.ArchivedOrder).filter(
+        models.ArchivedOrder.user_id == current_user.id
+    ).all()
+    return sorted(archived + orders, key=lambda order: order.id)
 
 @router.get("/orders/{order_id}", response_model=schemas.Order)
 def get_order(
     order_id: int,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     order = db.query(models.Order).filter(
         models.Order.id == order_id,
         models.Order.user_id == current_user.id
     ).first()
     
+    if not order:
+        order = db.query(models.ArchivedOrder).filter(
+            models.ArchivedOrder.id == order_id,
+            models.ArchivedOrder.user_id == current_user.id
+        ).first()
+    
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -108,13 +187,14 @@ def get_order(
 
 @router.get("/admin/orders", response_model=List[schemas.Order])
 def get_all_orders(
+    archived: bool = False,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    orders = db.query(models.Order).all()
+    orders = db.query(models.ArchivedOrder if archived else models.Order).all()
     return orders
 
 @router.put("/admin/orders/{order_id}/status")
@@ -129,8 +209,275 @@ def update_order_status(
     
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
+        if db.get(models.ArchivedOrder, order_id):
+            raise HTTPException(status_code=409, detail="Archived orders cannot be changed")
         raise HTTPException(status_code=404, detail="Order not found")
     
     order.status = status
+    order_events.record(db, "order_updated", [order_summary(order)])
+    db.commit()
+    order_events.notify()
+    return {"message": "Order status updated"}
+
+@router.post("/admin/orders/status")
+def bulk_update_order_status(
+    update_request: schemas.OrderStatusBulkUpdate,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    new_status = update_request.status
+    if new_status not in ORDER_STATUS_TRANSITIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {new_status}")
+    order_ids = list(dict.fromkeys(update_request.order_ids))
+    if len(order_ids) > BULK_STATUS_MAX_ORDERS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_STATUS_MAX_ORDERS} orders per request")
+    
+    # One statement: only orders whose current status may move to the new one change
+    allowed_from = [status for status, targets in ORDER_STATUS_TRANSITIONS.items() if new_status in targets]
+    orders = models.Order.__table__
+    updated = db.execute(
+        update(orders)
+        .where(orders.c.id.in_(order_ids), orders.c.status.in_(allowed_from))
+        .values(status=new_status)
+        .returning(orders.c.id, orders.c.user_id, orders.c.total_amount, orders.c.status,
+                   orders.c.payment_method, orders.c.payment_status, orders.c.created_at)
+    ).all()
+    order_events.record(db, "order_updated", [order_summary(row) for row in updated])
     db.commit()
-    return {"message": "Order status updated"}
\ No newline at end of file
+    if updated:
+        order_events.notify()
+    
+    updated_ids = {row.id for row in updated}
+    rest = [order_id for order_id in order_ids if order_id not in updated_ids]
+    rejected = []
+    if rest:
+        current = dict(db.query(models.Order.id, models.Order.status).filter(models.Order.id.in_(rest)).all())
+        archived = {order_id for (order_id,) in db.query(models.ArchivedOrder.id).filter(models.ArchivedOrder.id.in_(rest))}
+        for order_id in rest:
+            if order_id in current:
+                reason = f"Cannot change status from {current[order_id]} to {new_status}"
+            elif order_id in archived:
+                reason = "Archived orders cannot be changed"
+            else:
+                reason = "Order not found"
+            rejected.append({"id": order_id, "reason": reason})
+    
+    return {"updated": sorted(updated_ids), "rejected": rejected}
+
+@router.post("/admin/orders/stream-ticket")
+def create_stream_ticket(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # EventSource can't send headers, so the stream takes this in the URL instead of
+    # the access token: it expires in a minute and opens nothing but the stream
+    ticket = jwt.encode({
+        "sub": current_user.username,
+        "scope": STREAM_TICKET_SCOPE,
+        "exp": datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS),
+    }, SECRET_KEY, algorithm=ALGORITHM)
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_SECONDS}
+
+def _stream_user(request: Request, ticket: Optional[str]):
+    authorization = request.headers.get("authorization", "")
+    db = ReadSessionLocal()
+    try:
+        if authorization.lower().startswith("bearer "):
+            return get_current_user(token=authorization[7:], db=db)
+        if not ticket:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        try:
+            payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+        user = user_by_username(db, payload.get("sub")) if payload.get("scope") == STREAM_TICKET_SCOPE else None
+        if user is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+        return user
+    finally:
+        db.close()
+
+async def _order_event_stream(request: Request, last_event_id):
+    # Registered here rather than in the route, so a response that never starts
+    # never leaves a subscriber behind
+    try:
+        subscriber = order_events.subscribe()
+    except TooManySubscribers:
+        return
+    try:
+        if last_event_id is None:
+            last_event_id = await run_in_threadpool(order_events.latest_id)
+        # Tells the client where it starts, so a reconnect before the first event resumes there
+        yield f"retry: 3000\nid: {last_event_id}\nevent: stream_position\ndata: {last_event_id}\n\n"
+        idle = 0.0
+        while True:
+            events = await run_in_threadpool(order_events.since, last_event_id)
+            for event in events:
+                yield _format_event(event)
+            if events:
+                last_event_id = events[-1][0]
+                idle = 0.0
+                continue
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), ORDER_STREAM_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                idle += ORDER_STREAM_POLL_SECONDS
+                if idle >= STREAM_KEEPALIVE_SECONDS:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    idle = 0.0
+            subscriber.wakeup.clear()
+    finally:
+        order_events.unsubscribe(subscriber)
+
+def _format_event(event):
+    event_id, event_type, order = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(order)}\n\n"
+
+@router.get("/admin/orders/stream")
+async def stream_orders(request: Request, ticket: Optional[str] = None, last_event_id: Optional[int] = None):
+    current_user = await run_in_threadpool(_stream_user, request, ticket)
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # EventSource resends Last-Event-ID itself; a fresh connection passes it as ?last_event_id=
+    header = request.headers.get("last-event-id")
+    if header and header.isdigit():
+        last_event_id = int(header)
+    try:
+        order_events.check_capacity()
+    except TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many order stream subscribers")
+    
+    return StreamingResponse(
+        _order_event_stream(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Streaming exports
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+def _order_export_columns(order):
+    return [
+        order.id.label("order_id"),
+        order.created_at,
+        order.user_id,
+        order.status,
+        order.payment_method,
+        order.payment_status,
+        order.total_amount,
+        order.phone,
+        order.shipping_address,
+    ]
+
+def _order_item_export_columns(order, item):
+    return [
+        item.id.label("order_item_id"),
+        item.order_id,
+        order.created_at,
+        order.status,
+        item.product_id,
+        models.Product.name.label("product_name"),
+        item.quantity,
+        item.price,
+    ]
+
+def _filter_orders(stmt, order, start_date, end_date, status):
+    # Both dates are inclusive
+    if start_date:
+        stmt = stmt.where(order.created_at >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        stmt = stmt.where(order.created_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    if status:
+        stmt = stmt.where(order.status == status)
+    return stmt
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _stream_rows(stmt, export_format):
+    # Own session: the request-scoped one may be closed before streaming ends
+    db = ReadSessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == "csv":
+            writer.writerow(columns)
+
+        for rows in result.partitions():
+            for row in rows:
+                if export_format == "csv":
+                    writer.writerow([_export_value(value) for value in row])
+                else:
+                    buffer.write(json.dumps({key: _export_value(value) for key, value in zip(columns, row)}))
+                    buffer.write("\n")
+            # One chunk per batch keeps memory flat regardless of export size
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if export_format == "csv" and buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+def _export_response(stmt, export_format, name):
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format, use csv or jsonl")
+    
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        _stream_rows(stmt, export_format),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/admin/orders/export")
+def export_orders(
+    format: str = "csv",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status: Optional[str] = None,
+    archived: bool = False,
+    current_user: models.User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    order = models.ArchivedOrder if archived else models.Order
+    stmt = select(*_order_export_columns(order)).order_by(order.id)
+    stmt = _filter_orders(stmt, order, start_date, end_date, status)
+    return _export_response(stmt, format, "orders")
+
+@router.get("/admin/order-items/export")
+def export_order_items(
+    format: str = "csv",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status: Optional[str] = None,
+    archived: bool = False,
+    current_user: models.User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    order, item = (models.ArchivedOrder, models.ArchivedOrderItem) if archived else (models.Order, models.OrderItem)
+    stmt = (
+        select(*_order_item_export_columns(order, item))
+        .select_from(item)
+        .join(order, order.id == item.order_id)
+        .outerjoin(models.Product, models.Product.id == item.product_id)
+        .order_by(item.id)
+    )
+    stmt = _filter_orders(stmt, order, start_date, end_date, status)
+    return _export_response(stmt, format, "order-items")
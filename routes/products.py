@@ -1,16 +1,81 @@
 # routes/products.py
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File, Form
+from sqlalchemy import select, func, case, and_, literal
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from main import get_current_user
+from services.catalog_import import CatalogImport, detect_format, iter_rows
+from services.catalog_model import catalog_model, SORTS
+from services.facet_index import facet_index
+from services.suggest_index import suggest_index
+from services.categories import set_product_category, adjust_product_counts
+from services.co_purchase import related_product_ids, forget_product, CO_PURCHASE_TOP_K
+from services.hot_queries import product_by_id
+import json
 import os
 
 router = APIRouter()
 
-@router.get("/products", response_model=List[schemas.Product])
+# Price histogram edges; the last bucket is open-ended
+PRICE_BUCKET_EDGES = [0, 100, 250, 500, 1000]
+
+def _price_filters(min_price, max_price):
+    conditions = []
+    if min_price:
+        conditions.append(models.Product.price >= min_price)
+    if max_price:
+        conditions.append(models.Product.price <= max_price)
+    return conditions
+
+def _product_facets(db, category, min_price, max_price, search):
+    """Total plus category counts and price buckets for the current filters.
+
+    Each facet ignores its own filter, so the sidebar still shows the other
+    categories / price ranges. Without a search term this is answered from the
+    cached facet index; free-text search falls back to one grouped SQL pass.
+    """
+    if not search:
+        return facet_index.get(db).facets(category, min_price, max_price, PRICE_BUCKET_EDGES)
+
+    price = func.coalesce(models.Product.price, 0)
+    bucket = case(
+        *[(price < edge, i) for i, edge in enumerate(PRICE_BUCKET_EDGES[1:])],
+        else_=len(PRICE_BUCKET_EDGES) - 1
+    ).label("bucket")
+    price_conditions = _price_filters(min_price, max_price)
+    # The price filter is grouped on instead of applied in WHERE so buckets outside it are still counted
+    in_price = (case((and_(*price_conditions), 1), else_=0) if price_conditions else literal(1)).label("in_price")
+
+    stmt = (
+        select(models.Product.category, bucket, in_price, func.count())
+        .where(models.Product.is_available == True, models.Product.name.contains(search))
+        .group_by(models.Product.category, bucket, in_price)
+    )
+
+    category_counts = {}
+    bucket_counts = [0] * len(PRICE_BUCKET_EDGES)
+    total = 0
+    for row_category, row_bucket, row_in_price, count in db.execute(stmt):
+        in_category = not category or row_category == category
+        if row_in_price and row_category:
+            category_counts[row_category] = category_counts.get(row_category, 0) + count
+        if in_category:
+            bucket_counts[row_bucket] += count
+        if row_in_price and in_category:
+            total += count
+
+    edges = PRICE_BUCKET_EDGES + [None]
+    return total, {
+        "categories": [{"name": name, "count": count} for name, count in sorted(category_counts.items())],
+        "price_buckets": [
+            {"min": edges[i], "max": edges[i + 1], "count": count} for i, count in enumerate(bucket_counts)
+        ],
+    }
+
+@router.get("/products", response_model=Union[List[schemas.Product], schemas.ProductSearchResult])
 def get_products(
     skip: int = 0,
     limit: int = 100,
@@ -18,79 +83,82 @@ def get_products(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    sort: Optional[str] = None,
+    facets: bool = False,
+    db: Session = Depends(get_read_db)
 ):
+    if sort is not None and sort not in SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SORTS)}")
+    
     try:
-        query = db.query(models.Product).filter(models.Product.is_available == True)
-        
-        if category:
-            query = query.filter(models.Product.category == category)
-        if min_price:
-            query = query.filter(models.Product.price >= min_price)
-        if max_price:
-            query = query.filter(models.Product.price <= max_price)
-        if search:
-            query = query.filter(models.Product.name.contains(search))
+        # Filtered, sorted and serialized from the in-memory catalog model
+        catalog = catalog_model.ensure_fresh(db)
+        rows = catalog.select(category, min_price, max_price, search, sort=sort)
+        start = max(skip, 0)
+        items = catalog.render(rows[start:start + max(limit, 0)])
         
-        products = query.offset(skip).limit(limit).all()
+        if facets:
+            total, product_facets = _product_facets(db, category, min_price, max_price, search)
+            return Response(
+                b'{"items":' + items + b',"total":%d,"facets":' % total + json.dumps(product_facets).encode() + b"}",
+                media_type="application/json"
+            )
         
-        # Ensure all products have valid image_url
-        for product in products:
-            if not product.image_url:
-                product.image_url = "/static/uploads/default.jpg"
-        
-        return products
+        return Response(items, media_type="application/json")
     except Exception as e:
         print(f"Error fetching products: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/products/categories")
-def get_categories(db: Session = Depends(get_db)):
-    # Get categories from Category table
-    categories = db.query(models.Category).all()
-    category_list = [cat.name for cat in categories]
-    
-    # Also get categories from products that might not be in Category table
-    product_categories = db.query(models.Product.category).distinct().all()
-    product_category_list = [cat[0] for cat in product_categories if cat[0]]
-    
-    # Merge both lists and remove duplicates
-    all_categories = list(set(category_list + product_category_list))
+def get_categories(counts: bool = False, db: Session = Depends(get_read_db)):
+    # Every product category has a Category row (see migrations.py), so no scan of products
+    categories = db.query(models.Category.name, models.Category.product_count).order_by(models.Category.name).all()
     
-    return sorted(all_categories)
+    if counts:
+        return [{"name": name, "product_count": product_count} for name, product_count in categories]
+    return [name for name, _ in categories]
+
+@router.get("/products/suggest", response_model=List[schemas.Suggestion])
+def suggest_products(q: str = "", limit: int = 8, db: Session = Depends(get_read_db)):
+    # Served from memory; the session is only used when the index needs a (re)build
+    suggest_index.ensure_fresh(db)
+    return suggest_index.suggest(q, max(1, min(limit, 20)))
 
 @router.get("/products/featured", response_model=List[schemas.Product])
-def get_featured_products(db: Session = Depends(get_db)):
+def get_featured_products(db: Session = Depends(get_read_db)):
     try:
-        
-        products = db.query(models.Product).filter(
-            models.Product.is_featured == True,
-            models.Product.is_available == True
-        ).all()
-        
-        # Ensure all products have valid data
-        valid_products = []
-        for product in products:
-            # Set default image_url if None
-            if not product.image_url:
-                product.image_url = "/static/uploads/default.jpg"
-            valid_products.append(product)
-
-        return valid_products
-        return valid_products
+        catalog = catalog_model.ensure_fresh(db)
+        return Response(catalog.render(catalog.select(featured=True)), media_type="application/json")
     except Exception as e:
         print(f"Error fetching featured products: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/products/{product_id}", response_model=schemas.Product)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+def get_product(product_id: int, db: Session = Depends(get_read_db)):
+    body = catalog_model.ensure_fresh(db).product(product_id)
+    if body is not None:
+        return Response(body, media_type="application/json")
+    
+    # Possibly created through another worker since our last rebuild
+    product = product_by_id(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
-
+@router.get("/products/{product_id}/related", response_model=List[schemas.Product])
+def get_related_products(product_id: int, limit: int = 4, db: Session = Depends(get_read_db)):
+    # Ranked ids come from the precomputed co-purchase index (cached), products by primary key
+    related_ids = related_product_ids(db, product_id)[:max(0, min(limit, CO_PURCHASE_TOP_K))]
+    if not related_ids:
+        return []
+    
+    products = db.query(models.Product).filter(
+        models.Product.id.in_(related_ids),
+        models.Product.is_available == True
+    ).all()
+    by_id = {product.id: product for product in products}
+    return [by_id[product_id] for product_id in related_ids if product_id in by_id]
 
 @router.put("/products/{product_id}", response_model=schemas.Product)
 def update_product(
@@ -107,10 +175,15 @@ def update_product(
         raise HTTPException(status_code=404, detail="Product not found")
     
     for key, value in product.dict().items():
-        setattr(db_product, key, value)
+        if key != "category":
+            setattr(db_product, key, value)
+    set_product_category(db, db_product, product.category)
     
     db.commit()
     db.refresh(db_product)
+    facet_index.invalidate()
+    suggest_index.upsert_product(db_product)
+    catalog_model.upsert_product(db_product)
     return db_product
 
 @router.delete("/products/{product_id}")
@@ -126,8 +199,13 @@ def delete_product(
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    adjust_product_counts(db, {db_product.category_id: -1})
+    forget_product(db, db_product.id)
     db.delete(db_product)
     db.commit()
+    facet_index.invalidate()
+    suggest_index.remove_product(product_id)
+    catalog_model.remove_product(product_id)
     return {"message": "Product deleted successfully"}
 
 @router.post("/products", response_model=schemas.Product)
@@ -174,18 +252,43 @@ async def create_product(
         name=name,
         description=description,
         price=price,
-        category=category,
         stock=stock,
         is_featured=is_featured_bool,
         image_url=image_url,
         is_available=True
     )
+    set_product_category(db, db_product, category)
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    facet_index.invalidate()
+    suggest_index.upsert_product(db_product)
+    catalog_model.upsert_product(db_product)
     print(f"✅ Product created: {db_product.name}, Image URL: {db_product.image_url}")
     return db_product
 
+@router.post("/products/import")
+def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    import_format = detect_format(file.filename, format)
+    if import_format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="Unsupported format, use csv or jsonl")
+    
+    # Rows are parsed straight off the uploaded temp file, one batch at a time
+    report = CatalogImport(db).run(iter_rows(file.file, import_format))
+    facet_index.invalidate()
+    suggest_index.invalidate()
+    catalog_model.invalidate()
+    print(f"✅ Catalog import: {report['created']} created, {report['updated']} updated, {report['error_count']} errors")
+    return report
+
 @router.post("/categories")
 def add_category(
     category: dict,
@@ -204,7 +307,7 @@ def add_category(
     if existing:
         raise HTTPException(status_code=400, detail="Category already exists")
     
-    new_category = models.Category(name=category_name)
+    new_category = models.Category(name=category_name, product_count=0)
     db.add(new_category)
     db.commit()
     db.refresh(new_category)
@@ -224,9 +327,8 @@ def delete_category(
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Check if any products use this category
-    products_count = db.query(models.Product).filter(models.Product.category == category_name).count()
-    if products_count > 0:
-        raise HTTPException(status_code=400, detail=f"Cannot delete category. {products_count} products are using it.")
+    if category.product_count > 0:
+        raise HTTPException(status_code=400, detail=f"Cannot delete category. {category.product_count} products are using it.")
     
     db.delete(category)
     db.commit()
@@ -1,15 +1,38 @@
 # routes/users.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timezone
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from main import get_password_hash, verify_password, create_access_token, get_current_user
+from services.rate_limit import RateLimit
+from services.write_buffer import contact_buffer, newsletter_buffer, BufferFull
+from services.guest_cart import GUEST_CART_COOKIE, decode_cart, merge_guest_cart
 
 router = APIRouter()
 
-@router.post("/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def _adopt_guest_cart(db, response, user_id, guest_cart):
+    lines = decode_cart(guest_cart)
+    if lines:
+        merge_guest_cart(db, user_id, lines)
+        db.commit()
+    if guest_cart:
+        response.delete_cookie(GUEST_CART_COOKIE)
+
+# Unauthenticated endpoints that hash passwords or write rows
+login_rate_limit = RateLimit("login", identifier_field="username")
+register_rate_limit = RateLimit("register", identifier_field="email")
+contact_rate_limit = RateLimit("contact", identifier_field="email")
+newsletter_rate_limit = RateLimit("newsletter", identifier_field="email")
+
+@router.post("/register", response_model=schemas.User, dependencies=[Depends(register_rate_limit)])
+def register_user(
+    user: schemas.UserCreate,
+    response: Response,
+    guest_cart: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
     # Check if user exists
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
@@ -31,10 +54,16 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    _adopt_guest_cart(db, response, db_user.id, guest_cart)
     return db_user
 
-@router.post("/login", response_model=schemas.Token)
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+@router.post("/login", response_model=schemas.Token, dependencies=[Depends(login_rate_limit)])
+def login(
+    user: schemas.UserLogin,
+    response: Response,
+    guest_cart: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
     db_user = db.query(models.User).filter(models.User.username == user.username).first()
     if not db_user or not verify_password(user.password, db_user.hashed_password):
         raise HTTPException(
@@ -43,46 +72,58 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
         )
     
     access_token = create_access_token(data={"sub": db_user.username})
+    _adopt_guest_cart(db, response, db_user.id, guest_cart)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/users/me", response_model=schemas.User)
 def read_users_me(current_user: models.User = Depends(get_current_user)):
     return current_user
 
-@router.post("/newsletter")
-def subscribe_newsletter(newsletter: schemas.NewsletterSubscribe, db: Session = Depends(get_db)):
-    existing = db.query(models.Newsletter).filter(models.Newsletter.email == newsletter.email).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already subscribed")
+@router.post("/newsletter", dependencies=[Depends(newsletter_rate_limit)])
+def subscribe_newsletter(newsletter: schemas.NewsletterSubscribe, db: Session = Depends(get_read_db)):
+    # One normalized form for the dedupe cache, the lookup and the stored row
+    email = newsletter.email.strip().lower()
+    if not newsletter_buffer.seen(email):
+        # Not queued here recently; it may be in the table from earlier, another worker or before a restart
+        existing = db.query(models.Newsletter.id).filter(models.Newsletter.email == email).first()
+        if existing:
+            newsletter_buffer.mark_seen(email)
+            raise HTTPException(status_code=400, detail="Email already subscribed")
     
-    subscription = models.Newsletter(email=newsletter.email)
-    db.add(subscription)
-    db.commit()
+    # Buffered and inserted in batches; a simultaneous signup through another worker is ignored on flush
+    try:
+        queued = newsletter_buffer.add({"email": email, "subscribed_at": datetime.now(timezone.utc)})
+    except BufferFull:
+        raise HTTPException(status_code=503, detail="Please try again shortly", headers={"Retry-After": "5"})
+    
+    if not queued:
+        raise HTTPException(status_code=400, detail="Email already subscribed")
     return {"message": "Successfully subscribed to newsletter"}
 
-@router.post("/contact")
-def send_contact_message(message: schemas.ContactMessageCreate, db: Session = Depends(get_db)):
-    contact = models.ContactMessage(
-        # id=message.id,
-        name=message.name,
-        email=message.email,
-        mobile=message.mobile,
-        message=message.message,
-        # date=message.date
-    )
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
+@router.post("/contact", dependencies=[Depends(contact_rate_limit)])
+def send_contact_message(message: schemas.ContactMessageCreate):
+    try:
+        contact_buffer.add({
+            "name": message.name,
+            "email": message.email,
+            "mobile": message.mobile,
+            "message": message.message,
+            "created_at": datetime.now(timezone.utc),
+        })
+    except BufferFull:
+        raise HTTPException(status_code=503, detail="Please try again shortly", headers={"Retry-After": "5"})
     return {"message": "Message sent successfully"}
 
 @router.get("/contact-messages", response_model=List[schemas.ContactMessage])
 def get_contact_messages(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    # Make sure buffered messages are visible to the admin
+    contact_buffer.flush()
     messages = db.query(models.ContactMessage).all()
     return messages
 
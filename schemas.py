@@ -44,11 +44,30 @@ class ProductCreate(ProductBase):
 
 class Product(ProductBase):
     id: int
+    available: Optional[int] = None  # stock minus units held in carts
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class CategoryFacet(BaseModel):
+    name: str
+    count: int
+
+class PriceBucket(BaseModel):
+    min: float
+    max: Optional[float] = None  # None = open-ended top bucket
+    count: int
+
+class ProductFacets(BaseModel):
+    categories: List[CategoryFacet]
+    price_buckets: List[PriceBucket]
+
+class ProductSearchResult(BaseModel):
+    items: List[Product]
+    total: int
+    facets: ProductFacets
+
 class CartItemBase(BaseModel):
     product_id: int
     quantity: int
@@ -65,6 +84,17 @@ class CartItem(CartItemBase):
     class Config:
         from_attributes = True
 
+class GuestCartItem(CartItemBase):
+    product: Product
+    
+    class Config:
+        from_attributes = True
+
+class Suggestion(BaseModel):
+    type: str
+    label: str
+    product_id: Optional[int] = None
+
 class OrderItemBase(BaseModel):
     product_id: int
     quantity: int
@@ -97,9 +127,59 @@ class Order(OrderBase):
     class Config:
         from_attributes = True
 
+class OrderSummary(BaseModel):
+    id: int
+    created_at: datetime
+    status: str
+    total_amount: float
+    item_count: int
+    
+    class Config:
+        from_attributes = True
+
+class OrderHistory(BaseModel):
+    order_count: int
+    total_spent: float
+    orders: List[OrderSummary]
+
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[int]
+    status: str
+
 class NewsletterSubscribe(BaseModel):
     email: EmailStr
 
+class CampaignCreate(BaseModel):
+    subject: str
+    body: str
+
+class Campaign(CampaignCreate):
+    id: int
+    status: str
+    last_subscriber_id: int
+    total_recipients: int
+    sent_count: int
+    failed_count: int
+    messages_per_second: Optional[float] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class CampaignDelivery(BaseModel):
+    subscriber_id: int
+    email: str
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    sent_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class ContactMessageCreate(BaseModel):
     # id:int
     name: str
@@ -0,0 +1,212 @@
+# services/admission.py
+import asyncio
+import os
+from collections import deque
+
+from starlette.responses import JSONResponse
+
+# Sync route handlers run on anyio's default threadpool (40 threads), so the
+# total budget is kept below that to leave room for startup/static work.
+TOTAL_LIMIT = int(os.getenv("ADMISSION_TOTAL_LIMIT", "32"))
+# Slots that only checkout may use, so browsing can never starve it
+CHECKOUT_RESERVED = int(os.getenv("ADMISSION_CHECKOUT_RESERVED", "8"))
+RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+# Lower number = served first when a slot frees up
+CHECKOUT_PRIORITY = 0
+ADMIN_PRIORITY = 1
+CATALOG_PRIORITY = 2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, pool, reason):
+        super().__init__(f"{pool} {reason}")
+        self.pool = pool
+        self.reason = reason
+
+
+class Pool:
+    def __init__(self, name, limit, max_queue, queue_timeout, priority):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.priority = priority
+        self.in_flight = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+class AdmissionController:
+    """Per-pool concurrency budgets under one global cap.
+
+    Everything runs on the event loop, so no locking is needed: slots are
+    handed over synchronously in release(), highest priority pool first.
+    """
+
+    def __init__(self, pools, total_limit=TOTAL_LIMIT, reserved=CHECKOUT_RESERVED):
+        self.pools = {pool.name: pool for pool in pools}
+        self._by_priority = sorted(pools, key=lambda p: p.priority)
+        self.total_limit = total_limit
+        self.reserved = reserved
+        self.in_flight = 0
+
+    def _can_run(self, pool):
+        if pool.in_flight >= pool.limit:
+            return False
+        free = self.total_limit - self.in_flight
+        if pool.priority > CHECKOUT_PRIORITY:
+            return free > self.reserved
+        return free > 0
+
+    def _grant(self, pool):
+        pool.in_flight += 1
+        pool.admitted += 1
+        self.in_flight += 1
+
+    async def acquire(self, name):
+        pool = self.pools[name]
+        if not pool.waiters and self._can_run(pool):
+            self._grant(pool)
+            return
+
+        if len(pool.waiters) >= pool.max_queue:
+            pool.rejected_queue_full += 1
+            raise AdmissionRejected(name, "queue full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        pool.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), pool.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Granted in the same tick the deadline fired - keep the slot
+                return
+            pool.waiters.remove(waiter)
+            waiter.cancel()
+            pool.rejected_timeout += 1
+            raise AdmissionRejected(name, "queue timeout")
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if waiter.done() and not waiter.cancelled():
+                self.release(name)
+            else:
+                pool.waiters.remove(waiter)
+                waiter.cancel()
+            raise
+
+    def release(self, name):
+        pool = self.pools[name]
+        pool.in_flight -= 1
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        for pool in self._by_priority:
+            while pool.waiters and self._can_run(pool):
+                waiter = pool.waiters.popleft()
+                if waiter.done():
+                    continue
+                self._grant(pool)
+                waiter.set_result(True)
+
+    def stats(self):
+        return {
+            "total_limit": self.total_limit,
+            "checkout_reserved": self.reserved,
+            "in_flight": self.in_flight,
+            "queued": sum(len(pool.waiters) for pool in self.pools.values()),
+            "pools": {name: pool.stats() for name, pool in self.pools.items()},
+        }
+
+
+def classify_request(method, path):
+    """Map a request to an admission pool, or None to bypass admission."""
+    if path.startswith("/static"):
+        return None
+    # Long-lived SSE connection; holding an admin slot for hours would starve the pool
+    if path == "/api/admin/orders/stream":
+        return None
+    if path.startswith(("/api/admin", "/api/contact-messages", "/api/categories")):
+        return "admin"
+    # Guest carts are browsing traffic; they never touch the checkout tables
+    if path.startswith("/api/cart/guest"):
+        return "catalog"
+    if path.startswith(("/api/orders", "/api/cart")):
+        return "checkout"
+    if path.startswith("/api/products") and method != "GET":
+        return "admin"
+    return "catalog"
+
+
+admission_controller = AdmissionController([
+    Pool(
+        "checkout",
+        limit=int(os.getenv("ADMISSION_CHECKOUT_LIMIT", "24")),
+        max_queue=int(os.getenv("ADMISSION_CHECKOUT_QUEUE", "200")),
+        queue_timeout=float(os.getenv("ADMISSION_CHECKOUT_TIMEOUT", "5")),
+        priority=CHECKOUT_PRIORITY,
+    ),
+    Pool(
+        "admin",
+        limit=int(os.getenv("ADMISSION_ADMIN_LIMIT", "4")),
+        max_queue=int(os.getenv("ADMISSION_ADMIN_QUEUE", "20")),
+        queue_timeout=float(os.getenv("ADMISSION_ADMIN_TIMEOUT", "10")),
+        priority=ADMIN_PRIORITY,
+    ),
+    Pool(
+        "catalog",
+        limit=int(os.getenv("ADMISSION_CATALOG_LIMIT", "24")),
+        max_queue=int(os.getenv("ADMISSION_CATALOG_QUEUE", "100")),
+        queue_timeout=float(os.getenv("ADMISSION_CATALOG_TIMEOUT", "1")),
+        priority=CATALOG_PRIORITY,
+    ),
+])
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that queues requests per pool and sheds with 503."""
+
+    def __init__(self, app, controller=None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        pool = classify_request(scope["method"], scope["path"])
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(pool)
+        except AdmissionRejected:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry shortly"},
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(pool)
@@ -0,0 +1,54 @@
+# services/archival.py
+# Moves finished orders out of the hot orders / order_items tables into
+# orders_archive / order_items_archive, a batch per transaction.
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import DateTime, delete, insert, literal, select
+
+import models
+from database import engine
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_STATUSES = [s.strip() for s in os.getenv("ORDER_ARCHIVE_STATUSES", "delivered,cancelled").split(",") if s.strip()]
+ARCHIVE_BATCH_SIZE = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", "500"))
+
+ORDER_COLUMNS = ["id", "user_id", "total_amount", "status", "payment_method",
+                 "payment_status", "shipping_address", "phone", "created_at", "item_count"]
+ORDER_ITEM_COLUMNS = ["id", "order_id", "product_id", "quantity", "price"]
+
+def _archive_batch(conn, order_ids, archived_at):
+    orders = models.Order.__table__
+    items = models.OrderItem.__table__
+    conn.execute(
+        insert(models.ArchivedOrder.__table__).from_select(
+            ORDER_COLUMNS + ["archived_at"],
+            select(*[orders.c[name] for name in ORDER_COLUMNS], literal(archived_at, DateTime)).where(orders.c.id.in_(order_ids))
+        )
+    )
+    conn.execute(
+        insert(models.ArchivedOrderItem.__table__).from_select(
+            ORDER_ITEM_COLUMNS,
+            select(*[items.c[name] for name in ORDER_ITEM_COLUMNS]).where(items.c.order_id.in_(order_ids))
+        )
+    )
+    conn.execute(delete(items).where(items.c.order_id.in_(order_ids)))
+    conn.execute(delete(orders).where(orders.c.id.in_(order_ids)))
+
+def archive_orders(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive finished orders older than the cutoff. Returns the number moved."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        # Short transactions so checkout writes are never held up for long
+        with engine.begin() as conn:
+            order_ids = conn.execute(
+                select(models.Order.id)
+                .where(models.Order.status.in_(ARCHIVE_STATUSES), models.Order.created_at < cutoff)
+                .order_by(models.Order.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not order_ids:
+                return moved
+            _archive_batch(conn, order_ids, datetime.now(timezone.utc))
+        moved += len(order_ids)
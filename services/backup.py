@@ -0,0 +1,222 @@
+# services/backup.py
+# Online backups through SQLite's backup API. Pages are copied a few at a time
+# with a short sleep in between, so live requests keep getting the database.
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from database import engine
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.005"))
+# Writes from other connections restart a stepped backup; after this many
+# restarts the rest is copied in one step (a WAL read snapshot, writers still proceed)
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+PROBE_INTERVAL = 0.01
+
+
+class BackupRestarted(Exception):
+    pass
+
+
+class IntegrityCheckFailed(Exception):
+    pass
+
+
+class PauseProbe:
+    """Measures what the shop feels while the backup runs, without adding load of its own.
+
+    Every write statement this worker's engine runs is timed (lock waits
+    included); the slowest is the foreground pause. A read-only connection also
+    runs a plain SELECT every PROBE_INTERVAL to show read latency. Neither
+    takes the write lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.samples = []
+        self.writes = []
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="backup-probe", daemon=True)
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopping.set()
+        self._thread.join()
+        event.remove(engine, "before_cursor_execute", self._before_execute)
+        event.remove(engine, "after_cursor_execute", self._after_execute)
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("backup_probe_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("backup_probe_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            self.writes.append(elapsed)
+
+    def _run(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            connection.execute("PRAGMA query_only=ON")
+            while not self._stopping.wait(PROBE_INTERVAL):
+                start = time.perf_counter()
+                connection.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+                self.samples.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    def stats(self):
+        return {
+            "probes": len(self.samples),
+            "max_read_ms": round(max(self.samples, default=0) * 1000, 3),
+            "avg_read_ms": round(sum(self.samples) / len(self.samples) * 1000, 3) if self.samples else 0.0,
+            "writes_timed": len(self.writes),
+            "max_pause_ms": round(max(self.writes, default=0) * 1000, 3),
+        }
+
+
+def database_path():
+    return os.path.abspath(engine.url.database)
+
+
+def _copy(source, target_path, pages, sleep):
+    """Run the backup API. Returns the step/page/restart counters."""
+    progress = {"steps": 0, "total": 0, "remaining": None, "restarts": 0}
+
+    def on_progress(status, remaining, total):
+        progress["steps"] += 1
+        progress["total"] = total
+        if progress["remaining"] is not None and remaining > progress["remaining"]:
+            # Another connection wrote to the source and SQLite started over
+            progress["restarts"] += 1
+            if progress["restarts"] > BACKUP_MAX_RESTARTS:
+                raise BackupRestarted(progress)
+        progress["remaining"] = remaining
+        if remaining and sleep:
+            # The backup API only sleeps on BUSY/LOCKED; pace every step ourselves
+            time.sleep(sleep)
+
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, progress=on_progress)
+    finally:
+        target.close()
+    return progress
+
+
+def _integrity_check(path):
+    connection = sqlite3.connect(path)
+    try:
+        result = connection.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        connection.close()
+    if result != [("ok",)]:
+        raise IntegrityCheckFailed("; ".join(row[0] for row in result[:5]))
+
+
+def _rotate(keep=BACKUP_KEEP):
+    snapshots = sorted(name for name in os.listdir(BACKUP_DIR) if name.endswith(".db.gz"))
+    for name in snapshots[:-keep] if keep else []:
+        os.remove(os.path.join(BACKUP_DIR, name))
+        manifest = os.path.join(BACKUP_DIR, name[:-len(".db.gz")] + ".json")
+        if os.path.exists(manifest):
+            os.remove(manifest)
+
+
+def run_backup():
+    """Take, verify, compress and rotate one snapshot. Returns the report dict."""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    # Microseconds so two backups in the same second don't overwrite each other
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+    base = os.path.join(BACKUP_DIR, f"gaeinova-{stamp}")
+    raw_path = base + ".db.tmp"
+    gz_path = base + ".db.gz"
+
+    source_path = database_path()
+    started = time.perf_counter()
+    source = sqlite3.connect(source_path, timeout=30)
+    try:
+        with PauseProbe(source_path) as probe:
+            mode = "stepped"
+            try:
+                progress = _copy(source, raw_path, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP)
+            except BackupRestarted as e:
+                mode = "single-step fallback"
+                abandoned = e.args[0]
+                progress = _copy(source, raw_path, -1, 0)
+                progress["steps"] += abandoned["steps"]
+                progress["restarts"] = abandoned["restarts"]
+        copy_seconds = time.perf_counter() - started
+        page_size = source.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        source.close()
+
+    try:
+        _integrity_check(raw_path)
+        db_bytes = os.path.getsize(raw_path)
+        with open(raw_path, "rb") as src, gzip.open(gz_path + ".tmp", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(gz_path + ".tmp", gz_path)
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+
+    compressed_bytes = os.path.getsize(gz_path)
+    report = {
+        "file": os.path.basename(gz_path),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "mode": mode,
+        "pages": progress["total"],
+        "page_size": page_size,
+        "steps": progress["steps"],
+        "restarts": progress["restarts"],
+        "db_bytes": db_bytes,
+        "compressed_bytes": compressed_bytes,
+        "compression_ratio": round(db_bytes / compressed_bytes, 2) if compressed_bytes else None,
+        "copy_seconds": round(copy_seconds, 3),
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "throughput_mb_s": round(db_bytes / 1024 / 1024 / copy_seconds, 2) if copy_seconds else None,
+        "integrity_check": "ok",
+        **probe.stats(),
+    }
+    with open(base + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    _rotate()
+    print(f"✅ Backup {report['file']}: {db_bytes} bytes in {report['copy_seconds']}s, "
+          f"max pause {report['max_pause_ms']} ms")
+    return report
+
+
+def list_backups():
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    reports = []
+    for name in sorted(os.listdir(BACKUP_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(BACKUP_DIR, name)) as f:
+            reports.append(json.load(f))
+    return reports
+
+
+def backup_job():
+    return run_backup()["pages"]
@@ -0,0 +1,257 @@
+# services/campaigns.py
+# Sends a newsletter campaign to every subscriber from an asyncio task. Subscribers
+# are read in id-ordered chunks; each chunk goes out through the SMTP pool at a
+# throttled rate, then its per-recipient results and the new checkpoint are
+# written in one transaction, so a paused or crashed campaign resumes after the
+# last finished chunk.
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from email import policy
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from starlette.concurrency import run_in_threadpool
+
+import models
+from database import engine, read_engine
+from services.smtp import SMTPConnection, SMTPError, SMTPPool
+
+NEWSLETTER_FROM = os.getenv("NEWSLETTER_FROM", "newsletter@example.com")
+CAMPAIGN_CHUNK_SIZE = int(os.getenv("CAMPAIGN_CHUNK_SIZE", "200"))
+CAMPAIGN_SMTP_CONNECTIONS = int(os.getenv("CAMPAIGN_SMTP_CONNECTIONS", "4"))
+# 0 disables throttling
+CAMPAIGN_RATE_PER_SECOND = float(os.getenv("CAMPAIGN_RATE_PER_SECOND", "20"))
+CAMPAIGN_MAX_ATTEMPTS = int(os.getenv("CAMPAIGN_MAX_ATTEMPTS", "3"))
+CAMPAIGN_RETRY_DELAY = float(os.getenv("CAMPAIGN_RETRY_DELAY", "2"))
+# A "sending" campaign whose heartbeat is older than this lost its worker and may be resumed
+CAMPAIGN_STALE_SECONDS = int(os.getenv("CAMPAIGN_STALE_SECONDS", "300"))
+
+RESUMABLE_STATUSES = ("draft", "paused", "failed")
+
+# campaign id -> asyncio.Task for campaigns sending from this process
+_running = {}
+
+
+class CampaignBusy(Exception):
+    pass
+
+
+class Throttle:
+    """Spaces sends evenly at `rate` per second across all senders on the loop."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def build_message(subject, body, recipient):
+    message = EmailMessage()
+    message["From"] = NEWSLETTER_FROM
+    message["To"] = recipient
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=False)
+    message["Message-ID"] = make_msgid()
+    message.set_content(body)
+    return message.as_bytes(policy=policy.SMTP)
+
+
+def _claim(campaign_id):
+    """Mark the campaign as sending if nobody else is. Returns (subject, body, checkpoint) or None."""
+    now = datetime.now(timezone.utc)
+    campaigns = models.NewsletterCampaign.__table__
+    with engine.begin() as conn:
+        remaining = conn.execute(
+            select(func.count()).select_from(models.Newsletter.__table__)
+            .where(models.Newsletter.id > select(campaigns.c.last_subscriber_id).where(campaigns.c.id == campaign_id).scalar_subquery())
+        ).scalar()
+        row = conn.execute(
+            update(campaigns)
+            .where(
+                campaigns.c.id == campaign_id,
+                campaigns.c.status.in_(RESUMABLE_STATUSES)
+                | ((campaigns.c.status == "sending") & (campaigns.c.heartbeat_at < now - timedelta(seconds=CAMPAIGN_STALE_SECONDS)))
+            )
+            .values(
+                status="sending",
+                error=None,
+                started_at=func.coalesce(campaigns.c.started_at, now),
+                finished_at=None,
+                heartbeat_at=now,
+                total_recipients=campaigns.c.sent_count + campaigns.c.failed_count + remaining,
+            )
+            .returning(campaigns.c.subject, campaigns.c.body, campaigns.c.last_subscriber_id)
+        ).first()
+    return tuple(row) if row else None
+
+
+def _next_chunk(after_id, limit):
+    with read_engine.connect() as conn:
+        return conn.execute(
+            select(models.Newsletter.id, models.Newsletter.email)
+            .where(models.Newsletter.id > after_id)
+            .order_by(models.Newsletter.id)
+            .limit(limit)
+        ).all()
+
+
+def _checkpoint(campaign_id, last_subscriber_id, results, rate):
+    """Record a chunk's results and advance the checkpoint. Returns False if the campaign was paused."""
+    campaigns = models.NewsletterCampaign.__table__
+    sent = sum(1 for result in results if result["status"] == "sent")
+    with engine.begin() as conn:
+        if results:
+            conn.execute(
+                insert(models.CampaignDelivery.__table__)
+                .on_conflict_do_nothing(index_elements=["campaign_id", "subscriber_id"]),
+                [{"campaign_id": campaign_id, **result} for result in results]
+            )
+        status = conn.execute(
+            update(campaigns)
+            .where(campaigns.c.id == campaign_id)
+            .values(
+                last_subscriber_id=last_subscriber_id,
+                sent_count=campaigns.c.sent_count + sent,
+                failed_count=campaigns.c.failed_count + len(results) - sent,
+                messages_per_second=rate,
+                heartbeat_at=datetime.now(timezone.utc),
+            )
+            .returning(campaigns.c.status)
+        ).scalar()
+    return status == "sending"
+
+
+def _finish(campaign_id, status, error=None):
+    campaigns = models.NewsletterCampaign.__table__
+    with engine.begin() as conn:
+        conn.execute(
+            update(campaigns)
+            .where(campaigns.c.id == campaign_id, campaigns.c.status == "sending")
+            .values(status=status, error=error, finished_at=datetime.now(timezone.utc) if status == "completed" else None)
+        )
+
+
+async def _deliver(pool, throttle, subject, body, subscriber_id, email):
+    attempts = 0
+    while True:
+        attempts += 1
+        await throttle.wait()
+        try:
+            async with pool.connection() as conn:
+                await conn.send(NEWSLETTER_FROM, email, build_message(subject, body, email))
+            status, error = "sent", None
+        except SMTPError as e:
+            status, error = "failed", str(e)
+            if not e.permanent and attempts < CAMPAIGN_MAX_ATTEMPTS:
+                await asyncio.sleep(CAMPAIGN_RETRY_DELAY * 2 ** (attempts - 1))
+                continue
+        except (OSError, asyncio.TimeoutError) as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+            if attempts < CAMPAIGN_MAX_ATTEMPTS:
+                await asyncio.sleep(CAMPAIGN_RETRY_DELAY * 2 ** (attempts - 1))
+                continue
+        return {
+            "subscriber_id": subscriber_id,
+            "email": email,
+            "status": status,
+            "attempts": attempts,
+            "error": error,
+            "sent_at": datetime.now(timezone.utc) if status == "sent" else None,
+        }
+
+
+async def _send_chunk(pool, throttle, subject, body, chunk, concurrency):
+    pending = iter(chunk)
+    results = []
+
+    async def worker():
+        for subscriber_id, email in pending:
+            results.append(await _deliver(pool, throttle, subject, body, subscriber_id, email))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def _send(campaign_id, claimed, connection_factory, connections, rate, chunk_size):
+    subject, body, checkpoint = claimed
+    pool = SMTPPool(connections, connection_factory)
+    throttle = Throttle(rate)
+    started = time.monotonic()
+    attempted = 0
+    try:
+        while True:
+            chunk = await run_in_threadpool(_next_chunk, checkpoint, chunk_size)
+            if not chunk:
+                await run_in_threadpool(_finish, campaign_id, "completed")
+                return attempted
+            results = await _send_chunk(pool, throttle, subject, body, chunk, connections)
+            attempted += len(results)
+            checkpoint = chunk[-1][0]
+            rate_so_far = round(attempted / max(time.monotonic() - started, 1e-6), 1)
+            if not await run_in_threadpool(_checkpoint, campaign_id, checkpoint, results, rate_so_far):
+                return attempted
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await run_in_threadpool(_finish, campaign_id, "failed", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        await pool.close()
+
+
+async def send_campaign(campaign_id, connection_factory=SMTPConnection,
+                        connections=CAMPAIGN_SMTP_CONNECTIONS, rate=CAMPAIGN_RATE_PER_SECOND,
+                        chunk_size=CAMPAIGN_CHUNK_SIZE):
+    """Send (or resume) a campaign until it is done or paused. Returns messages attempted."""
+    claimed = await run_in_threadpool(_claim, campaign_id)
+    if claimed is None:
+        raise CampaignBusy()
+    return await _send(campaign_id, claimed, connection_factory, connections, rate, chunk_size)
+
+
+async def start_campaign(campaign_id):
+    """Claim the campaign and keep sending it in a background task on this loop."""
+    claimed = await run_in_threadpool(_claim, campaign_id)
+    if claimed is None:
+        raise CampaignBusy()
+
+    async def run():
+        try:
+            await _send(campaign_id, claimed, SMTPConnection, CAMPAIGN_SMTP_CONNECTIONS,
+                        CAMPAIGN_RATE_PER_SECOND, CAMPAIGN_CHUNK_SIZE)
+        except Exception as e:
+            print(f"❌ Campaign {campaign_id} failed: {e}")
+        finally:
+            _running.pop(campaign_id, None)
+
+    _running[campaign_id] = asyncio.get_running_loop().create_task(run())
+
+
+def pause_campaign(campaign_id):
+    """Ask the sender to stop after the chunk in flight. Returns False if it wasn't sending."""
+    campaigns = models.NewsletterCampaign.__table__
+    with engine.begin() as conn:
+        return conn.execute(
+            update(campaigns)
+            .where(campaigns.c.id == campaign_id, campaigns.c.status == "sending")
+            .values(status="paused")
+        ).rowcount > 0
+
+
+def stop_campaigns():
+    """Pause campaigns sending from this process and cancel their tasks (app shutdown)."""
+    for campaign_id, task in list(_running.items()):
+        pause_campaign(campaign_id)
+        task.cancel()
@@ -0,0 +1,185 @@
+# services/catalog_import.py
+import codecs
+import csv
+import json
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+
+import models
+import schemas
+from services.categories import adjust_product_counts
+
+IMPORT_BATCH_SIZE = 1000
+# The full report can get huge for a bad file; the count is always exact
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(filename, requested=None):
+    if requested:
+        return requested.lower()
+    if filename and filename.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def iter_rows(fileobj, import_format):
+    """Yield (row_number, dict or error string) without reading the whole file."""
+    text = codecs.getreader("utf-8-sig")(fileobj)
+    if import_format == "csv":
+        # Header is line 1, so data rows start at 2 like in a spreadsheet
+        for row_number, row in enumerate(csv.DictReader(text), start=2):
+            yield row_number, row
+    elif import_format == "jsonl":
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_number, "Expected a JSON object"
+                continue
+            yield row_number, row
+    else:
+        raise ValueError("Unsupported format, use csv or jsonl")
+
+
+def validate_row(row):
+    # Blank CSV cells mean "not provided" so schema defaults apply
+    cleaned = {
+        key.strip(): value for key, value in row.items()
+        if key and value is not None and not (isinstance(value, str) and value.strip() == "")
+    }
+    return schemas.ProductCreate(**cleaned)
+
+
+class CatalogImport:
+    """Validates and upserts products keyed on name, one transaction per batch.
+
+    Product names aren't unique in the table, so a name that already matches
+    several products is reported as an error instead of updating one of them.
+    """
+
+    def __init__(self, db, batch_size=IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.category_ids = dict(db.execute(select(models.Category.name, models.Category.id)).all())
+        self.created = 0
+        self.updated = 0
+        self.total_rows = 0
+        self.error_count = 0
+        self.errors = []
+        self.categories_created = []
+
+    def run(self, rows):
+        batch = {}
+        for row_number, row in rows:
+            self.total_rows += 1
+            if isinstance(row, str):
+                self._error(row_number, [row])
+                continue
+            try:
+                product = validate_row(row)
+            except ValidationError as e:
+                self._error(row_number, [
+                    f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+                ])
+                continue
+
+            # Later rows for the same name win, as they would row by row
+            batch[product.name] = (row_number, product)
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = {}
+
+        if batch:
+            self._write_batch(batch)
+        return self.report()
+
+    def _error(self, row_number, messages):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "errors": messages})
+
+    def _write_batch(self, batch):
+        db = self.db
+        ambiguous = dict(db.execute(
+            select(models.Product.name, func.count())
+            .where(models.Product.name.in_(list(batch)))
+            .group_by(models.Product.name)
+            .having(func.count() > 1)
+        ).all())
+        for name, matches in sorted(ambiguous.items(), key=lambda item: batch[item[0]][0]):
+            row_number, _ = batch.pop(name)
+            self._error(row_number, [f"name: matches {matches} existing products; make the names unique first"])
+        if not batch:
+            return
+        self._ensure_categories({product.category for _, product in batch.values()})
+
+        existing = {
+            name: (product_id, category_id)
+            for name, product_id, category_id in db.execute(
+                select(models.Product.name, models.Product.id, models.Product.category_id)
+                .where(models.Product.name.in_(list(batch)))
+            )
+        }
+
+        inserts = []
+        updates = []
+        count_deltas = {}
+        for name, (_, product) in batch.items():
+            category_id = self.category_ids[product.category]
+            if name in existing:
+                product_id, old_category_id = existing[name]
+                # Only overwrite what the file actually provided
+                values = product.model_dump(exclude_unset=True)
+                values["id"] = product_id
+                values["category_id"] = category_id
+                updates.append(values)
+                if old_category_id != category_id:
+                    count_deltas[old_category_id] = count_deltas.get(old_category_id, 0) - 1
+                    count_deltas[category_id] = count_deltas.get(category_id, 0) + 1
+            else:
+                values = product.model_dump()
+                values["category_id"] = category_id
+                inserts.append(values)
+                count_deltas[category_id] = count_deltas.get(category_id, 0) + 1
+
+        if inserts:
+            db.execute(insert(models.Product), inserts)
+        if updates:
+            db.execute(update(models.Product), updates)
+        adjust_product_counts(db, count_deltas)
+        db.commit()
+
+        self.created += len(inserts)
+        self.updated += len(updates)
+
+    def _ensure_categories(self, names):
+        missing = sorted(name for name in names if name not in self.category_ids)
+        if not missing:
+            return
+        db = self.db
+        for name in missing:
+            # Another request may have just created it; only count the ones inserted here
+            inserted = db.execute(
+                insert(models.Category).prefix_with("OR IGNORE").values(name=name, product_count=0)
+            ).rowcount
+            if inserted == 1:
+                self.categories_created.append(name)
+        self.category_ids.update(db.execute(
+            select(models.Category.name, models.Category.id).where(models.Category.name.in_(missing))
+        ).all())
+
+    def report(self):
+        return {
+            "total_rows": self.total_rows,
+            "created": self.created,
+            "updated": self.updated,
+            "categories_created": self.categories_created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
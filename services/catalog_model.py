@@ -0,0 +1,282 @@
+# services/catalog_model.py
+# In-process read model of the catalog for the storefront listing routes. Every
+# product is one row across a few NumPy columns (price, stock, reserved,
+# category id, flags) plus its JSON already serialized, so a listing is a few
+# vectorized masks, a slice and a bytes join: no ORM objects, no database.
+#
+# Stock and reserved move on every checkout and cart change, so those two
+# columns are re-read on their own every CATALOG_STOCK_TTL seconds and spliced
+# into the JSON per response. Everything else changes through the admin routes,
+# which patch the model directly; a full rebuild every CATALOG_MODEL_TTL picks
+# up edits made through other workers.
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+
+import models
+import schemas
+
+CATALOG_MODEL_TTL = float(os.getenv("CATALOG_MODEL_TTL", "120"))
+# How stale stock / available may be in listings
+CATALOG_STOCK_TTL = float(os.getenv("CATALOG_STOCK_TTL", "2"))
+
+DEFAULT_IMAGE_URL = "/static/uploads/default.jpg"
+
+AVAILABLE = 1
+FEATURED = 2
+
+# id order is the listing's natural order; "newest" is highest id first
+SORTS = ("price", "-price", "newest")
+
+_ARRAYS = ("ids", "price", "stock", "reserved", "category", "flags")
+_DTYPES = (np.int64, np.float64, np.int32, np.int32, np.int32, np.uint8)
+
+_product_columns = (
+    models.Product.id, models.Product.name, models.Product.description, models.Product.price,
+    models.Product.category, models.Product.category_id, models.Product.image_url,
+    models.Product.stock, models.Product.reserved, models.Product.is_available,
+    models.Product.is_featured, models.Product.created_at,
+)
+
+
+def _row(product):
+    """Column values, search key and JSON prefix for one product (mapping or ORM object)."""
+    get = product.get if isinstance(product, dict) else lambda key: getattr(product, key)
+    fields = {column.key: get(column.key) for column in _product_columns}
+    fields["image_url"] = fields["image_url"] or DEFAULT_IMAGE_URL
+    fields["stock"] = fields["stock"] or 0
+    # Stock and available are appended per response from the live columns, so the
+    # fragment stops before the closing brace
+    fragment = schemas.Product.model_validate(fields).model_dump_json(exclude={"stock", "available"}).encode()[:-1]
+    flags = (AVAILABLE if fields["is_available"] else 0) | (FEATURED if fields["is_featured"] else 0)
+    values = (
+        fields["id"],
+        np.nan if fields["price"] is None else fields["price"],
+        fields["stock"],
+        fields["reserved"] or 0,
+        -1 if fields["category_id"] is None else fields["category_id"],
+        flags,
+    )
+    return values, (fields["name"] or "").casefold(), fragment, (fields["category"], fields["category_id"])
+
+
+class CatalogSnapshot:
+    """An immutable view of the catalog; writers build a new one and swap it in."""
+
+    def __init__(self, ids, price, stock, reserved, category, flags, names, fragments, categories, built_at, stock_at):
+        self.ids = ids
+        self.price = price
+        self.stock = stock
+        self.reserved = reserved
+        self.category = category
+        self.flags = flags
+        self.names = names
+        self.fragments = fragments
+        # category name -> id, for the ?category= filter
+        self.categories = categories
+        self.built_at = built_at
+        self.stock_at = stock_at
+        # All names in one string, so a substring search is str.find at C speed
+        # and the hits map back to rows with one searchsorted over the start offsets
+        self.haystack = "\x00".join(names)
+        lengths = np.fromiter((len(name) + 1 for name in names), dtype=np.int64, count=len(names))
+        self.name_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(names) else lengths
+
+    @classmethod
+    def from_rows(cls, rows):
+        now = time.monotonic()
+        columns = [[] for _ in _ARRAYS]
+        names, fragments, categories = [], [], {}
+        for row in rows:
+            values, name, fragment, (category_name, category_id) = _row(row)
+            for column, value in zip(columns, values):
+                column.append(value)
+            names.append(name)
+            fragments.append(fragment)
+            if category_name and category_id is not None:
+                categories[category_name] = category_id
+        arrays = [np.array(column, dtype=dtype) for column, dtype in zip(columns, _DTYPES)]
+        return cls(*arrays, names, fragments, categories, now, now)
+
+    def _position(self, product_id):
+        pos = int(np.searchsorted(self.ids, product_id))
+        return pos, pos < len(self.ids) and self.ids[pos] == product_id
+
+    def with_product(self, product):
+        values, name, fragment, (category_name, category_id) = _row(product)
+        pos, exists = self._position(values[0])
+        arrays = []
+        for attr, value in zip(_ARRAYS, values):
+            column = getattr(self, attr)
+            if exists:
+                column = column.copy()
+                column[pos] = value
+            else:
+                column = np.insert(column, pos, value)
+            arrays.append(column)
+        names, fragments = list(self.names), list(self.fragments)
+        if exists:
+            names[pos], fragments[pos] = name, fragment
+        else:
+            names.insert(pos, name)
+            fragments.insert(pos, fragment)
+        categories = dict(self.categories)
+        if category_name and category_id is not None:
+            categories[category_name] = category_id
+        return CatalogSnapshot(*arrays, names, fragments, categories, self.built_at, self.stock_at)
+
+    def without_product(self, product_id):
+        pos, exists = self._position(product_id)
+        if not exists:
+            return self
+        arrays = [np.delete(getattr(self, attr), pos) for attr in _ARRAYS]
+        names, fragments = list(self.names), list(self.fragments)
+        del names[pos], fragments[pos]
+        return CatalogSnapshot(*arrays, names, fragments, self.categories, self.built_at, self.stock_at)
+
+    def with_stock(self, stock, reserved):
+        return CatalogSnapshot(
+            self.ids, self.price, stock, reserved, self.category, self.flags,
+            self.names, self.fragments, self.categories, self.built_at, time.monotonic()
+        )
+
+    def _name_contains(self, term):
+        # Same matches as the SQL LIKE '%term%' it replaces (case-insensitive)
+        term = term.casefold().replace("\x00", "")
+        mask = np.zeros(len(self.ids), dtype=bool)
+        if not term:
+            mask[:] = True
+            return mask
+        find, step = self.haystack.find, len(term)
+        hits = []
+        i = find(term)
+        while i != -1:
+            hits.append(i)
+            i = find(term, i + step)
+        if hits:
+            mask[np.searchsorted(self.name_starts, hits, side="right") - 1] = True
+        return mask
+
+    def select(self, category=None, min_price=None, max_price=None, search=None, featured=False, sort=None):
+        """Row positions of available products matching the filters, in listing order."""
+        mask = (self.flags & AVAILABLE) != 0
+        if featured:
+            mask &= (self.flags & FEATURED) != 0
+        # Same truthiness rules as the SQL filters these replace
+        if category:
+            category_id = self.categories.get(category)
+            if category_id is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.category == category_id
+        if min_price:
+            mask &= self.price >= min_price
+        if max_price:
+            mask &= self.price <= max_price
+        if search:
+            mask &= self._name_contains(search)
+        rows = np.flatnonzero(mask)
+        if sort == "price":
+            rows = rows[np.argsort(self.price[rows], kind="stable")]
+        elif sort == "-price":
+            rows = rows[np.argsort(-self.price[rows], kind="stable")]
+        elif sort == "newest":
+            rows = rows[::-1]
+        return rows
+
+    def render(self, rows):
+        """JSON array of the products at these row positions."""
+        stock = self.stock[rows]
+        available = np.maximum(stock - self.reserved[rows], 0)
+        fragments = self.fragments
+        return b"[" + b",".join(
+            fragments[row] + b',"stock":%d,"available":%d}' % (units, free)
+            for row, units, free in zip(rows.tolist(), stock.tolist(), available.tolist())
+        ) + b"]"
+
+    def product(self, product_id):
+        """JSON for one product, available or not; None if it isn't in the model."""
+        pos, exists = self._position(product_id)
+        if not exists:
+            return None
+        return self.render(np.array([pos]))[1:-1]
+
+
+class CatalogModel:
+    def __init__(self, ttl=CATALOG_MODEL_TTL, stock_ttl=CATALOG_STOCK_TTL):
+        self.ttl = ttl
+        self.stock_ttl = stock_ttl
+        self._snapshot = None
+        # Serializes rebuilds, stock refreshes and admin patches; readers never take it
+        self._lock = threading.Lock()
+
+    def rebuild(self, db):
+        rows = db.execute(select(*_product_columns).order_by(models.Product.id)).mappings().all()
+        snapshot = CatalogSnapshot.from_rows(dict(row) for row in rows)
+        self._snapshot = snapshot
+        return snapshot
+
+    def _refresh_stock(self, db, snapshot):
+        rows = db.execute(
+            select(models.Product.id, func.coalesce(models.Product.stock, 0), models.Product.reserved)
+            .order_by(models.Product.id)
+        ).all()
+        columns = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        if not np.array_equal(columns[:, 0], snapshot.ids):
+            # Products were added or deleted through another worker
+            return self.rebuild(db)
+        snapshot = snapshot.with_stock(columns[:, 1].astype(np.int32), columns[:, 2].astype(np.int32))
+        self._snapshot = snapshot
+        return snapshot
+
+    def ensure_fresh(self, db):
+        """The current snapshot, rebuilt or with stock re-read if due. Uses db only then."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Nothing to serve yet, so this is the only case that waits for a build
+            with self._lock:
+                snapshot = self._snapshot
+                # Another thread may have built it while we waited
+                if snapshot is None:
+                    snapshot = self.rebuild(db)
+            return snapshot
+        now = time.monotonic()
+        if now - snapshot.built_at >= self.ttl:
+            if self._lock.acquire(blocking=False):
+                # One request rebuilds; the others keep serving the old snapshot
+                try:
+                    current = self._snapshot
+                    if current is None or time.monotonic() - current.built_at >= self.ttl:
+                        snapshot = self.rebuild(db)
+                    else:
+                        snapshot = current
+                finally:
+                    self._lock.release()
+            return snapshot
+        if now - snapshot.stock_at >= self.stock_ttl and self._lock.acquire(blocking=False):
+            # One request refreshes; the others keep serving the stock they have
+            try:
+                current = self._snapshot
+                if current is not None and time.monotonic() - current.stock_at >= self.stock_ttl:
+                    snapshot = self._refresh_stock(db, current)
+            finally:
+                self._lock.release()
+        return snapshot
+
+    def upsert_product(self, product):
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot = self._snapshot.with_product(product)
+
+    def remove_product(self, product_id):
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot = self._snapshot.without_product(product_id)
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+catalog_model = CatalogModel()
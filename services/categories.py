@@ -0,0 +1,46 @@
+# services/categories.py
+# Products keep the category name for display, but filtering, listing and
+# delete checks go through category_id and the maintained product_count.
+from sqlalchemy import update, bindparam
+
+import models
+
+
+def get_or_create_category(db, name):
+    category = db.query(models.Category).filter(models.Category.name == name).first()
+    if not category:
+        category = models.Category(name=name, product_count=0)
+        db.add(category)
+        db.flush()
+    return category
+
+
+def adjust_product_counts(db, deltas):
+    """Apply {category_id: delta} with one executemany UPDATE."""
+    params = [
+        {"category_id": category_id, "delta": delta}
+        for category_id, delta in deltas.items()
+        if category_id is not None and delta
+    ]
+    if params:
+        db.execute(
+            update(models.Category.__table__)
+            .where(models.Category.__table__.c.id == bindparam("category_id"))
+            .values(product_count=models.Category.__table__.c.product_count + bindparam("delta")),
+            params
+        )
+
+
+def set_product_category(db, product, name):
+    """Point a new or existing product at `name`, keeping counts in step."""
+    category = get_or_create_category(db, name)
+    old_category_id = product.category_id
+    product.category = category.name
+    product.category_id = category.id
+    if old_category_id != category.id:
+        adjust_product_counts(db, {old_category_id: -1, category.id: 1})
+    return category
+
+
+def category_id_for(db, name):
+    return db.query(models.Category.id).filter(models.Category.name == name).scalar()
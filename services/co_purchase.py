@@ -0,0 +1,206 @@
+# services/co_purchase.py
+# "Frequently bought together": pair counts of products ordered together.
+# A scheduled rebuild counts every order with NumPy and keeps the top K
+# partners per product; checkout bumps the pairs of each new order in between
+# rebuilds and trims the products it touched back to K.
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from itertools import permutations
+
+import numpy as np
+from sqlalchemy import delete, func, select, tuple_, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+from database import engine
+
+CO_PURCHASE_TOP_K = int(os.getenv("CO_PURCHASE_TOP_K", "10"))
+# Huge baskets add n^2 pairs and say little about affinity
+CO_PURCHASE_MAX_BASKET = int(os.getenv("CO_PURCHASE_MAX_BASKET", "50"))
+RELATED_CACHE_TTL = float(os.getenv("RELATED_CACHE_TTL", "300"))
+RELATED_CACHE_SIZE = int(os.getenv("RELATED_CACHE_SIZE", "10000"))
+REBUILD_BATCH_SIZE = 5000
+
+
+def _pairs(product_ids):
+    basket = sorted(set(product_ids))[:CO_PURCHASE_MAX_BASKET]
+    return permutations(basket, 2)
+
+
+class RelatedCache:
+    """LRU of product id -> ranked related ids, so a hit costs O(K)."""
+
+    def __init__(self, ttl=RELATED_CACHE_TTL, max_entries=RELATED_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, product_id):
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return None
+            self._entries.move_to_end(product_id)
+            return entry[1]
+
+    def put(self, product_id, related_ids):
+        with self._lock:
+            self._entries[product_id] = (time.monotonic(), related_ids)
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, product_ids=None):
+        with self._lock:
+            if product_ids is None:
+                self._entries.clear()
+            else:
+                for product_id in product_ids:
+                    self._entries.pop(product_id, None)
+
+
+related_cache = RelatedCache()
+
+
+def related_product_ids(db, product_id):
+    related_ids = related_cache.get(product_id)
+    if related_ids is None:
+        related_ids = db.execute(
+            select(models.ProductCoPurchase.related_product_id)
+            .where(models.ProductCoPurchase.product_id == product_id)
+            .order_by(models.ProductCoPurchase.count.desc(), models.ProductCoPurchase.related_product_id)
+            .limit(CO_PURCHASE_TOP_K)
+        ).scalars().all()
+        related_cache.put(product_id, related_ids)
+    return related_ids
+
+
+def record_order(db, order_id, product_ids):
+    """Count a new order's pairs once in the given session; the caller commits.
+
+    Returns False if the order was already counted.
+    """
+    counted = db.execute(
+        sqlite_insert(models.CoPurchaseOrder)
+        .values(order_id=order_id, counted_at=datetime.now(timezone.utc))
+        .on_conflict_do_nothing(index_elements=["order_id"])
+    ).rowcount
+    if not counted:
+        return False
+    rows = [{"product_id": a, "related_product_id": b, "count": 1} for a, b in _pairs(product_ids)]
+    if not rows:
+        return True
+    stmt = sqlite_insert(models.ProductCoPurchase)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["product_id", "related_product_id"],
+            set_={"count": models.ProductCoPurchase.count + 1}
+        ),
+        rows
+    )
+    _prune(db, {a for a, _ in _pairs(product_ids)})
+    related_cache.invalidate(set(product_ids))
+    return True
+
+
+def _prune(db, product_ids, top_k=CO_PURCHASE_TOP_K):
+    """Drop partners ranked below the top K for these products, as the rebuild does."""
+    table = models.ProductCoPurchase
+    ranked = select(
+        table.product_id,
+        table.related_product_id,
+        func.row_number().over(
+            partition_by=table.product_id,
+            order_by=(table.count.desc(), table.related_product_id)
+        ).label("rank")
+    ).where(table.product_id.in_(list(product_ids))).subquery()
+    db.execute(delete(table).where(
+        tuple_(table.product_id, table.related_product_id).in_(
+            select(ranked.c.product_id, ranked.c.related_product_id).where(ranked.c.rank > top_k)
+        )
+    ))
+
+
+def forget_product(db, product_id):
+    db.execute(delete(models.ProductCoPurchase).where(
+        (models.ProductCoPurchase.product_id == product_id)
+        | (models.ProductCoPurchase.related_product_id == product_id)
+    ))
+    related_cache.invalidate()
+
+
+def _group_starts(keys):
+    """Start index and length of each run of equal values in a sorted array."""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+    return starts, np.diff(np.r_[starts, len(keys)])
+
+
+def _rank_within_groups(keys):
+    """0-based position of each element within its run of equal values."""
+    starts, sizes = _group_starts(keys)
+    return np.arange(len(keys)) - np.repeat(starts, sizes)
+
+
+def _count_pairs(order_ids, product_ids):
+    """Count ordered product pairs across baskets. Returns (product, related, count) arrays.
+
+    Same pairs as _pairs() per order: duplicates collapsed and each basket capped
+    to its CO_PURCHASE_MAX_BASKET lowest product ids.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if not len(product_ids):
+        return empty, empty, empty
+    # One key per distinct (order, product), sorted by order then product
+    span = int(product_ids.max()) + 1
+    keys = np.unique(order_ids.astype(np.int64) * span + product_ids)
+    orders, products = np.divmod(keys, span)
+    keep = _rank_within_groups(orders) < CO_PURCHASE_MAX_BASKET
+    orders, products = orders[keep], products[keep]
+
+    # Pair every item with every item of its basket: item i is repeated once per
+    # basket member, and the partner index walks the basket from its start
+    starts, sizes = _group_starts(orders)
+    item_basket_size = np.repeat(sizes, sizes)
+    left = np.repeat(np.arange(len(products)), item_basket_size)
+    partner = np.repeat(np.repeat(starts, sizes), item_basket_size) + _rank_within_groups(left)
+    distinct = left != partner
+
+    pairs, counts = np.unique(products[left[distinct]] * span + products[partner[distinct]], return_counts=True)
+    product, related = np.divmod(pairs, span)
+    return product, related, counts
+
+
+def rebuild_co_purchases(top_k=CO_PURCHASE_TOP_K):
+    """Recount every order (hot and archived) and keep the top K per product."""
+    baskets = union_all(
+        select(models.OrderItem.order_id, models.OrderItem.product_id),
+        select(models.ArchivedOrderItem.order_id, models.ArchivedOrderItem.product_id),
+    ).subquery()
+    chunks = []
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=REBUILD_BATCH_SIZE).execute(
+            select(baskets.c.order_id, baskets.c.product_id).where(baskets.c.product_id.is_not(None))
+        )
+        for partition in result.partitions():
+            chunks.append(np.array(partition, dtype=np.int64).reshape(-1, 2))
+    items = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+    product, related, count = _count_pairs(items[:, 0], items[:, 1])
+
+    # Highest count first, then lowest related id; keep the first K per product
+    order = np.lexsort((related, -count, product))
+    product, related, count = product[order], related[order], count[order]
+    keep = _rank_within_groups(product) < top_k
+    rows = [
+        {"product_id": p, "related_product_id": r, "count": c}
+        for p, r, c in zip(product[keep].tolist(), related[keep].tolist(), count[keep].tolist())
+    ]
+    with engine.begin() as conn:
+        conn.execute(delete(models.ProductCoPurchase))
+        for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+            conn.execute(models.ProductCoPurchase.__table__.insert(), rows[start:start + REBUILD_BATCH_SIZE])
+    related_cache.invalidate()
+    return len(rows)
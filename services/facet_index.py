@@ -0,0 +1,92 @@
+# services/facet_index.py
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import select, func
+
+import models
+
+# Other workers don't see our invalidations, so rebuild at least this often
+FACET_INDEX_TTL = float(os.getenv("FACET_INDEX_TTL", "30"))
+
+
+class FacetSnapshot:
+    """Sorted prices of available products, overall and per category.
+
+    Counting a price range is two bisects, so facets cost O(categories * log n)
+    however many products there are.
+    """
+
+    def __init__(self, rows):
+        by_category = {}
+        for category, price in rows:
+            by_category.setdefault(category, []).append(price)
+        for prices in by_category.values():
+            prices.sort()
+        self.by_category = by_category
+        self.all_prices = sorted(price for _, price in rows)
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _count(prices, low=None, high=None):
+        start = bisect_left(prices, low) if low is not None else 0
+        end = bisect_right(prices, high) if high is not None else len(prices)
+        return max(0, end - start)
+
+    def facets(self, category, min_price, max_price, bucket_edges):
+        # Same truthiness rules as the SQL filters in get_products
+        low = min_price if min_price else None
+        high = max_price if max_price else None
+
+        categories = [
+            {"name": name, "count": count}
+            for name, count in sorted(
+                (name, self._count(prices, low, high))
+                for name, prices in self.by_category.items() if name
+            )
+            if count
+        ]
+
+        prices = self.by_category.get(category, []) if category else self.all_prices
+        edges = list(bucket_edges) + [None]
+        price_buckets = []
+        for i in range(len(bucket_edges)):
+            # Buckets are [min, max); bisect_left on max excludes it
+            start = bisect_left(prices, edges[i]) if i else 0
+            end = bisect_left(prices, edges[i + 1]) if edges[i + 1] is not None else len(prices)
+            price_buckets.append({"min": edges[i], "max": edges[i + 1], "count": end - start})
+
+        total = self._count(prices, low, high)
+        return total, {"categories": categories, "price_buckets": price_buckets}
+
+
+class FacetIndex:
+    def __init__(self, ttl=FACET_INDEX_TTL):
+        self.ttl = ttl
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get(self, db):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.built_at < self.ttl:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have rebuilt it while we waited
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.built_at >= self.ttl:
+                rows = db.execute(
+                    select(models.Product.category, func.coalesce(models.Product.price, 0))
+                    .where(models.Product.is_available == True)
+                ).all()
+                snapshot = FacetSnapshot(rows)
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+facet_index = FacetIndex()
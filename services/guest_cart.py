@@ -0,0 +1,88 @@
+# services/guest_cart.py
+# Carts for shoppers who aren't logged in live in a signed, compressed cookie,
+# so browsing never writes to the database. They're merged into cart_items at
+# login / register.
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+from services.reservations import hold_stock_bulk
+
+GUEST_CART_COOKIE = "guest_cart"
+GUEST_CART_SECRET = os.getenv("GUEST_CART_SECRET", "change-this-guest-cart-secret").encode()
+GUEST_CART_TTL_DAYS = int(os.getenv("GUEST_CART_TTL_DAYS", "7"))
+GUEST_CART_MAX_LINES = 50
+GUEST_CART_MAX_QUANTITY = 99
+SIGNATURE_BYTES = 16
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(body):
+    return hmac.new(GUEST_CART_SECRET, body.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def encode_cart(lines):
+    """{product_id: quantity} -> token. The expiry is signed along with the lines."""
+    expires = int(time.time()) + GUEST_CART_TTL_DAYS * 86400
+    payload = json.dumps([expires, sorted(lines.items())], separators=(",", ":"))
+    body = _b64encode(zlib.compress(payload.encode(), 9))
+    return f"{body}.{_b64encode(_sign(body))}"
+
+
+def decode_cart(token):
+    """Token -> {product_id: quantity}. Tampered, expired or garbled tokens give an empty cart."""
+    if not token or "." not in token:
+        return {}
+    body, signature = token.rsplit(".", 1)
+    try:
+        if not hmac.compare_digest(_b64decode(signature), _sign(body)):
+            return {}
+        expires, lines = json.loads(zlib.decompress(_b64decode(body)))
+        if expires < time.time():
+            return {}
+        return {int(pid): int(quantity) for pid, quantity in lines[:GUEST_CART_MAX_LINES] if quantity > 0}
+    except (ValueError, TypeError, zlib.error):
+        return {}
+
+
+def merge_guest_cart(db, user_id, lines):
+    """Move a guest cart into the user's cart_items, holding stock in bulk.
+
+    Lines that can't be held are dropped. Returns {product_id: quantity merged}.
+    The caller commits.
+    """
+    if not lines:
+        return {}
+    held = hold_stock_bulk(db, user_id, lines)
+    if not held:
+        return held
+
+    now = datetime.now(timezone.utc)
+    cart_items = models.CartItem.__table__
+    stmt = sqlite_insert(cart_items)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id", "product_id"],
+            set_={"quantity": cart_items.c.quantity + stmt.excluded.quantity, "updated_at": stmt.excluded.updated_at},
+        ),
+        [
+            {"user_id": user_id, "product_id": pid, "quantity": quantity, "created_at": now, "updated_at": now}
+            for pid, quantity in held.items()
+        ]
+    )
+    return held
@@ -0,0 +1,43 @@
+# services/hot_queries.py
+# Lookups that run on almost every request, as lambda statements. SQLAlchemy
+# builds and compiles each one once per call site; later calls only extract the
+# new parameter values, skipping Query construction and cache-key generation.
+# See benchmarks/bench_hot_queries.py.
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import joinedload
+
+import models
+
+
+def product_by_id(db, product_id):
+    stmt = lambda_stmt(lambda: select(models.Product).where(models.Product.id == product_id))
+    return db.execute(stmt).scalars().first()
+
+
+def user_by_username(db, username):
+    stmt = lambda_stmt(lambda: select(models.User).where(models.User.username == username).limit(1))
+    return db.execute(stmt).scalars().first()
+
+
+def cart_items_for_user(db, user_id):
+    # Products come in the same query; the response serializes every line's product
+    stmt = lambda_stmt(
+        lambda: select(models.CartItem)
+        .options(joinedload(models.CartItem.product))
+        .where(models.CartItem.user_id == user_id)
+    )
+    return db.execute(stmt).scalars().all()
+
+
+def cart_item_for_user(db, cart_item_id, user_id):
+    stmt = lambda_stmt(
+        lambda: select(models.CartItem).where(models.CartItem.id == cart_item_id, models.CartItem.user_id == user_id)
+    )
+    return db.execute(stmt).scalars().first()
+
+
+def cart_line(db, user_id, product_id):
+    stmt = lambda_stmt(
+        lambda: select(models.CartItem).where(models.CartItem.user_id == user_id, models.CartItem.product_id == product_id)
+    )
+    return db.execute(stmt).scalars().first()
@@ -0,0 +1,256 @@
+# services/idempotency.py
+# Idempotency-Key support for POSTs: the first request with a key runs and its
+# response is stored; retries with the same key get that response replayed.
+import asyncio
+import hashlib
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+import models
+from database import engine
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# A claim older than this is assumed to belong to a crashed worker
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# How long a retry waits for an execution running on another worker
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+MAX_REQUEST_BYTES = int(os.getenv("IDEMPOTENCY_MAX_REQUEST_BYTES", str(1024 * 1024)))
+MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", str(256 * 1024)))
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1
+
+# Login responses carry a token, which shouldn't be persisted
+EXCLUDED_PATHS = {"/api/login"}
+# Transient answers; a retry should run the request again
+UNSTORED_STATUSES = {409, 429, 503}
+# Never stored or replayed; set-cookie could hand one caller's session to another
+SKIPPED_HEADERS = {b"date", b"server", b"content-length", b"set-cookie"}
+
+NEW, DONE, BUSY, MISMATCH = "new", "done", "busy", "mismatch"
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part)
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def _error(status_code, detail):
+    return JSONResponse(status_code=status_code, content={"detail": detail})
+
+
+def claim(scope, key, fingerprint):
+    """Insert the in-flight row for a key. Returns (outcome, stored response or None)."""
+    now = datetime.now(timezone.utc)
+    table = models.IdempotencyRecord.__table__
+    with engine.begin() as conn:
+        inserted = conn.execute(
+            sqlite_insert(table).values(
+                scope=scope, key=key, fingerprint=fingerprint, created_at=now,
+                expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+            ).on_conflict_do_nothing(index_elements=["scope", "key"])
+        ).rowcount
+        if inserted:
+            return NEW, None
+
+        row = conn.execute(
+            select(table.c.fingerprint, table.c.status_code, table.c.headers, table.c.body, table.c.created_at)
+            .where(table.c.scope == scope, table.c.key == key)
+        ).first()
+        if row is None:
+            # Purged between the insert and the select; let the caller retry the claim
+            return BUSY, None
+        if row.fingerprint != fingerprint:
+            return MISMATCH, None
+        if row.status_code is not None:
+            return DONE, (row.status_code, json.loads(row.headers), zlib.decompress(row.body))
+
+        stale = now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+        if row.created_at.replace(tzinfo=timezone.utc) < stale:
+            taken = conn.execute(
+                update(table)
+                .where(table.c.scope == scope, table.c.key == key,
+                       table.c.status_code.is_(None), table.c.created_at == row.created_at)
+                .values(created_at=now)
+            ).rowcount
+            if taken:
+                return NEW, None
+        return BUSY, None
+
+
+def store(scope, key, status_code, headers, body):
+    table = models.IdempotencyRecord.__table__
+    with engine.begin() as conn:
+        conn.execute(
+            update(table)
+            .where(table.c.scope == scope, table.c.key == key)
+            .values(status_code=status_code, headers=json.dumps(headers), body=zlib.compress(body))
+        )
+
+
+def release(scope, key):
+    table = models.IdempotencyRecord.__table__
+    with engine.begin() as conn:
+        conn.execute(delete(table).where(
+            table.c.scope == scope, table.c.key == key, table.c.status_code.is_(None)
+        ))
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware, so the request body can be fingerprinted and replayed.
+
+    Duplicates arriving while the first request runs on this worker wait on its
+    future and share its response. Duplicates that race with another worker
+    poll the table until that worker stores the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key", b"").decode("latin-1").strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _error(400, "Idempotency-Key is too long")(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            await _error(413, "Request body too large for Idempotency-Key")(scope, receive, send)
+            return
+
+        owner = self._owner(scope, headers)
+        fingerprint = _digest(scope["method"].encode(), scope["path"].encode(), scope["query_string"], body)
+        ident = (owner, key)
+
+        in_flight = self._in_flight.get(ident)
+        if in_flight is not None:
+            if in_flight[0] != fingerprint:
+                await _error(422, "Idempotency-Key was already used for a different request")(scope, receive, send)
+                return
+            await self._replay(await asyncio.shield(in_flight[1]), scope, receive, send)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[ident] = (fingerprint, future)
+        try:
+            response = await self._run_once(ident, fingerprint, body, scope, send)
+            future.set_result(response)
+        except BaseException:
+            future.set_result((500, [["content-type", "application/json"]], b'{"detail":"Internal Server Error"}'))
+            raise
+        finally:
+            del self._in_flight[ident]
+
+    @staticmethod
+    def _owner(scope, headers):
+        """Who a key belongs to: the bearer token, else (guests) cookies and address.
+
+        A signed-in retry from another network or with other cookies must still
+        replay, so those only tell anonymous callers apart.
+        """
+        authorization = headers.get(b"authorization")
+        if authorization:
+            return _digest(b"auth", authorization)
+        # Behind nginx run uvicorn with --proxy-headers so this is the real client
+        client_ip = scope["client"][0] if scope.get("client") else ""
+        cookies = b"; ".join(value for name, value in scope["headers"] if name == b"cookie")
+        return _digest(b"anonymous", cookies, client_ip.encode())
+
+    async def _read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > MAX_REQUEST_BYTES:
+                return None
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _run_once(self, ident, fingerprint, body, scope, send):
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            outcome, stored = await run_in_threadpool(claim, *ident, fingerprint)
+            if outcome != BUSY:
+                break
+            if time.monotonic() > deadline:
+                return await self._send_error(409, "A request with this Idempotency-Key is still in progress", scope, send)
+            await asyncio.sleep(POLL_INTERVAL)
+
+        if outcome == MISMATCH:
+            return await self._send_error(422, "Idempotency-Key was already used for a different request", scope, send)
+        if outcome == DONE:
+            await self._replay(stored, scope, None, send)
+            return stored
+
+        return await self._execute(ident, body, scope, send)
+
+    async def _execute(self, ident, body, scope, send):
+        sent = False
+        captured = {"status": 500, "headers": [], "body": []}
+
+        async def receive_body():
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", []) if name.lower() not in SKIPPED_HEADERS
+                ]
+            elif message["type"] == "http.response.body":
+                captured["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, capture)
+        except BaseException:
+            await run_in_threadpool(release, *ident)
+            raise
+
+        response = (captured["status"], captured["headers"], b"".join(captured["body"]))
+        if response[0] < 500 and response[0] not in UNSTORED_STATUSES and len(response[2]) <= MAX_RESPONSE_BYTES:
+            await run_in_threadpool(store, *ident, *response)
+        else:
+            await run_in_threadpool(release, *ident)
+        return response
+
+    async def _send_error(self, status_code, detail, scope, send):
+        response = _error(status_code, detail)
+        await response(scope, None, send)
+        return (status_code, [["content-type", "application/json"]], response.body)
+
+    async def _replay(self, response, scope, receive, send):
+        status_code, headers, body = response
+        raw_headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+        raw_headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
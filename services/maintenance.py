@@ -0,0 +1,161 @@
+# services/maintenance.py
+# Periodic housekeeping jobs, registered on the scheduler at startup.
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+
+import models
+from database import engine
+from services.reservations import sweep_expired
+from services.backup import backup_job
+from services.archival import archive_orders
+from services.co_purchase import rebuild_co_purchases
+from services.sales_snapshot import export_sales_snapshot
+from services.scheduler import scheduler
+
+CART_ABANDON_DAYS = int(os.getenv("CART_ABANDON_DAYS", "30"))
+# Opt-in retention for customer messages; 0 keeps them forever
+CONTACT_RETENTION_DAYS = int(os.getenv("CONTACT_RETENTION_DAYS", "0"))
+JOB_HISTORY_DAYS = int(os.getenv("JOB_HISTORY_DAYS", "30"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+# How far back an order stream can resume with Last-Event-ID
+ORDER_EVENT_RETENTION_DAYS = int(os.getenv("ORDER_EVENT_RETENTION_DAYS", "1"))
+PURGE_BATCH_SIZE = int(os.getenv("MAINTENANCE_PURGE_BATCH", "1000"))
+# Pages freed per incremental_vacuum run (4 KB each by default)
+VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "2000"))
+
+AUTO_VACUUM_OFF = "auto_vacuum is off; run POST /api/admin/maintenance/vacuum once during a quiet period"
+
+
+def purge_older_than(table, column, cutoff, batch_size=PURGE_BATCH_SIZE):
+    """Delete rows with column < cutoff, one short transaction per batch."""
+    key, = table.primary_key.columns
+    total = 0
+    while True:
+        batch = select(key).where(column < cutoff).limit(batch_size).scalar_subquery()
+        with engine.begin() as conn:
+            deleted = conn.execute(delete(table).where(key.in_(batch))).rowcount
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def purge_stale_rows():
+    now = datetime.now(timezone.utc)
+    cart_items = models.CartItem.__table__
+    total = purge_older_than(cart_items, cart_items.c.updated_at, now - timedelta(days=CART_ABANDON_DAYS))
+
+    if CONTACT_RETENTION_DAYS:
+        messages = models.ContactMessage.__table__
+        total += purge_older_than(messages, messages.c.created_at, now - timedelta(days=CONTACT_RETENTION_DAYS))
+
+    runs = models.JobRun.__table__
+    total += purge_older_than(runs, runs.c.started_at, now - timedelta(days=JOB_HISTORY_DAYS))
+
+    idempotency_keys = models.IdempotencyRecord.__table__
+    total += purge_older_than(idempotency_keys, idempotency_keys.c.expires_at, now)
+
+    # Only delivered events have processed_at; pending and dead ones are kept
+    outbox_events = models.OutboxEvent.__table__
+    total += purge_older_than(outbox_events, outbox_events.c.processed_at, now - timedelta(days=OUTBOX_RETENTION_DAYS))
+    # Redeliveries happen within a lease or two, long before delivered events are purged
+    counted_orders = models.CoPurchaseOrder.__table__
+    total += purge_older_than(counted_orders, counted_orders.c.counted_at, now - timedelta(days=OUTBOX_RETENTION_DAYS))
+
+    order_events = models.OrderEvent.__table__
+    total += purge_older_than(order_events, order_events.c.created_at, now - timedelta(days=ORDER_EVENT_RETENTION_DAYS))
+    return total
+
+
+def auto_vacuum_enabled():
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+
+
+def incremental_vacuum():
+    """Return up to VACUUM_PAGES free pages to the filesystem. Returns pages freed."""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Fails every run, so the job status shows it until the file is converted
+            raise RuntimeError(AUTO_VACUUM_OFF)
+        before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        steps = min(before, VACUUM_PAGES)
+        if not steps:
+            return 0
+        # Each step of the pragma frees one page and the driver only steps a
+        # statement once, so run it per page inside a single transaction
+        cursor.execute("BEGIN IMMEDIATE")
+        for _ in range(steps):
+            cursor.execute("PRAGMA incremental_vacuum")
+        # Running another statement to completion resets the last pragma so it can commit
+        after = cursor.execute("PRAGMA freelist_count").fetchall()[0][0]
+        connection.commit()
+        return before - after
+    finally:
+        connection.close()
+
+
+def enable_incremental_vacuum():
+    """Switch an existing file to auto_vacuum=INCREMENTAL with a one-off full VACUUM.
+
+    The VACUUM holds an exclusive lock while it rewrites the whole file, so this
+    is an explicit admin step for a quiet period, never a startup migration.
+    """
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+        before = cursor.execute("PRAGMA page_count").fetchone()[0] * page_size
+        converted = cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+        if converted:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        after = cursor.execute("PRAGMA page_count").fetchone()[0] * page_size
+        return {"converted": converted, "size_before": before, "size_after": after}
+    finally:
+        connection.close()
+
+
+def optimize():
+    """Refresh planner statistics. Returns the number of tables with stats."""
+    with engine.connect() as conn:
+        has_stats = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).scalar()
+        if not has_stats:
+            # PRAGMA optimize only re-analyzes tables that already have stats
+            conn.exec_driver_sql("ANALYZE")
+        else:
+            # Bounded sampling keeps this cheap on big tables
+            conn.exec_driver_sql("PRAGMA analysis_limit = 1000")
+            conn.exec_driver_sql("PRAGMA optimize")
+        conn.commit()
+        return conn.exec_driver_sql("SELECT COUNT(DISTINCT tbl) FROM sqlite_stat1").scalar() or 0
+
+
+def checkpoint_wal():
+    """Copy WAL frames back into the main file. Returns pages checkpointed."""
+    with engine.connect() as conn:
+        busy, log_pages, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").one()
+    return max(checkpointed, 0)
+
+
+def register_maintenance_jobs():
+    scheduler.register(
+        "release_expired_reservations",
+        float(os.getenv("RESERVATION_SWEEP_INTERVAL", "30")),
+        sweep_expired,
+        lease_seconds=120,
+        keep_history=False,
+    )
+    scheduler.register("purge_stale_rows", float(os.getenv("MAINTENANCE_PURGE_INTERVAL", "3600")), purge_stale_rows)
+    scheduler.register("incremental_vacuum", float(os.getenv("MAINTENANCE_VACUUM_INTERVAL", "3600")), incremental_vacuum)
+    scheduler.register("optimize", float(os.getenv("MAINTENANCE_OPTIMIZE_INTERVAL", "21600")), optimize)
+    scheduler.register("checkpoint_wal", float(os.getenv("MAINTENANCE_CHECKPOINT_INTERVAL", "300")), checkpoint_wal)
+    scheduler.register("archive_orders", float(os.getenv("MAINTENANCE_ARCHIVE_INTERVAL", "86400")), archive_orders)
+    scheduler.register("rebuild_co_purchases", float(os.getenv("MAINTENANCE_CO_PURCHASE_INTERVAL", "21600")), rebuild_co_purchases)
+    scheduler.register("sales_snapshot", float(os.getenv("SALES_SNAPSHOT_INTERVAL", "900")), export_sales_snapshot, lease_seconds=1800)
+    scheduler.register("online_backup", float(os.getenv("BACKUP_INTERVAL", "86400")), backup_job, lease_seconds=3600)
@@ -0,0 +1,104 @@
+# services/order_events.py
+# Order change events for the admin SSE stream. Each event is a row in
+# order_events written in the same transaction as the change, so its id is
+# the SSE event id: global across workers and stable across restarts, which
+# lets Last-Event-ID resume from the table. A commit on this worker wakes its
+# streams at once; events committed by other workers are picked up by polling.
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import func, insert, select
+
+import models
+from database import read_engine
+
+# Events sent per read when a stream catches up
+ORDER_EVENT_BATCH = int(os.getenv("ORDER_EVENT_BATCH", "500"))
+# How soon a stream sees events committed by another worker
+ORDER_STREAM_POLL_SECONDS = float(os.getenv("ORDER_STREAM_POLL_SECONDS", "2"))
+MAX_SUBSCRIBERS = int(os.getenv("ORDER_STREAM_MAX_SUBSCRIBERS", "50"))
+
+events_table = models.OrderEvent.__table__
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, loop):
+        self.loop = loop
+        self.wakeup = asyncio.Event()
+
+
+class OrderEventBus:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def record(self, db, event_type, orders):
+        """Add events to the caller's transaction; call notify() after commit."""
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"event_type": event_type, "order_id": order["id"], "payload": json.dumps(order), "created_at": now}
+            for order in orders
+        ]
+        if rows:
+            db.execute(insert(events_table), rows)
+
+    def notify(self):
+        """Wake this worker's streams so they read the events just committed."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.wakeup.set)
+
+    def check_capacity(self):
+        with self._lock:
+            if len(self._subscribers) >= MAX_SUBSCRIBERS:
+                raise TooManySubscribers()
+
+    def subscribe(self):
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            if len(self._subscribers) >= MAX_SUBSCRIBERS:
+                raise TooManySubscribers()
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def latest_id(self):
+        with read_engine.connect() as conn:
+            return conn.execute(select(func.max(events_table.c.id))).scalar() or 0
+
+    def since(self, last_event_id, limit=ORDER_EVENT_BATCH):
+        """Events after last_event_id, oldest first, as (id, type, order) tuples."""
+        with read_engine.connect() as conn:
+            rows = conn.execute(
+                select(events_table.c.id, events_table.c.event_type, events_table.c.payload)
+                .where(events_table.c.id > last_event_id)
+                .order_by(events_table.c.id)
+                .limit(limit)
+            ).all()
+        return [(row.id, row.event_type, json.loads(row.payload)) for row in rows]
+
+
+def order_summary(order):
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "total_amount": order.total_amount,
+        "status": order.status,
+        "payment_method": order.payment_method,
+        "payment_status": order.payment_status,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+    }
+
+
+order_events = OrderEventBus()
@@ -0,0 +1,17 @@
+# services/order_side_effects.py
+# Work that follows a checkout, run by the outbox worker after the order commits
+# instead of inside the request.
+from database import SessionLocal
+from services import outbox
+from services.co_purchase import record_order
+
+
+def count_co_purchases(payload):
+    # The outbox may deliver an event twice; record_order skips orders it has counted
+    with SessionLocal() as db:
+        record_order(db, payload["order_id"], payload["product_ids"])
+        db.commit()
+
+
+def register_order_handlers():
+    outbox.register("order_created", count_co_purchases)
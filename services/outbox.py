@@ -0,0 +1,209 @@
+# services/outbox.py
+# Transactional outbox. Request handlers call enqueue() inside their own
+# transaction, so an event exists exactly when the change that caused it was
+# committed. A background thread claims pending events in batches and runs the
+# handlers registered for their type, retrying failures with backoff.
+import json
+import os
+import random
+import socket
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+
+import models
+from database import engine, read_engine
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "2"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "600"))
+# A claimed batch not finished within this long is picked up again by any worker
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+
+outbox_table = models.OutboxEvent.__table__
+
+# event type -> {handler name: fn(payload)}
+HANDLERS = {}
+
+
+def register(event_type, fn, name=None):
+    """Run fn(payload) for every committed event of this type.
+
+    Each handler is retried on its own until it succeeds. A handler may still run
+    twice for one event (a crash after it finished but before that was recorded),
+    so it should tolerate repeats.
+    """
+    HANDLERS.setdefault(event_type, {})[name or fn.__name__] = fn
+
+
+def enqueue(db, event_type, payload):
+    """Add an event to the caller's transaction; it is delivered after commit."""
+    now = datetime.now(timezone.utc)
+    db.add(models.OutboxEvent(
+        event_type=event_type,
+        payload=json.dumps(payload),
+        status="pending",
+        created_at=now,
+        available_at=now,
+    ))
+
+
+def _backoff(attempts):
+    delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class OutboxWorker:
+    def __init__(self, batch_size=OUTBOX_BATCH_SIZE, poll_interval=OUTBOX_POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.processed = 0
+        self.retried = 0
+        self.dead = 0
+        # Seconds from commit to all handlers done, for the most recent events
+        self._lags = deque(maxlen=1000)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def wake(self):
+        """Skip the rest of the poll interval; call after committing an event."""
+        self._wakeup.set()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                handled = self.run_once()
+            except Exception as e:
+                print(f"❌ Outbox worker error: {e}")
+                handled = 0
+            # A full batch means there is probably more waiting
+            if handled < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self):
+        now = datetime.now(timezone.utc)
+        due = (
+            select(outbox_table.c.id)
+            .where(
+                outbox_table.c.status == "pending",
+                outbox_table.c.available_at <= now,
+                (outbox_table.c.locked_until == None) | (outbox_table.c.locked_until < now)
+            )
+            .order_by(outbox_table.c.id)
+            .limit(self.batch_size)
+            .scalar_subquery()
+        )
+        with engine.begin() as conn:
+            return conn.execute(
+                update(outbox_table)
+                .where(outbox_table.c.id.in_(due))
+                .values(locked_by=self.owner, locked_until=now + timedelta(seconds=OUTBOX_LEASE_SECONDS))
+                .returning(
+                    outbox_table.c.id, outbox_table.c.event_type, outbox_table.c.payload,
+                    outbox_table.c.attempts, outbox_table.c.completed_handlers, outbox_table.c.created_at
+                )
+            ).all()
+
+    def run_once(self):
+        """Claim and handle one batch. Returns the number of events claimed."""
+        events = self._claim()
+        for event in sorted(events, key=lambda e: e.id):
+            self._handle(event)
+        return len(events)
+
+    def _handle(self, event):
+        handlers = HANDLERS.get(event.event_type, {})
+        completed = set(filter(None, (event.completed_handlers or "").split(",")))
+        payload = json.loads(event.payload)
+        errors = []
+        for name, fn in list(handlers.items()):
+            if name in completed:
+                continue
+            try:
+                fn(payload)
+                completed.add(name)
+            except Exception as e:
+                errors.append(f"{name}: {type(e).__name__}: {e}")
+
+        now = datetime.now(timezone.utc)
+        values = {"locked_by": None, "locked_until": None, "completed_handlers": ",".join(sorted(completed))}
+        if not errors:
+            values.update(status="done", processed_at=now, last_error=None)
+            created_at = event.created_at.replace(tzinfo=timezone.utc)
+            self._lags.append((now - created_at).total_seconds())
+            self.processed += 1
+        else:
+            attempts = event.attempts + 1
+            values.update(attempts=attempts, last_error="; ".join(errors))
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                values.update(status="dead")
+                self.dead += 1
+                print(f"❌ Outbox event {event.id} ({event.event_type}) gave up after {attempts} attempts: {values['last_error']}")
+            else:
+                values.update(available_at=now + timedelta(seconds=_backoff(attempts)))
+                self.retried += 1
+
+        with engine.begin() as conn:
+            conn.execute(
+                update(outbox_table)
+                .where(outbox_table.c.id == event.id, outbox_table.c.locked_by == self.owner)
+                .values(**values)
+            )
+
+    def stats(self):
+        now = datetime.now(timezone.utc)
+        with read_engine.connect() as conn:
+            counts = dict(conn.execute(
+                select(outbox_table.c.status, func.count()).group_by(outbox_table.c.status)
+            ).all())
+            oldest = conn.execute(
+                select(func.min(outbox_table.c.created_at)).where(outbox_table.c.status == "pending")
+            ).scalar()
+        lags = sorted(self._lags)
+        return {
+            "pending": counts.get("pending", 0),
+            "dead": counts.get("dead", 0),
+            "done": counts.get("done", 0),
+            # How far behind the worker is right now
+            "oldest_pending_seconds": round((now - oldest.replace(tzinfo=timezone.utc)).total_seconds(), 3) if oldest else 0,
+            "processed_here": self.processed,
+            "retried_here": self.retried,
+            "dead_here": self.dead,
+            "lag_p50_ms": round(lags[len(lags) // 2] * 1000, 1) if lags else None,
+            "lag_max_ms": round(lags[-1] * 1000, 1) if lags else None,
+            "handlers": {event_type: sorted(fns) for event_type, fns in HANDLERS.items()},
+        }
+
+
+outbox_worker = OutboxWorker()
+
+
+def retry_dead_events():
+    """Put dead events back in the queue with a fresh attempt budget. Returns how many."""
+    with engine.begin() as conn:
+        return conn.execute(
+            update(outbox_table)
+            .where(outbox_table.c.status == "dead")
+            .values(status="pending", attempts=0, available_at=datetime.now(timezone.utc))
+        ).rowcount
@@ -0,0 +1,128 @@
+# services/profiler.py
+# On-demand stack sampler for live diagnosis. sys._current_frames() is read
+# at a fixed interval from the calling thread, so every other thread in the
+# worker shows up: the event loop, the anyio threadpool running sync routes,
+# the scheduler and the other background threads. No tracing hooks are
+# installed, so nothing is slowed down between samples.
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+PROFILE_MIN_INTERVAL = float(os.getenv("PROFILE_MIN_INTERVAL", "0.005"))
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "64"))
+# Distinct stacks kept; the rest are folded into one "[other]" line
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "5000"))
+
+# (file suffix, function) for leaf frames that mean "blocked, not working"
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+}
+
+# Only one profile per process at a time
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _stack(frame):
+    labels = []
+    idle = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    if frame is not None:
+        labels.append("[truncated]")
+    labels.reverse()
+    return tuple(labels), idle
+
+
+def profile(seconds, interval=0.01, include_idle=False, top=30):
+    """Sample every other thread's stack for `seconds`. Raises ProfilerBusy if one is already running."""
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    interval = max(interval, PROFILE_MIN_INTERVAL)
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        idle_samples = 0
+        sampling_time = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_sample = started
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now < next_sample:
+                time.sleep(next_sample - now)
+            next_sample += interval
+
+            tick = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack, idle = _stack(frame)
+                if idle:
+                    idle_samples += 1
+                    if not include_idle:
+                        continue
+                key = (names.get(ident, f"thread-{ident}"),) + stack
+                if key in stacks or len(stacks) < PROFILE_MAX_STACKS:
+                    stacks[key] += 1
+                else:
+                    stacks[("[other]",)] += 1
+            samples += 1
+            sampling_time += time.perf_counter() - tick
+        elapsed = time.perf_counter() - started
+    finally:
+        _busy.release()
+
+    return {
+        "seconds": round(elapsed, 3),
+        "interval_ms": round(interval * 1000, 2),
+        "samples": samples,
+        "idle_stacks_skipped": 0 if include_idle else idle_samples,
+        # Time the sampler itself held the GIL, as a share of the window
+        "overhead_pct": round(sampling_time / elapsed * 100, 2) if elapsed else 0,
+        "top": _top_functions(stacks, top),
+        "collapsed": "\n".join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()),
+    }
+
+
+def _top_functions(stacks, limit):
+    self_counts = Counter()
+    total_counts = Counter()
+    observed = sum(stacks.values())
+    for stack, count in stacks.items():
+        frames = stack[1:]
+        if not frames:
+            continue
+        self_counts[frames[-1]] += count
+        # Recursive functions count once per stack
+        for label in set(frames):
+            total_counts[label] += count
+    return [
+        {
+            "function": label,
+            "self": self_counts[label],
+            "self_pct": round(self_counts[label] / observed * 100, 1),
+            "total": total,
+            "total_pct": round(total / observed * 100, 1),
+        }
+        for label, total in sorted(total_counts.items(), key=lambda item: (-self_counts[item[0]], -item[1]))[:limit]
+    ]
@@ -0,0 +1,113 @@
+# services/rate_limit.py
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+# Buckets kept per limiter before the least recently used (most idle) is dropped
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "50000"))
+
+# Per route: (per-IP limit, per-identifier limit), overridable with
+# RATE_LIMIT_<ROUTE>_IP / RATE_LIMIT_<ROUTE>_ID, e.g. RATE_LIMIT_LOGIN_IP=30/minute
+DEFAULT_LIMITS = {
+    "login": ("20/minute", "5/minute"),
+    "register": ("5/minute", "3/hour"),
+    "contact": ("5/minute", "5/hour"),
+    "newsletter": ("10/minute", "3/hour"),
+}
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_limit(limit):
+    """'5/minute' -> (capacity, tokens per second)."""
+    count, _, period = limit.partition("/")
+    seconds = PERIODS[period.strip().rstrip("s") or "second"]
+    capacity = int(count)
+    return capacity, capacity / seconds
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by string, bounded with LRU eviction.
+
+    A bucket is just [tokens, last_refill] refilled lazily on access, so the
+    lock is only held for a dict lookup and a little arithmetic.
+    """
+
+    def __init__(self, capacity, refill_rate, max_buckets=MAX_BUCKETS):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Take one token. Returns 0 if allowed, else seconds until retry."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_buckets:
+                    self._buckets.popitem(last=False)
+                bucket = [self.capacity, now]
+                self._buckets[key] = bucket
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.refill_rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimit:
+    """Route dependency limiting by client IP and optionally a body field.
+
+    Usage: @router.post("/login", dependencies=[Depends(RateLimit("login", "username"))])
+    """
+
+    def __init__(self, name, identifier_field=None, ip_limit=None, identifier_limit=None):
+        default_ip, default_identifier = DEFAULT_LIMITS.get(name, ("60/minute", "10/minute"))
+        ip_limit = ip_limit or os.getenv(f"RATE_LIMIT_{name.upper()}_IP", default_ip)
+        identifier_limit = identifier_limit or os.getenv(f"RATE_LIMIT_{name.upper()}_ID", default_identifier)
+
+        self.name = name
+        self.identifier_field = identifier_field
+        self.ip_limiter = TokenBucketLimiter(*parse_limit(ip_limit))
+        self.identifier_limiter = TokenBucketLimiter(*parse_limit(identifier_limit)) if identifier_field else None
+
+    async def __call__(self, request: Request):
+        # Behind nginx run uvicorn with --proxy-headers so this is the real client
+        client_ip = request.client.host if request.client else "unknown"
+        retry_after = self.ip_limiter.hit(client_ip)
+
+        if not retry_after and self.identifier_limiter is not None:
+            identifier = await self._identifier(request)
+            if identifier:
+                retry_after = self.identifier_limiter.hit(identifier)
+
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    async def _identifier(self, request):
+        # FastAPI has already read the body for the route, so this is cached
+        try:
+            body = await request.json()
+        except Exception:
+            return None
+        if not isinstance(body, dict):
+            return None
+        value = body.get(self.identifier_field)
+        return str(value).strip().lower() if value else None
@@ -0,0 +1,164 @@
+# services/reservations.py
+# Stock is held when it goes into a cart. products.reserved is the running total
+# of live holds, so available-to-sell is just stock - reserved.
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update, delete, select, bindparam, case, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+from database import SessionLocal
+
+RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", "15"))
+SWEEP_BATCH_SIZE = int(os.getenv("RESERVATION_SWEEP_BATCH", "500"))
+
+products = models.Product.__table__
+reservations = models.StockReservation.__table__
+
+
+def _adjust_reserved(db, deltas):
+    params = [{"product_id": pid, "delta": delta} for pid, delta in deltas.items() if delta]
+    if params:
+        db.execute(
+            update(products)
+            .where(products.c.id == bindparam("product_id"))
+            .values(reserved=products.c.reserved + bindparam("delta")),
+            params
+        )
+
+
+def hold_stock(db, user_id, product_id, quantity):
+    """Add `quantity` to the user's hold on a product. False if not enough is available.
+
+    The conditional UPDATE makes check-and-hold a single atomic statement. A
+    non-positive quantity never matches, so no caller can lower reserved.
+    """
+    result = db.execute(
+        update(products)
+        .where(products.c.id == product_id, literal(quantity) > 0,
+               products.c.stock - products.c.reserved >= quantity)
+        .values(reserved=products.c.reserved + quantity)
+    )
+    if result.rowcount != 1:
+        return False
+
+    now = datetime.now(timezone.utc)
+    stmt = sqlite_insert(reservations).values(
+        user_id=user_id,
+        product_id=product_id,
+        quantity=quantity,
+        expires_at=now + timedelta(minutes=RESERVATION_TTL_MINUTES),
+        created_at=now,
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "product_id"],
+        set_={"quantity": reservations.c.quantity + stmt.excluded.quantity, "expires_at": stmt.excluded.expires_at},
+    ))
+    return True
+
+
+def hold_stock_bulk(db, user_id, quantities):
+    """Hold several products at once, trimmed to what is available. Returns {product_id: held}.
+
+    One read to size the holds, then one conditional UPDATE ... RETURNING that
+    reports which products were actually held if stock moved in between.
+    """
+    available = dict(db.execute(
+        select(products.c.id, products.c.stock - products.c.reserved)
+        .where(products.c.id.in_(list(quantities)), products.c.is_available == True)
+    ).all())
+    wanted = {pid: min(quantity, available.get(pid, 0)) for pid, quantity in quantities.items()}
+    wanted = {pid: quantity for pid, quantity in wanted.items() if quantity > 0}
+    if not wanted:
+        return {}
+
+    amount = case(wanted, value=products.c.id)
+    held_ids = db.execute(
+        update(products)
+        .where(products.c.id.in_(list(wanted)), amount > 0, products.c.stock - products.c.reserved >= amount)
+        .values(reserved=products.c.reserved + amount)
+        .returning(products.c.id)
+    ).scalars().all()
+    held = {pid: wanted[pid] for pid in held_ids}
+    if not held:
+        return held
+
+    now = datetime.now(timezone.utc)
+    stmt = sqlite_insert(reservations)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id", "product_id"],
+            set_={"quantity": reservations.c.quantity + stmt.excluded.quantity, "expires_at": stmt.excluded.expires_at},
+        ),
+        [
+            {"user_id": user_id, "product_id": pid, "quantity": quantity,
+             "expires_at": now + timedelta(minutes=RESERVATION_TTL_MINUTES), "created_at": now}
+            for pid, quantity in held.items()
+        ]
+    )
+    return held
+
+
+def release_holds(db, user_id, product_id=None):
+    """Drop the user's holds (one product or all). Returns {product_id: quantity}.
+
+    DELETE ... RETURNING reports exactly what was removed, so a concurrent
+    sweep can never make us release the same units twice.
+    """
+    stmt = delete(reservations).where(reservations.c.user_id == user_id)
+    if product_id is not None:
+        stmt = stmt.where(reservations.c.product_id == product_id)
+
+    released = {}
+    for pid, quantity in db.execute(stmt.returning(reservations.c.product_id, reservations.c.quantity)):
+        released[pid] = released.get(pid, 0) + quantity
+    _adjust_reserved(db, {pid: -quantity for pid, quantity in released.items()})
+    return released
+
+
+def set_hold(db, user_id, product_id, quantity):
+    """Replace the user's hold on a product. On False the caller must roll back."""
+    release_holds(db, user_id, product_id)
+    return hold_stock(db, user_id, product_id, quantity)
+
+
+def take_stock(db, product_id, quantity):
+    """Deduct sold units from stock, only if they are not held by someone else."""
+    result = db.execute(
+        update(products)
+        .where(products.c.id == product_id, literal(quantity) > 0,
+               products.c.stock - products.c.reserved >= quantity)
+        .values(stock=products.c.stock - quantity)
+    )
+    return result.rowcount == 1
+
+
+def sweep_expired(batch_size=SWEEP_BATCH_SIZE):
+    """Release expired holds in batches, one short transaction each."""
+    total = 0
+    while True:
+        db = SessionLocal()
+        try:
+            expired = (
+                select(reservations.c.id)
+                .where(reservations.c.expires_at < datetime.now(timezone.utc))
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            released = {}
+            count = 0
+            for pid, quantity in db.execute(
+                delete(reservations).where(reservations.c.id.in_(expired))
+                .returning(reservations.c.product_id, reservations.c.quantity)
+            ):
+                released[pid] = released.get(pid, 0) + quantity
+                count += 1
+            _adjust_reserved(db, {pid: -quantity for pid, quantity in released.items()})
+            db.commit()
+        finally:
+            db.close()
+
+        total += count
+        if count < batch_size:
+            return total
@@ -0,0 +1,353 @@
+# services/sales_snapshot.py
+# Order-item facts for sales reports, kept as one flat binary file per column.
+# The snapshot job appends line items added since its last run; reports
+# memory-map the files and aggregate them with NumPy, so they never query the
+# live database.
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import select, union_all
+
+import models
+from database import read_engine
+
+SNAPSHOT_DIR = os.getenv("SALES_SNAPSHOT_DIR", "snapshots/sales")
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SALES_SNAPSHOT_BATCH", "50000"))
+
+COLUMNS = {
+    "item_id": np.int64,
+    "order_id": np.int64,
+    "user_id": np.int32,
+    "product_id": np.int32,
+    "quantity": np.int32,
+    "revenue": np.float64,
+    "day": np.int32,     # days since 1970-01-01 of the order's created_at
+    "status": np.int8,   # index into the manifest's status list
+}
+GROUP_BY = ("none", "product", "category", "day", "week", "month")
+SORT_BY = ("revenue", "units", "orders")
+EXCLUDED_STATUSES = ("cancelled",)
+EPOCH = date(1970, 1, 1)
+# 1970-01-01 was a Thursday, weeks start on Monday
+FIRST_MONDAY = 4
+
+
+class SnapshotMissing(Exception):
+    pass
+
+
+def _path(name):
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def _read_manifest():
+    try:
+        with open(_path("manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"rows": 0, "watermark": 0, "statuses": [], "exported_at": None, "started_at": None}
+
+
+def _write_json(name, data):
+    # Readers only trust what the manifest says, so it is swapped in last and atomically
+    tmp = _path(name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, _path(name))
+
+
+def _items_query(after, limit):
+    def facts(item, order):
+        return (
+            select(
+                item.id.label("item_id"), item.order_id, order.user_id, item.product_id,
+                item.quantity, item.price, order.created_at, order.status
+            )
+            .join(order, order.id == item.order_id)
+            .where(item.id > after)
+        )
+
+    facts_union = union_all(
+        facts(models.OrderItem, models.Order),
+        facts(models.ArchivedOrderItem, models.ArchivedOrder)
+    ).subquery()
+    return select(facts_union).order_by(facts_union.c.item_id).limit(limit)
+
+
+def _status_codes(values, statuses):
+    codes = []
+    for value in values:
+        value = value or "pending"
+        if value not in statuses:
+            statuses.append(value)
+        codes.append(statuses.index(value))
+    return np.array(codes, dtype=np.int8)
+
+
+def _append_batch(rows, statuses):
+    columns = {
+        "item_id": [row.item_id for row in rows],
+        "order_id": [row.order_id for row in rows],
+        "user_id": [row.user_id or 0 for row in rows],
+        "product_id": [row.product_id or 0 for row in rows],
+        "quantity": [row.quantity or 0 for row in rows],
+        "revenue": [(row.quantity or 0) * (row.price or 0) for row in rows],
+    }
+    days = np.array([row.created_at or datetime(1970, 1, 1) for row in rows], dtype="datetime64[D]")
+    arrays = {name: np.asarray(values, dtype=COLUMNS[name]) for name, values in columns.items()}
+    arrays["day"] = days.astype(np.int32)
+    arrays["status"] = _status_codes([row.status for row in rows], statuses)
+    for name, array in arrays.items():
+        with open(_path(f"{name}.bin"), "ab") as f:
+            f.write(array.tobytes())
+
+
+def _refresh_statuses(conn, rows, statuses, since):
+    """Rewrite the status of already exported items whose order changed status."""
+    if not rows:
+        return
+    current = [select(models.Order.id, models.Order.status)]
+    if since:
+        # Orders archived since the last run may have changed status just before moving
+        current.append(
+            select(models.ArchivedOrder.id, models.ArchivedOrder.status)
+            .where(models.ArchivedOrder.archived_at >= datetime.fromisoformat(since))
+        )
+    changed = conn.execute(union_all(*current)).all()
+    if not changed:
+        return
+
+    ids = np.array([order_id for order_id, _ in changed], dtype=np.int64)
+    codes = _status_codes([status for _, status in changed], statuses)
+    order = np.argsort(ids)
+    ids, codes = ids[order], codes[order]
+
+    order_ids = np.memmap(_path("order_id.bin"), dtype=COLUMNS["order_id"], mode="r", shape=(rows,))
+    status = np.memmap(_path("status.bin"), dtype=COLUMNS["status"], mode="r+", shape=(rows,))
+    idx = np.minimum(np.searchsorted(ids, order_ids), len(ids) - 1)
+    found = ids[idx] == order_ids
+    updated = np.flatnonzero(found & (codes[idx] != status))
+    if len(updated):
+        status[updated] = codes[idx[updated]]
+        status.flush()
+
+
+def export_sales_snapshot():
+    """Append line items added since the last run and refresh order statuses. Returns rows appended."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    manifest = _read_manifest()
+    rows = manifest["rows"]
+    statuses = manifest["statuses"]
+    started_at = datetime.now(timezone.utc)
+
+    # Drop anything a crashed run wrote past the last manifest
+    for name, dtype in COLUMNS.items():
+        with open(_path(f"{name}.bin"), "ab") as f:
+            f.truncate(rows * np.dtype(dtype).itemsize)
+
+    appended = 0
+    watermark = manifest["watermark"]
+    with read_engine.connect() as conn:
+        while True:
+            batch = conn.execute(_items_query(watermark, SNAPSHOT_BATCH_SIZE)).all()
+            if not batch:
+                break
+            _append_batch(batch, statuses)
+            appended += len(batch)
+            watermark = batch[-1].item_id
+
+        _refresh_statuses(conn, rows, statuses, manifest["started_at"])
+
+        products = conn.execute(
+            select(models.Product.id, models.Product.name, models.Product.category_id)
+        ).all()
+        categories = conn.execute(select(models.Category.id, models.Category.name)).all()
+
+    _write_json("dimensions.json", {
+        "products": [list(row) for row in products],
+        "categories": [list(row) for row in categories],
+    })
+    _write_json("manifest.json", {
+        "rows": rows + appended,
+        "watermark": watermark,
+        "statuses": statuses,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "started_at": started_at.isoformat(),
+    })
+    return appended
+
+
+class SalesSnapshot:
+    """Memory-mapped view of the last export, reopened when the job writes a new manifest."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+
+    def load(self):
+        try:
+            version = os.stat(_path("manifest.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if version != self._version:
+                self._data = self._open()
+                self._version = version
+            return self._data
+
+    def _open(self):
+        manifest = _read_manifest()
+        with open(_path("dimensions.json")) as f:
+            dimensions = json.load(f)
+        rows = manifest["rows"]
+        columns = {
+            name: np.memmap(_path(f"{name}.bin"), dtype=dtype, mode="r", shape=(rows,))
+            if rows else np.zeros(0, dtype=dtype)
+            for name, dtype in COLUMNS.items()
+        }
+
+        max_product_id = max([row[0] for row in dimensions["products"]] + [int(columns["product_id"].max(initial=0))])
+        category_of = np.full(max_product_id + 1, -1, dtype=np.int32)
+        for product_id, _, category_id in dimensions["products"]:
+            category_of[product_id] = category_id if category_id is not None else -1
+
+        order_ids = columns["order_id"]
+        return {
+            "rows": rows,
+            "columns": columns,
+            "statuses": manifest["statuses"],
+            "exported_at": manifest["exported_at"],
+            "category_of": category_of,
+            "product_names": {row[0]: row[1] for row in dimensions["products"]},
+            "category_names": {row[0]: row[1] for row in dimensions["categories"]},
+            # Items are appended in id order, so an order's lines are normally
+            # adjacent and distinct orders can be counted without sorting
+            "orders_contiguous": bool(np.all(order_ids[1:] >= order_ids[:-1])),
+        }
+
+
+sales_snapshot = SalesSnapshot()
+
+
+def _distinct(values):
+    # Lines arrive roughly in order id order, which timsort ("stable") handles far
+    # faster than np.unique's default sort
+    values = np.sort(values, kind="stable")
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+
+def _group_keys(data, group_by, columns, mask):
+    if group_by == "none":
+        return np.zeros(int(mask.sum()), dtype=np.int64)
+    if group_by == "product":
+        return columns["product_id"][mask].astype(np.int64)
+    if group_by == "category":
+        return data["category_of"][columns["product_id"][mask]].astype(np.int64)
+    days = columns["day"][mask].astype(np.int64)
+    if group_by == "day":
+        return days
+    if group_by == "week":
+        return days - (days - FIRST_MONDAY) % 7
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def _label(data, group_by, key):
+    if group_by == "product":
+        return data["product_names"].get(key, f"Deleted product #{key}")
+    if group_by == "category":
+        return data["category_names"].get(key, "Uncategorized")
+    if group_by in ("day", "week"):
+        return (EPOCH + timedelta(days=key)).isoformat()
+    if group_by == "month":
+        return f"{1970 + key // 12:04d}-{key % 12 + 1:02d}"
+    return "all"
+
+
+def sales_report(group_by="none", start=None, end=None, statuses=None, category_id=None, sort="revenue", limit=20):
+    """Revenue, units and order counts per group over the snapshot."""
+    data = sales_snapshot.load()
+    if data is None:
+        raise SnapshotMissing()
+    begin = time.perf_counter()
+    columns = data["columns"]
+
+    if statuses is None:
+        statuses = [s for s in data["statuses"] if s not in EXCLUDED_STATUSES]
+    allowed = np.array([s in statuses for s in data["statuses"]] + [False], dtype=bool)
+    mask = allowed[columns["status"]]
+    if start:
+        mask &= columns["day"] >= (start - EPOCH).days
+    if end:
+        mask &= columns["day"] <= (end - EPOCH).days
+    if category_id is not None:
+        mask &= data["category_of"][columns["product_id"]] == category_id
+
+    keys = _group_keys(data, group_by, columns, mask)
+    revenue = columns["revenue"][mask]
+    quantity = columns["quantity"][mask]
+    order_ids = columns["order_id"][mask]
+
+    # Every group key here is a small integer range, so bincount beats sorting
+    offset = int(keys.min()) if len(keys) else 0
+    slots = keys - offset
+    size = int(slots.max()) + 1 if len(slots) else 0
+    group_revenue = np.bincount(slots, weights=revenue, minlength=size)
+    group_units = np.bincount(slots, weights=quantity, minlength=size)
+    group_lines = np.bincount(slots, minlength=size)
+
+    if data["orders_contiguous"] and group_by not in ("product", "category"):
+        # The key is the same for every line of an order, so each order is one run
+        first = np.ones(len(slots), dtype=bool)
+        first[1:] = order_ids[1:] != order_ids[:-1]
+        group_orders = np.bincount(slots[first], minlength=size)
+    else:
+        pairs = _distinct(order_ids * max(size, 1) + slots)
+        group_orders = np.bincount(pairs % max(size, 1), minlength=size)
+
+    present = np.flatnonzero(group_lines)
+    if group_by in ("product", "category"):
+        metric = {"revenue": group_revenue, "units": group_units, "orders": group_orders}[sort]
+        present = present[np.argsort(-metric[present], kind="stable")][:limit]
+
+    groups = []
+    for slot in present.tolist():
+        orders = int(group_orders[slot])
+        key = slot + offset
+        groups.append({
+            "key": key,
+            "label": _label(data, group_by, key),
+            "revenue": round(float(group_revenue[slot]), 2),
+            "units": int(group_units[slot]),
+            "orders": orders,
+            "avg_order_value": round(float(group_revenue[slot]) / orders, 2) if orders else 0,
+            "avg_units_per_order": round(float(group_units[slot]) / orders, 2) if orders else 0,
+        })
+
+    first_of_order = np.ones(len(order_ids), dtype=bool)
+    first_of_order[1:] = order_ids[1:] != order_ids[:-1]
+    total_orders = int(first_of_order.sum()) if data["orders_contiguous"] else len(_distinct(order_ids))
+    total_revenue = float(revenue.sum())
+    total_units = int(quantity.sum())
+    return {
+        "group_by": group_by,
+        "statuses": statuses,
+        "exported_at": data["exported_at"],
+        "rows_scanned": data["rows"],
+        "rows_matched": len(keys),
+        "elapsed_ms": round((time.perf_counter() - begin) * 1000, 2),
+        "totals": {
+            "revenue": round(total_revenue, 2),
+            "units": total_units,
+            "orders": total_orders,
+            "avg_order_value": round(total_revenue / total_orders, 2) if total_orders else 0,
+            "avg_units_per_order": round(total_units / total_orders, 2) if total_orders else 0,
+        },
+        "groups": groups,
+    }
@@ -0,0 +1,186 @@
+# services/scheduler.py
+# In-process periodic jobs. Every worker runs a scheduler thread, but a job
+# only runs where its lease row in scheduled_jobs could be claimed, so with
+# several uvicorn workers each job still runs once per interval. Each run gets
+# its own thread, so an hour-long backup never holds up the 30 s reservation sweep.
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, update, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+from database import engine
+
+TICK_SECONDS = float(os.getenv("SCHEDULER_TICK", "5"))
+# First attempt is never sooner than this after startup
+STARTUP_DELAY_SECONDS = float(os.getenv("SCHEDULER_STARTUP_DELAY", "60"))
+
+jobs_table = models.ScheduledJob.__table__
+runs_table = models.JobRun.__table__
+
+
+class Job:
+    def __init__(self, name, interval, fn, lease_seconds=600, keep_history=True):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.lease_seconds = lease_seconds
+        self.keep_history = keep_history
+        self.next_attempt = 0.0
+        # The run in progress on this worker, if any
+        self.thread = None
+
+
+class Scheduler:
+    def __init__(self, tick=TICK_SECONDS):
+        self.tick = tick
+        self.jobs = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def register(self, name, interval, fn, **kwargs):
+        """fn() does the work and returns the number of rows/pages affected."""
+        self.jobs[name] = Job(name, interval, fn, **kwargs)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        now = time.monotonic()
+        for job in self.jobs.values():
+            job.next_attempt = now + min(job.interval, STARTUP_DELAY_SECONDS)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        deadline = time.monotonic() + 30
+        for thread in [self._thread] + [job.thread for job in self.jobs.values()]:
+            if thread:
+                thread.join(timeout=max(0, deadline - time.monotonic()))
+
+    def _run(self):
+        while not self._stopping.wait(self.tick):
+            for job in list(self.jobs.values()):
+                if self._stopping.is_set():
+                    return
+                if job.thread is not None and job.thread.is_alive():
+                    continue
+                if time.monotonic() < job.next_attempt:
+                    continue
+                job.next_attempt = time.monotonic() + job.interval
+                job.thread = threading.Thread(
+                    target=self._run_scheduled, args=(job.name,), name=f"job-{job.name}", daemon=True
+                )
+                job.thread.start()
+
+    def _run_scheduled(self, name):
+        try:
+            self.run_job(name)
+        except Exception as e:
+            print(f"❌ Scheduler error in {name}: {e}")
+
+    def run_job(self, name, force=False):
+        """Run a job here if its lease can be claimed. Returns the run record or None.
+
+        force=True skips the interval check (admin "run now") but still
+        respects a lease held by another worker.
+        """
+        job = self.jobs[name]
+        started_at = datetime.now(timezone.utc)
+        if not self._claim(job, started_at, force):
+            return None
+
+        start = time.perf_counter()
+        rows_affected = 0
+        status = "ok"
+        error = None
+        try:
+            rows_affected = job.fn() or 0
+        except Exception as e:
+            status = "error"
+            error = str(e)
+            print(f"❌ Job {name} failed: {e}")
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        run = {
+            "job_name": name,
+            "started_at": started_at,
+            "duration_ms": duration_ms,
+            "rows_affected": rows_affected,
+            "status": status,
+            "error": error,
+        }
+        self._finish(job, run)
+        return run
+
+    def _claim(self, job, now, force):
+        with engine.begin() as conn:
+            conn.execute(sqlite_insert(jobs_table).values(name=job.name).on_conflict_do_nothing())
+            conditions = [
+                jobs_table.c.name == job.name,
+                or_(jobs_table.c.lease_expires_at.is_(None), jobs_table.c.lease_expires_at < now),
+            ]
+            if not force:
+                conditions.append(or_(
+                    jobs_table.c.last_started_at.is_(None),
+                    jobs_table.c.last_started_at <= now - timedelta(seconds=job.interval - self.tick),
+                ))
+            result = conn.execute(
+                update(jobs_table).where(*conditions).values(
+                    owner=self.owner,
+                    lease_expires_at=now + timedelta(seconds=job.lease_seconds),
+                    last_started_at=now,
+                )
+            )
+            return result.rowcount == 1
+
+    def _finish(self, job, run):
+        with engine.begin() as conn:
+            conn.execute(
+                update(jobs_table)
+                .where(jobs_table.c.name == job.name, jobs_table.c.owner == self.owner)
+                .values(
+                    owner=None,
+                    lease_expires_at=None,
+                    last_finished_at=datetime.now(timezone.utc),
+                    last_duration_ms=run["duration_ms"],
+                    last_rows_affected=run["rows_affected"],
+                    last_status=run["status"],
+                    last_error=run["error"],
+                )
+            )
+            if job.keep_history or run["status"] != "ok":
+                conn.execute(insert(runs_table).values(**run))
+
+    def status(self, history=20):
+        with engine.connect() as conn:
+            rows = {row.name: row for row in conn.execute(select(jobs_table))}
+            recent = conn.execute(
+                select(runs_table).order_by(runs_table.c.id.desc()).limit(history)
+            ).mappings().all()
+
+        jobs = []
+        for name, job in self.jobs.items():
+            row = rows.get(name)
+            jobs.append({
+                "name": name,
+                "interval_seconds": job.interval,
+                "running_on": row.owner if row else None,
+                "last_started_at": row.last_started_at if row else None,
+                "last_finished_at": row.last_finished_at if row else None,
+                "last_duration_ms": row.last_duration_ms if row else None,
+                "last_rows_affected": row.last_rows_affected if row else None,
+                "last_status": row.last_status if row else None,
+                "last_error": row.last_error if row else None,
+            })
+        return {"worker": self.owner, "jobs": jobs, "recent_runs": [dict(run) for run in recent]}
+
+
+scheduler = Scheduler()
@@ -0,0 +1,207 @@
+# services/smtp.py
+# Minimal asyncio SMTP client and a bounded connection pool for bulk mail.
+# When the server advertises PIPELINING, MAIL / RCPT / DATA go out in one write
+# and their replies are read back together, so a message costs two round trips
+# instead of four.
+import asyncio
+import base64
+import os
+import re
+import socket
+import ssl
+from contextlib import asynccontextmanager
+
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+# "ssl" for implicit TLS (port 465), "starttls" to upgrade after EHLO, anything else for plain
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_HELO_NAME = os.getenv("SMTP_HELO_NAME") or socket.gethostname()
+# Reconnect after this many messages; many providers cap messages per session
+SMTP_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MESSAGES_PER_CONNECTION", "100"))
+
+
+class SMTPError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.message = message
+
+    @property
+    def permanent(self):
+        return self.code >= 500
+
+
+class SMTPRecipientRefused(SMTPError):
+    pass
+
+
+class SMTPConnection:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, security=SMTP_SECURITY,
+                 username=SMTP_USERNAME, password=SMTP_PASSWORD, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.pipelining = False
+        self.messages_sent = 0
+        self._reader = None
+        self._writer = None
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.security in ("ssl", "starttls") else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context if self.security == "ssl" else None),
+            self.timeout
+        )
+        await self._expect(220)
+        extensions = await self._ehlo()
+        if self.security == "starttls":
+            await self._command("STARTTLS", 220)
+            await self._writer.start_tls(context, server_hostname=self.host)
+            extensions = await self._ehlo()
+        if self.username:
+            token = base64.b64encode(f"\0{self.username}\0{self.password}".encode()).decode()
+            await self._command(f"AUTH PLAIN {token}", 235)
+        self.pipelining = "PIPELINING" in extensions
+
+    async def send(self, sender, recipient, message):
+        """Deliver one message (bytes with CRLF line endings) to one recipient."""
+        commands = [f"MAIL FROM:<{sender}>", f"RCPT TO:<{recipient}>", "DATA"]
+        if self.pipelining:
+            self._writer.write("".join(f"{command}\r\n" for command in commands).encode())
+            await self._writer.drain()
+            replies = [await self._read_reply() for _ in commands]
+        else:
+            replies = []
+            for command in commands:
+                replies.append(await self._send_line(command))
+                if replies[-1][0] >= 400:
+                    break
+
+        mail, rcpt, data = (replies + [None, None])[:3]
+        if mail[0] != 250 or rcpt is None or rcpt[0] not in (250, 251) or data is None or data[0] != 354:
+            if data is not None and data[0] == 354:
+                # Pipelined DATA was accepted anyway and the server now reads message
+                # text; end it empty, or RSET would land in the body and hang the session
+                self._writer.write(b".\r\n")
+                await self._writer.drain()
+                await self._read_reply()
+            await self._reset()
+            if mail[0] != 250:
+                raise SMTPError(*mail)
+            if rcpt is not None and rcpt[0] not in (250, 251):
+                raise SMTPRecipientRefused(*rcpt)
+            raise SMTPError(*(data or rcpt))
+
+        # Dot-stuff lines starting with "." and terminate with <CRLF>.<CRLF>
+        body = re.sub(rb"(?m)^\.", b"..", message)
+        if not body.endswith(b"\r\n"):
+            body += b"\r\n"
+        self._writer.write(body + b".\r\n")
+        await self._writer.drain()
+        code, text = await self._read_reply()
+        if code != 250:
+            raise SMTPError(code, text)
+        self.messages_sent += 1
+
+    async def quit(self):
+        try:
+            await self._send_line("QUIT")
+        except (OSError, asyncio.TimeoutError, SMTPError):
+            pass
+        self.close()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _ehlo(self):
+        code, text = await self._send_line(f"EHLO {SMTP_HELO_NAME}")
+        if code != 250:
+            raise SMTPError(code, text)
+        return {line.split(" ")[0].upper() for line in text.splitlines()[1:]}
+
+    async def _reset(self):
+        code, _ = await self._send_line("RSET")
+        if code != 250:
+            # The session is in an unknown state; let the pool drop it
+            raise ConnectionError("RSET failed")
+
+    async def _command(self, line, expected):
+        code, text = await self._send_line(line)
+        if code != expected:
+            raise SMTPError(code, text)
+        return text
+
+    async def _send_line(self, line):
+        self._writer.write(f"{line}\r\n".encode())
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _expect(self, expected):
+        code, text = await self._read_reply()
+        if code != expected:
+            raise SMTPError(code, text)
+
+    async def _read_reply(self):
+        lines = []
+        while True:
+            raw = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            if not raw:
+                raise ConnectionError("SMTP server closed the connection")
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            lines.append(line[4:])
+            if line[3:4] != "-":
+                return int(line[:3]), "\n".join(lines)
+
+
+class SMTPPool:
+    """At most `size` open connections, reused across messages.
+
+    A connection that fails at the socket level is dropped and reopened on next use;
+    one that got an SMTP error reply is reset and stays in the pool.
+    """
+
+    def __init__(self, size, factory=SMTPConnection):
+        self.factory = factory
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self.factory()
+                try:
+                    await conn.connect()
+                except BaseException:
+                    conn.close()
+                    raise
+            try:
+                yield conn
+            except SMTPError as e:
+                # 421 means the server is closing the session
+                if e.code == 421:
+                    conn.close()
+                else:
+                    self._idle.append(conn)
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if conn.messages_sent >= SMTP_MESSAGES_PER_CONNECTION:
+                await conn.quit()
+            else:
+                self._idle.append(conn)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.quit()
@@ -0,0 +1,163 @@
+# services/suggest_index.py
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from sqlalchemy import select
+
+import models
+
+# Other workers' admin edits only reach us through a rebuild
+SUGGEST_INDEX_TTL = float(os.getenv("SUGGEST_INDEX_TTL", "300"))
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text):
+    return " ".join(_WORD.findall((text or "").casefold()))
+
+
+def _keys(label):
+    """(full key, later-word keys) so "cand" also finds "Rose Candle"."""
+    words = normalize(label).split()
+    if not words:
+        return None, set()
+    return " ".join(words), {" ".join(words[i:]) for i in range(1, len(words))}
+
+
+class SuggestIndex:
+    """Sorted (key, id) lists over available product names and categories.
+
+    Ranked tiers: categories, then products whose name starts with the query,
+    then products with a later word starting with it. Each tier is a bisect to
+    the prefix plus at most `limit` steps, with no database access.
+    """
+
+    def __init__(self, ttl=SUGGEST_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._reset()
+        self.built_at = None
+
+    def _reset(self):
+        self._categories = []
+        self._names = []
+        self._words = []
+        self._products = {}
+        self._category_counts = Counter()
+
+    @staticmethod
+    def _remove(entries, entry):
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def _add(self, product_id, name, category):
+        self._products[product_id] = (name, category)
+        full, later = _keys(name)
+        if full:
+            insort(self._names, (full, product_id))
+        for key in later:
+            insort(self._words, (key, product_id))
+        if category:
+            self._category_counts[category] += 1
+            if self._category_counts[category] == 1:
+                for key in self._category_keys(category):
+                    insort(self._categories, (key, category))
+
+    def _discard(self, product_id):
+        name, category = self._products.pop(product_id)
+        full, later = _keys(name)
+        if full:
+            self._remove(self._names, (full, product_id))
+        for key in later:
+            self._remove(self._words, (key, product_id))
+        if category:
+            self._category_counts[category] -= 1
+            if self._category_counts[category] <= 0:
+                del self._category_counts[category]
+                for key in self._category_keys(category):
+                    self._remove(self._categories, (key, category))
+
+    @staticmethod
+    def _category_keys(category):
+        full, later = _keys(category)
+        return ({full} if full else set()) | later
+
+    def rebuild(self, db):
+        rows = db.execute(
+            select(models.Product.id, models.Product.name, models.Product.category)
+            .where(models.Product.is_available == True)
+        ).all()
+        names, words, products, category_counts = [], [], {}, Counter()
+        for product_id, name, category in rows:
+            products[product_id] = (name, category)
+            full, later = _keys(name)
+            if full:
+                names.append((full, product_id))
+            words.extend((key, product_id) for key in later)
+            if category:
+                category_counts[category] += 1
+        categories = [(key, category) for category in category_counts for key in self._category_keys(category)]
+
+        with self._lock:
+            self._names = sorted(names)
+            self._words = sorted(words)
+            self._categories = sorted(categories)
+            self._products = products
+            self._category_counts = category_counts
+            self.built_at = time.monotonic()
+
+    def ensure_fresh(self, db):
+        if self.built_at is None or time.monotonic() - self.built_at >= self.ttl:
+            with self._lock:
+                if self.built_at is None or time.monotonic() - self.built_at >= self.ttl:
+                    self.rebuild(db)
+
+    def upsert_product(self, product):
+        with self._lock:
+            if self.built_at is None:
+                return
+            if product.id in self._products:
+                self._discard(product.id)
+            if product.is_available:
+                self._add(product.id, product.name, product.category)
+
+    def remove_product(self, product_id):
+        with self._lock:
+            if product_id in self._products:
+                self._discard(product_id)
+
+    def invalidate(self):
+        self.built_at = None
+
+    @staticmethod
+    def _scan(entries, prefix, limit, seen):
+        found = []
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(found) < limit and entries[i][0].startswith(prefix):
+            ident = entries[i][1]
+            if ident not in seen:
+                seen.add(ident)
+                found.append(ident)
+            i += 1
+        return found
+
+    def suggest(self, query, limit=8):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            seen = set()
+            categories = self._scan(self._categories, prefix, limit, seen)
+            suggestions = [{"type": "category", "label": category, "product_id": None} for category in categories]
+            for entries in (self._names, self._words):
+                for product_id in self._scan(entries, prefix, limit - len(suggestions), seen):
+                    suggestions.append({"type": "product", "label": self._products[product_id][0], "product_id": product_id})
+        return suggestions
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,241 @@
+# services/write_buffer.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+import models
+from database import engine
+
+# SQLite builds with the old 999 bound-parameter limit are still around
+MAX_SQL_PARAMS = 999
+# Longest wait between flushes while the database keeps failing (e.g. locked by a backup)
+WRITE_BUFFER_MAX_BACKOFF = float(os.getenv("WRITE_BUFFER_MAX_BACKOFF", "60"))
+# Flushes stop() tries before it gives up and logs the rows it loses
+WRITE_BUFFER_STOP_ATTEMPTS = int(os.getenv("WRITE_BUFFER_STOP_ATTEMPTS", "3"))
+
+# Errors caused by the rows themselves; anything else (locks, I/O) is worth retrying
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+class BufferFull(Exception):
+    pass
+
+
+class WriteBehindBuffer:
+    """Accepts rows immediately and inserts them later in multi-row batches.
+
+    A flush happens every `flush_interval` seconds, as soon as `batch_size`
+    rows are pending, and on stop(). When `max_pending` rows are waiting the
+    caller flushes inline; if that does not help, add() raises BufferFull.
+    A batch rejected because of its rows is retried one row at a time, and only
+    the rows that fail on their own are dropped. On any other error (a locked
+    database) the rows are kept and flushes back off, up to `max_backoff`.
+
+    With `dedupe_key`, rows whose value for that column was queued recently are
+    refused; the check only covers this process, so callers still look in the
+    table on a miss.
+    """
+
+    def __init__(self, model, batch_size=200, flush_interval=2.0, max_pending=5000,
+                 dedupe_key=None, seen_capacity=10000, max_backoff=WRITE_BUFFER_MAX_BACKOFF):
+        self.model = model
+        self.name = model.__tablename__
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dedupe_key = dedupe_key
+        self.seen_capacity = seen_capacity
+        self.max_backoff = max_backoff
+
+        self._pending = []
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._failed_attempts = 0
+        self._retry_at = 0.0
+
+        self.flushed_rows = 0
+        self.flush_errors = 0
+        self.dropped_rows = 0
+
+    def _remember(self, key):
+        self._seen[key] = True
+        self._seen.move_to_end(key)
+        if len(self._seen) > self.seen_capacity:
+            self._seen.popitem(last=False)
+
+    def seen(self, key):
+        """True if a row with this dedupe value was queued or marked recently."""
+        with self._lock:
+            return key in self._seen
+
+    def mark_seen(self, key):
+        """Remember a value found in the table, so the next add() is refused without a query."""
+        with self._lock:
+            self._remember(key)
+
+    def add(self, row):
+        """Queue a row. Returns False if its dedupe value was already seen."""
+        if len(self._pending) >= self.max_pending:
+            self.flush()
+
+        key = row[self.dedupe_key] if self.dedupe_key else None
+        with self._lock:
+            if key is not None:
+                if key in self._seen:
+                    self._seen.move_to_end(key)
+                    return False
+                self._remember(key)
+
+            if len(self._pending) >= self.max_pending:
+                if key is not None:
+                    self._seen.pop(key, None)
+                raise BufferFull(f"{self.name} write buffer is full")
+
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+        return True
+
+    def flush(self, force=False):
+        """Write everything pending. Returns the number of rows inserted.
+
+        While backing off after a failure this does nothing unless `force` is set.
+        """
+        with self._flush_lock:
+            if not force and time.monotonic() < self._retry_at:
+                return 0
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+
+            try:
+                self._insert(rows)
+            except ROW_ERRORS as e:
+                print(f"⚠ {self.name} batch rejected, inserting row by row: {e}")
+                return self._insert_one_by_one(rows)
+            except Exception as e:
+                self._requeue(rows, e)
+                return 0
+
+            self._failed_attempts = 0
+            self._retry_at = 0.0
+            self.flushed_rows += len(rows)
+            return len(rows)
+
+    def _requeue(self, rows, error):
+        # Put the rows back in front; add() keeps refusing past max_pending meanwhile
+        with self._lock:
+            self._pending = rows + self._pending
+        self.flush_errors += 1
+        self._failed_attempts += 1
+        delay = min(self.max_backoff, self.flush_interval * 2 ** (self._failed_attempts - 1))
+        self._retry_at = time.monotonic() + delay
+        print(f"❌ Error flushing {len(rows)} {self.name} rows, retrying in {delay:.0f}s: {error}")
+
+    def _insert_one_by_one(self, rows):
+        inserted = 0
+        for i, row in enumerate(rows):
+            try:
+                self._insert([row])
+                inserted += 1
+            except ROW_ERRORS as e:
+                self.dropped_rows += 1
+                print(f"❌ Dropping {self.name} row: {e}")
+                if self.dedupe_key:
+                    with self._lock:
+                        self._seen.pop(row[self.dedupe_key], None)
+            except Exception as e:
+                self._requeue(rows[i:], e)
+                break
+        self.flushed_rows += inserted
+        return inserted
+
+    def _insert(self, rows):
+        stmt = insert(self.model.__table__)
+        if self.dedupe_key:
+            # Duplicates already in the table (e.g. from another worker) are skipped
+            stmt = stmt.prefix_with("OR IGNORE")
+
+        chunk_size = max(1, MAX_SQL_PARAMS // len(rows[0]))
+        with engine.begin() as conn:
+            for start in range(0, len(rows), chunk_size):
+                conn.execute(stmt.values(rows[start:start + chunk_size]))
+
+    def pending(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=f"write-buffer-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        # Whatever is left goes out before the process exits, waiting out a short lock
+        for attempt in range(WRITE_BUFFER_STOP_ATTEMPTS):
+            self.flush(force=True)
+            if not self._pending:
+                return
+            time.sleep(min(self.max_backoff, attempt + 1))
+        with self._lock:
+            lost, self._pending = self._pending, []
+        self.dropped_rows += len(lost)
+        print(f"❌ Lost {len(lost)} {self.name} rows at shutdown:")
+        for row in lost:
+            print(f"   {row}")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "max_pending": self.max_pending,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors,
+            "dropped_rows": self.dropped_rows,
+        }
+
+
+contact_buffer = WriteBehindBuffer(
+    models.ContactMessage,
+    batch_size=int(os.getenv("CONTACT_BUFFER_BATCH", "200")),
+    flush_interval=float(os.getenv("CONTACT_BUFFER_INTERVAL", "2")),
+    max_pending=int(os.getenv("CONTACT_BUFFER_MAX", "5000")),
+)
+
+newsletter_buffer = WriteBehindBuffer(
+    models.Newsletter,
+    batch_size=int(os.getenv("NEWSLETTER_BUFFER_BATCH", "200")),
+    flush_interval=float(os.getenv("NEWSLETTER_BUFFER_INTERVAL", "2")),
+    max_pending=int(os.getenv("NEWSLETTER_BUFFER_MAX", "5000")),
+    dedupe_key="email",
+)
+
+
+def start_write_buffers():
+    contact_buffer.start()
+    newsletter_buffer.start()
+
+
+def stop_write_buffers():
+    contact_buffer.stop()
+    newsletter_buffer.stop()
@@ -130,21 +130,82 @@ async function loadFeaturedProducts() {
     }
 }
 
+// Current storefront filters, shared by category cards, offers, filter bar and search
+const productFilters = { category: '', minPrice: null, maxPrice: null, search: '' };
+
 // Load all products
 async function loadAllProducts() {
+    productFilters.category = '';
+    productFilters.minPrice = null;
+    productFilters.maxPrice = null;
+    productFilters.search = '';
+    await loadFilteredProducts();
+}
+
+// Load products plus category counts and price buckets in one request
+async function loadFilteredProducts() {
+    const params = new URLSearchParams({ facets: 'true' });
+    if (productFilters.category) params.set('category', productFilters.category);
+    if (productFilters.minPrice) params.set('min_price', productFilters.minPrice);
+    if (productFilters.maxPrice) params.set('max_price', productFilters.maxPrice);
+    if (productFilters.search) params.set('search', productFilters.search);
+    
     try {
-        const response = await fetch(`${API_URL}/products`);
-        const products = await response.json();
+        const response = await fetch(`${API_URL}/products?${params}`);
+        const result = await response.json();
+        const products = result.items;
+        
+        // Sort products
+        const sort = document.getElementById('sortFilter')?.value || '';
+        if (sort === 'price_asc') {
+            products.sort((a, b) => a.price - b.price);
+        } else if (sort === 'price_desc') {
+            products.sort((a, b) => b.price - a.price);
+        }
         
         const container = document.getElementById('allProducts');
-        if (!container) return;
+        if (container) {
+            container.innerHTML = products.length
+                ? products.map(product => createProductCard(product)).join('')
+                : '<p style="text-align: center; padding: 2rem;">No products match these filters</p>';
+        }
         
-        container.innerHTML = products.map(product => createProductCard(product)).join('');
+        renderFacets(result.facets);
+        return result;
     } catch (error) {
         console.error('Error loading products:', error);
     }
 }
 
+// Render category counts and price buckets for the current filters
+function renderFacets(facets) {
+    const container = document.getElementById('categories');
+    const filterSelect = document.getElementById('categoryFilter');
+    const priceContainer = document.getElementById('priceFacets');
+    
+    if (container) {
+        container.innerHTML = facets.categories.map(cat => 
+            `<div class="category-card${cat.name === productFilters.category ? ' active' : ''}" onclick="filterByCategory('${cat.name}')">${cat.name} (${cat.count})</div>`
+        ).join('');
+    }
+    
+    if (filterSelect) {
+        filterSelect.innerHTML = '<option value="">All Categories</option>' +
+            facets.categories.map(cat => `<option value="${cat.name}">${cat.name} (${cat.count})</option>`).join('');
+        filterSelect.value = productFilters.category;
+    }
+    
+    if (priceContainer) {
+        const clear = (productFilters.minPrice || productFilters.maxPrice)
+            ? '<button onclick="filterByPrice(null, null)">Any price</button>'
+            : '';
+        priceContainer.innerHTML = facets.price_buckets.map(bucket => {
+            const label = bucket.max === null ? `₹${bucket.min}+` : `₹${bucket.min} - ₹${bucket.max}`;
+            return `<button onclick="filterByPrice(${bucket.min}, ${bucket.max})" ${bucket.count ? '' : 'disabled'}>${label} (${bucket.count})</button>`;
+        }).join('') + clear;
+    }
+}
+
 // Load categories
 async function loadCategories() {
     try {
@@ -216,14 +277,9 @@ function viewProduct(productId) {
 async function addToCart(productId, quantity = 1) {
     const token = getToken();
     
-    if (!token) {
-        alert('Please login to add items to cart');
-        window.location.href = '/login';
-        return;
-    }
-    
     try {
-        const response = await apiCall('/cart', {
+        // Guests keep their cart in a signed cookie; it's merged at login
+        const response = await apiCall(token ? '/cart' : '/cart/guest', {
             method: 'POST',
             body: JSON.stringify({ product_id: productId, quantity })
         });
@@ -246,13 +302,10 @@ async function updateCartCount() {
     const token = getToken();
     const cartCount = document.getElementById('cartCount');
     
-    if (!token || !cartCount) {
-        if (cartCount) cartCount.textContent = '0';
-        return;
-    }
+    if (!cartCount) return;
     
     try {
-        const response = await apiCall('/cart');
+        const response = await apiCall(token ? '/cart' : '/cart/guest');
         if (response.ok) {
             const items = await response.json();
             const count = items.reduce((sum, item) => sum + item.quantity, 0);
@@ -270,62 +323,23 @@ function showCart() {
 
 // Filter by category
 async function filterByCategory(category) {
-    try {
-        const response = await fetch(`${API_URL}/products?category=${encodeURIComponent(category)}`);
-        const products = await response.json();
-        
-        const container = document.getElementById('allProducts');
-        if (container) {
-            container.innerHTML = products.map(product => createProductCard(product)).join('');
-            scrollToProducts();
-        }
-    } catch (error) {
-        console.error('Error filtering products:', error);
-    }
+    productFilters.category = category;
+    await loadFilteredProducts();
+    scrollToProducts();
 }
 
 // Filter by price
 async function filterByPrice(minPrice, maxPrice) {
-    try {
-        const response = await fetch(`${API_URL}/products?min_price=${minPrice}&max_price=${maxPrice}`);
-        const products = await response.json();
-        
-        const container = document.getElementById('allProducts');
-        if (container) {
-            container.innerHTML = products.map(product => createProductCard(product)).join('');
-            scrollToProducts();
-        }
-    } catch (error) {
-        console.error('Error filtering products:', error);
-    }
+    productFilters.minPrice = minPrice;
+    productFilters.maxPrice = maxPrice;
+    await loadFilteredProducts();
+    scrollToProducts();
 }
 
 // Apply filters
 async function applyFilters() {
-    const category = document.getElementById('categoryFilter')?.value || '';
-    const sort = document.getElementById('sortFilter')?.value || '';
-    
-    try {
-        let url = `${API_URL}/products?`;
-        if (category) url += `category=${encodeURIComponent(category)}&`;
-        
-        const response = await fetch(url);
-        let products = await response.json();
-        
-        // Sort products
-        if (sort === 'price_asc') {
-            products.sort((a, b) => a.price - b.price);
-        } else if (sort === 'price_desc') {
-            products.sort((a, b) => b.price - a.price);
-        }
-        
-        const container = document.getElementById('allProducts');
-        if (container) {
-            container.innerHTML = products.map(product => createProductCard(product)).join('');
-        }
-    } catch (error) {
-        console.error('Error applying filters:', error);
-    }
+    productFilters.category = document.getElementById('categoryFilter')?.value || '';
+    await loadFilteredProducts();
 }
 
 // Search products
@@ -338,17 +352,108 @@ async function searchProducts() {
         return;
     }
     
+    productFilters.search = query;
+    await loadFilteredProducts();
+    scrollToProducts();
+}
+
+// Search-as-you-type, served from the in-memory suggest index
+let suggestTimer = null;
+let suggestions = [];
+let activeSuggestion = -1;
+
+function setupSearchSuggestions() {
+    const input = document.getElementById('searchInput');
+    const box = document.getElementById('searchSuggestions');
+    if (!input || !box) return;
+    
+    input.addEventListener('input', () => {
+        clearTimeout(suggestTimer);
+        suggestTimer = setTimeout(() => loadSuggestions(input.value), 120);
+    });
+    
+    input.addEventListener('keydown', (event) => {
+        if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+            if (!suggestions.length) return;
+            event.preventDefault();
+            const step = event.key === 'ArrowDown' ? 1 : -1;
+            activeSuggestion = (activeSuggestion + step + suggestions.length) % suggestions.length;
+            renderSuggestions();
+        } else if (event.key === 'Enter') {
+            event.preventDefault();
+            if (activeSuggestion >= 0) {
+                selectSuggestion(activeSuggestion);
+            } else {
+                hideSuggestions();
+                searchProducts();
+            }
+        } else if (event.key === 'Escape') {
+            hideSuggestions();
+        }
+    });
+    
+    document.addEventListener('click', (event) => {
+        if (!event.target.closest('.search-bar')) hideSuggestions();
+    });
+}
+
+async function loadSuggestions(query) {
+    if (!query.trim()) {
+        hideSuggestions();
+        return;
+    }
+    
     try {
-        const response = await fetch(`${API_URL}/products?search=${encodeURIComponent(query)}`);
-        const products = await response.json();
+        const response = await fetch(`${API_URL}/products/suggest?q=${encodeURIComponent(query)}&limit=8`);
+        if (!response.ok) return;
         
-        const container = document.getElementById('allProducts');
-        if (container) {
-            container.innerHTML = products.map(product => createProductCard(product)).join('');
-            scrollToProducts();
-        }
+        // Ignore answers to a query the user has already typed past
+        if (document.getElementById('searchInput')?.value !== query) return;
+        suggestions = await response.json();
+        activeSuggestion = -1;
+        renderSuggestions();
     } catch (error) {
-        console.error('Error searching products:', error);
+        console.error('Error loading suggestions:', error);
+    }
+}
+
+function renderSuggestions() {
+    const box = document.getElementById('searchSuggestions');
+    if (!box) return;
+    
+    if (!suggestions.length) {
+        hideSuggestions();
+        return;
+    }
+    
+    box.innerHTML = suggestions.map((suggestion, index) => `
+        <div class="suggestion-item ${index === activeSuggestion ? 'active' : ''}" onmousedown="selectSuggestion(${index})">
+            ${suggestion.label}
+            <span class="suggestion-type">${suggestion.type === 'category' ? 'Category' : ''}</span>
+        </div>
+    `).join('');
+    box.classList.add('open');
+}
+
+function hideSuggestions() {
+    const box = document.getElementById('searchSuggestions');
+    if (box) box.classList.remove('open');
+    suggestions = [];
+    activeSuggestion = -1;
+}
+
+function selectSuggestion(index) {
+    const suggestion = suggestions[index];
+    if (!suggestion) return;
+    hideSuggestions();
+    
+    if (suggestion.type === 'category') {
+        const input = document.getElementById('searchInput');
+        if (input) input.value = '';
+        productFilters.search = '';
+        filterByCategory(suggestion.label);
+    } else {
+        viewProduct(suggestion.product_id);
     }
 }
 
@@ -429,6 +534,9 @@ async function loadProductDetail(productId) {
         const product = await response.json();
         console.log('Product loaded:', product);
         
+        // Units held in other shoppers' carts can't be bought
+        const available = product.available ?? product.stock;
+        
         const container = document.getElementById('productDetail');
         if (!container) return;
         
@@ -455,13 +563,13 @@ async function loadProductDetail(productId) {
                     <div style="font-size: 2.5rem; color: var(--primary); font-weight: bold; margin: 2rem 0;">₹${product.price}</div>
                     
                     <div style="background: var(--accent); padding: 1rem; border-radius: 8px; margin: 1.5rem 0;">
-                        <p style="margin: 0.5rem 0;"><strong>Stock Available:</strong> ${product.stock} units</p>
+                        <p style="margin: 0.5rem 0;"><strong>Stock Available:</strong> ${available} units</p>
                         <p style="margin: 0.5rem 0;"><strong>Category:</strong> ${product.category}</p>
                     </div>
                     
                     <div style="display: flex; gap: 1rem; align-items: center; margin: 2rem 0;">
                         <label style="font-weight: bold;">Quantity:</label>
-                        <input type="number" id="productQuantity" value="1" min="1" max="${product.stock}" 
+                        <input type="number" id="productQuantity" value="1" min="1" max="${available}" 
                                style="width: 100px; padding: 0.75rem; border: 2px solid var(--primary); border-radius: 8px; font-size: 1rem; text-align: center;">
                     </div>
                     
@@ -496,6 +604,8 @@ async function loadProductDetail(productId) {
                 </div>
             </div>
         `;
+        
+        loadRelatedProducts(product.id);
     } catch (error) {
         console.error('Error loading product:', error);
         const container = document.getElementById('productDetail');
@@ -511,6 +621,28 @@ async function loadProductDetail(productId) {
     }
 }
 
+// "Frequently bought together" from the co-purchase index
+async function loadRelatedProducts(productId) {
+    const section = document.getElementById('relatedProducts');
+    const grid = document.getElementById('relatedGrid');
+    if (!section || !grid) return;
+    
+    try {
+        const response = await fetch(`${API_URL}/products/${productId}/related?limit=4`);
+        if (!response.ok) return;
+        
+        const products = await response.json();
+        if (products.length === 0) {
+            section.style.display = 'none';
+            return;
+        }
+        grid.innerHTML = products.map(product => createProductCard(product)).join('');
+        section.style.display = 'block';
+    } catch (error) {
+        console.error('Error loading related products:', error);
+    }
+}
+
 function addToCartFromDetail(productId) {
     const quantity = parseInt(document.getElementById('productQuantity')?.value || 1);
     addToCart(productId, quantity);
@@ -522,13 +654,8 @@ function addToCartFromDetail(productId) {
 async function loadCart() {
     const token = getToken();
     
-    if (!token) {
-        window.location.href = '/login';
-        return;
-    }
-    
     try {
-        const response = await apiCall('/cart');
+        const response = await apiCall(token ? '/cart' : '/cart/guest');
         const items = await response.json();
         
         const container = document.getElementById('cartItems');
@@ -547,6 +674,8 @@ async function loadCart() {
         container.innerHTML = items.map(item => {
             const itemTotal = item.product.price * item.quantity;
             total += itemTotal;
+            // Guest cart lines are addressed by product
+            const itemId = token ? item.id : item.product_id;
             
             return `
                 <div class="cart-item">
@@ -556,12 +685,12 @@ async function loadCart() {
                         <p>₹${item.product.price}</p>
                     </div>
                     <div class="cart-item-actions">
-                        <button class="quantity-btn" onclick="updateCartQuantity(${item.id}, ${item.quantity - 1})">-</button>
+                        <button class="quantity-btn" onclick="updateCartQuantity(${itemId}, ${item.quantity - 1})">-</button>
                         <span style="padding: 0 1rem; font-weight: bold;">${item.quantity}</span>
-                        <button class="quantity-btn" onclick="updateCartQuantity(${item.id}, ${item.quantity + 1})">+</button>
+                        <button class="quantity-btn" onclick="updateCartQuantity(${itemId}, ${item.quantity + 1})">+</button>
                     </div>
                     <div style="font-weight: bold;">₹${itemTotal}</div>
-                    <button class="btn btn-secondary" style="padding: 0.5rem;" onclick="removeFromCart(${item.id})">Remove</button>
+                    <button class="btn btn-secondary" style="padding: 0.5rem;" onclick="removeFromCart(${itemId})">Remove</button>
                 </div>
             `;
         }).join('');
@@ -599,7 +728,8 @@ async function updateCartQuantity(itemId, newQuantity) {
     }
     
     try {
-        const response = await apiCall(`/cart/${itemId}?quantity=${newQuantity}`, {
+        const path = getToken() ? `/cart/${itemId}` : `/cart/guest/${itemId}`;
+        const response = await apiCall(`${path}?quantity=${newQuantity}`, {
             method: 'PUT'
         });
         
@@ -614,9 +744,9 @@ async function updateCartQuantity(itemId, newQuantity) {
 
 async function removeFromCart(itemId) {
     try {
-        const response = await apiCall(`/cart/${itemId}`, {
-            method: 'DELETE'
-        });
+        const response = getToken()
+            ? await apiCall(`/cart/${itemId}`, { method: 'DELETE' })
+            : await apiCall(`/cart/guest/${itemId}?quantity=0`, { method: 'PUT' });
         
         if (response.ok) {
             loadCart();
@@ -628,6 +758,12 @@ async function removeFromCart(itemId) {
 }
 
 function proceedToCheckout() {
+    if (!getToken()) {
+        // Logging in merges the guest cart into the account
+        alert('Please login to checkout');
+        window.location.href = '/login';
+        return;
+    }
     window.location.href = '/checkout';
 }
 
@@ -674,6 +810,9 @@ async function loadCheckout() {
     }
 }
 
+// One key per checkout attempt: double submits and retries can't place two orders
+let checkoutIdempotencyKey = null;
+
 async function placeOrder(event) {
     event.preventDefault();
     
@@ -681,9 +820,14 @@ async function placeOrder(event) {
     const phone = document.getElementById('shippingPhone')?.value;
     const paymentMethod = document.getElementById('paymentMethod')?.value;
     
+    if (!checkoutIdempotencyKey) {
+        checkoutIdempotencyKey = crypto.randomUUID();
+    }
+    
     try {
         const response = await apiCall('/orders', {
             method: 'POST',
+            headers: { 'Idempotency-Key': checkoutIdempotencyKey },
             body: JSON.stringify({
                 shipping_address: address,
                 phone: phone,
@@ -692,11 +836,14 @@ async function placeOrder(event) {
         });
         
         if (response.ok) {
+            checkoutIdempotencyKey = null;
             const order = await response.json();
             alert(`Order placed successfully! Order ID: ${order.id}`);
             updateCartCount();
             window.location.href = '/';
         } else {
+            // The attempt finished (e.g. out of stock), so a resubmit is a new attempt
+            if (response.status !== 409) checkoutIdempotencyKey = null;
             const error = await response.json();
             alert(error.detail || 'Error placing order');
         }
@@ -783,27 +930,15 @@ async function loadAdminDashboard() {
         const productsRes = await fetch(`${API_URL}/products`);
         const products = await productsRes.json();
         
-        const ordersRes = await apiCall('/admin/orders');
-        const orders = await ordersRes.json();
-        
         document.getElementById('totalProducts').textContent = products.length;
-        document.getElementById('totalOrders').textContent = orders.length;
         
-        const revenue = orders.reduce((sum, order) => sum + order.total_amount, 0);
-        document.getElementById('totalRevenue').textContent = `₹${revenue}`;
-        
-        // Load orders table
-        const ordersTable = document.getElementById('ordersTable');
-        if (ordersTable) {
-            ordersTable.innerHTML = orders.map(order => `
-                <tr>
-                    <td>${order.id}</td>
-                    <td>₹${order.total_amount}</td>
-                    <td>${order.status}</td>
-                    <td>${order.payment_method}</td>
-                    <td>${new Date(order.created_at).toLocaleDateString()}</td>
-                </tr>
-            `).join('');
+        // Orders are downloaded once; after that the event stream keeps them current
+        if (!adminOrders) {
+            const ordersRes = await apiCall('/admin/orders');
+            const orders = await ordersRes.json();
+            adminOrders = new Map(orders.map(order => [order.id, order]));
+            renderAdminOrders();
+            connectOrderStream();
         }
         
         // Load products table
@@ -828,6 +963,119 @@ async function loadAdminDashboard() {
     }
 }
 
+let adminOrders = null;
+let orderStream = null;
+
+function renderAdminOrders() {
+    const orders = [...adminOrders.values()].sort((a, b) => b.id - a.id);
+    const selected = new Set(selectedOrderIds());
+    
+    document.getElementById('totalOrders').textContent = orders.length;
+    const revenue = orders.reduce((sum, order) => sum + order.total_amount, 0);
+    document.getElementById('totalRevenue').textContent = `₹${revenue}`;
+    
+    const ordersTable = document.getElementById('ordersTable');
+    if (ordersTable) {
+        ordersTable.innerHTML = orders.map(order => `
+            <tr>
+                <td><input type="checkbox" class="order-select" value="${order.id}" ${selected.has(order.id) ? 'checked' : ''}></td>
+                <td>${order.id}</td>
+                <td>₹${order.total_amount}</td>
+                <td>${order.status}</td>
+                <td>${order.payment_method}</td>
+                <td>${new Date(order.created_at).toLocaleDateString()}</td>
+            </tr>
+        `).join('');
+    }
+}
+
+let lastOrderEventId = null;
+
+async function connectOrderStream() {
+    if (!getToken() || !window.EventSource) return;
+    const status = document.getElementById('orderStreamStatus');
+    
+    // EventSource can't send headers, so the URL carries a one-minute stream ticket
+    // instead of the access token. A ticket is only checked on connect, so every
+    // reconnect gets a fresh one and resumes after the last event seen.
+    let url;
+    try {
+        const response = await apiCall('/admin/orders/stream-ticket', { method: 'POST' });
+        if (!response.ok) throw new Error(`ticket request failed: ${response.status}`);
+        const { ticket } = await response.json();
+        url = `${API_URL}/admin/orders/stream?ticket=${encodeURIComponent(ticket)}`;
+        if (lastOrderEventId !== null) url += `&last_event_id=${lastOrderEventId}`;
+    } catch (error) {
+        if (status) status.textContent = 'Reconnecting...';
+        setTimeout(connectOrderStream, 3000);
+        return;
+    }
+    
+    orderStream = new EventSource(url);
+    const applyEvent = (event) => {
+        lastOrderEventId = event.lastEventId;
+        const order = JSON.parse(event.data);
+        const existing = adminOrders.get(order.id);
+        // Stream events carry the order summary; keep items we already have
+        adminOrders.set(order.id, existing ? { ...existing, ...order } : order);
+        renderAdminOrders();
+    };
+    orderStream.addEventListener('stream_position', (event) => { lastOrderEventId = event.lastEventId; });
+    orderStream.addEventListener('order_created', applyEvent);
+    orderStream.addEventListener('order_updated', applyEvent);
+    orderStream.onopen = () => { if (status) status.textContent = '● Live'; };
+    orderStream.onerror = () => {
+        if (status) status.textContent = 'Reconnecting...';
+        orderStream.close();
+        setTimeout(connectOrderStream, 3000);
+    };
+}
+
+function selectedOrderIds() {
+    return [...document.querySelectorAll('.order-select:checked')].map(box => parseInt(box.value));
+}
+
+function toggleAllOrders(checked) {
+    document.querySelectorAll('.order-select').forEach(box => { box.checked = checked; });
+}
+
+async function bulkUpdateOrderStatus() {
+    const orderIds = selectedOrderIds();
+    const status = document.getElementById('bulkOrderStatus')?.value;
+    if (orderIds.length === 0) {
+        alert('Select at least one order');
+        return;
+    }
+    
+    try {
+        const response = await apiCall('/admin/orders/status', {
+            method: 'POST',
+            body: JSON.stringify({ order_ids: orderIds, status })
+        });
+        const result = await response.json();
+        
+        if (!response.ok) {
+            alert(result.detail || 'Error updating orders');
+            return;
+        }
+        // Applied locally too, in case the event stream is down
+        result.updated.forEach(id => {
+            const order = adminOrders.get(id);
+            if (order) order.status = status;
+        });
+        const selectAll = document.getElementById('selectAllOrders');
+        if (selectAll) selectAll.checked = false;
+        toggleAllOrders(false);
+        renderAdminOrders();
+        if (result.rejected.length) {
+            alert(`${result.updated.length} updated, ${result.rejected.length} skipped:\n` +
+                  result.rejected.map(item => `#${item.id}: ${item.reason}`).join('\n'));
+        }
+    } catch (error) {
+        console.error('Error updating orders:', error);
+    }
+}
+
 async function deleteProduct(productId) {
     if (!confirm('Are you sure you want to delete this product?')) return;
     
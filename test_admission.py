@@ -0,0 +1,40 @@
+"""
+Admission control: browsing is shed with 503 while the slots kept for checkout
+are still free
+Run this from the Backend directory: python -m pytest test_admission.py
+"""
+import asyncio
+
+
+def test_low_priority_is_shed_before_the_checkout_reserve(app_dir):
+    from fastapi.testclient import TestClient
+    from starlette.responses import PlainTextResponse
+
+    from services.admission import (
+        CATALOG_PRIORITY, CHECKOUT_PRIORITY, AdmissionControlMiddleware, AdmissionController, Pool,
+    )
+
+    async def ok(scope, receive, send):
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    controller = AdmissionController([
+        Pool("checkout", limit=4, max_queue=4, queue_timeout=0.05, priority=CHECKOUT_PRIORITY),
+        Pool("catalog", limit=4, max_queue=4, queue_timeout=0.05, priority=CATALOG_PRIORITY),
+    ], total_limit=3, reserved=1)
+    client = TestClient(AdmissionControlMiddleware(ok, controller))
+
+    # Two slow catalog requests in flight leave only the checkout reserve free
+    for _ in range(2):
+        asyncio.run(controller.acquire("catalog"))
+
+    response = client.get("/api/products")
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) > 0
+    assert controller.pools["catalog"].rejected_timeout == 1
+
+    response = client.post("/api/orders")
+    assert response.status_code == 200
+    assert controller.in_flight == 2
+
+    controller.release("catalog")
+    assert client.get("/api/products").status_code == 200
@@ -0,0 +1,45 @@
+"""
+Bulk catalog import: names that match several products, and which categories
+the report says were created
+Run this from the Backend directory: python -m pytest test_catalog_import.py
+"""
+import uuid
+
+
+def _row(name, category, price=100):
+    return {"name": name, "description": "Soy wax", "price": str(price), "category": category, "stock": "5"}
+
+
+def test_duplicate_names_are_rejected_not_half_updated(client):
+    import models
+    from database import SessionLocal
+    from services.catalog_import import CatalogImport
+
+    name = f"Twin Candle {uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        for _ in range(2):
+            db.add(models.Product(name=name, description="Soy wax", category="Candles", price=100, stock=10))
+        db.commit()
+
+        report = CatalogImport(db).run([(2, _row(name, "Candles", price=250)), (3, _row(f"{name} new", "Candles"))])
+
+    assert report["created"] == 1
+    assert report["updated"] == 0
+    assert report["error_count"] == 1
+    assert report["errors"][0]["row"] == 2
+    with SessionLocal() as db:
+        prices = db.query(models.Product.price).filter(models.Product.name == name).all()
+    assert sorted(price for price, in prices) == [100, 100]
+
+
+def test_existing_categories_are_not_reported_as_created(client):
+    from database import SessionLocal
+    from services.catalog_import import CatalogImport
+
+    category = f"Category {uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        first = CatalogImport(db)
+        # Created by someone else after this import loaded the category ids
+        second = CatalogImport(db)
+        assert first.run([(2, _row(f"Lamp {uuid.uuid4().hex[:8]}", category))])["categories_created"] == [category]
+        assert second.run([(2, _row(f"Lamp {uuid.uuid4().hex[:8]}", category))])["categories_created"] == []
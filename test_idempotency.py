@@ -0,0 +1,68 @@
+"""
+Idempotency-Key replays: who a key belongs to and what gets replayed
+Run this from the Backend directory: python -m pytest test_idempotency.py
+"""
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def other_network(client):
+    """A second client whose requests arrive from another address."""
+    from fastapi.testclient import TestClient
+
+    async def from_other_address(scope, receive, send):
+        await client.app(dict(scope, client=("203.0.113.7", 40000)), receive, send)
+
+    # No `with`: the app is already started by the session client
+    return TestClient(from_other_address)
+
+
+def _key():
+    return {"Idempotency-Key": uuid.uuid4().hex}
+
+
+def test_signed_in_retry_replays_from_another_address(client, other_network, admin_headers, product_id):
+    headers = {**admin_headers, **_key()}
+    first = client.post("/api/cart", json={"product_id": product_id, "quantity": 1}, headers=headers)
+    assert first.status_code == 200, first.text
+
+    # Switched networks and picked up a cookie on the way: still the same caller
+    other_network.cookies.set("guest_cart", "something-else")
+    retry = other_network.post("/api/cart", json={"product_id": product_id, "quantity": 1}, headers=headers)
+    assert retry.status_code == 200
+    assert retry.headers.get("idempotent-replayed") == "true"
+    assert retry.json() == first.json()
+    assert retry.json()["quantity"] == 1
+
+    client.delete("/api/cart", headers=admin_headers)
+
+
+def test_same_key_different_body_is_rejected(client, admin_headers, product_id):
+    headers = {**admin_headers, **_key()}
+    assert client.post("/api/cart", json={"product_id": product_id, "quantity": 1}, headers=headers).status_code == 200
+    response = client.post("/api/cart", json={"product_id": product_id, "quantity": 2}, headers=headers)
+    assert response.status_code == 422
+
+    client.delete("/api/cart", headers=admin_headers)
+
+
+def test_guests_do_not_share_keys(client, other_network, product_id):
+    headers = _key()
+    client.cookies.clear()
+    first = client.post("/api/cart/guest", json={"product_id": product_id, "quantity": 1}, headers=headers)
+    assert first.status_code == 200
+    assert "set-cookie" in first.headers
+
+    # Same key from another guest runs on its own
+    other = other_network.post("/api/cart/guest", json={"product_id": product_id, "quantity": 1}, headers=headers)
+    assert other.status_code == 200
+    assert other.headers.get("idempotent-replayed") is None
+
+    # The first guest's retry replays, without handing out a cookie again
+    client.cookies.clear()
+    retry = client.post("/api/cart/guest", json={"product_id": product_id, "quantity": 1}, headers=headers)
+    assert retry.headers.get("idempotent-replayed") == "true"
+    assert "set-cookie" not in retry.headers
+    assert retry.json() == first.json()
@@ -0,0 +1,44 @@
+"""
+Order ids must not be handed out again once archival has moved the newest
+orders out of the orders table
+Run this from the Backend directory: python -m pytest test_order_archival.py
+"""
+from datetime import datetime, timedelta, timezone
+
+
+def test_checkout_after_archiving_everything(client, admin_headers, product_id):
+    from sqlalchemy import select, update
+
+    import models
+    from database import engine
+    from services.archival import archive_orders
+
+    def checkout():
+        response = client.post("/api/cart", json={"product_id": product_id, "quantity": 1}, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        response = client.post("/api/orders", json={
+            "shipping_address": "1 Test Street", "phone": "9999999999", "payment_method": "cod",
+        }, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    def archive_everything():
+        with engine.begin() as conn:
+            conn.execute(update(models.Order.__table__).values(
+                status="delivered", created_at=datetime.now(timezone.utc) - timedelta(days=365)
+            ))
+        return archive_orders(older_than_days=0)
+
+    archive_everything()
+    first = checkout()
+    assert archive_everything() == 1
+
+    second = checkout()
+    assert second["id"] > first["id"]
+    assert second["items"][0]["id"] > first["items"][0]["id"]
+    # Archiving the new order used to fail on the archive's primary key
+    assert archive_everything() == 1
+
+    with engine.connect() as conn:
+        archived = conn.execute(select(models.ArchivedOrder.id)).scalars().all()
+    assert {first["id"], second["id"]} <= set(archived)
@@ -0,0 +1,39 @@
+"""
+Rate limiting: 429 with Retry-After once a bucket is empty, and refills over time
+Run this from the Backend directory: python -m pytest test_rate_limit.py
+"""
+import uuid
+from types import SimpleNamespace
+
+
+def test_login_is_limited_per_username(client):
+    username = f"nobody-{uuid.uuid4().hex[:8]}"
+    # 5/minute per username by default
+    for _ in range(5):
+        response = client.post("/api/login", json={"username": username, "password": "wrong"})
+        assert response.status_code == 401
+
+    response = client.post("/api/login", json={"username": username, "password": "wrong"})
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 60
+
+    # Other usernames from the same address still get through
+    response = client.post("/api/login", json={"username": f"{username}-other", "password": "wrong"})
+    assert response.status_code == 401
+
+
+def test_bucket_refills(monkeypatch):
+    from services import rate_limit
+    from services.rate_limit import TokenBucketLimiter, parse_limit
+
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    limiter = TokenBucketLimiter(*parse_limit("2/minute"))
+
+    assert limiter.hit("key") == 0
+    assert limiter.hit("key") == 0
+    assert limiter.hit("key") == 30
+
+    now[0] += 30
+    assert limiter.hit("key") == 0
+    assert limiter.hit("key") == 30
@@ -0,0 +1,74 @@
+"""
+Stock holds taken at add-to-cart: holding, releasing, expiry and bad quantities
+Run this from the Backend directory: python -m pytest test_reservations.py
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+USER_ID = 424242
+
+
+def _stock(product_id):
+    import models
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        product = db.get(models.Product, product_id)
+        return product.stock, product.reserved
+
+
+def test_hold_and_release(client, product_id):
+    from database import SessionLocal
+    from services.reservations import hold_stock, release_holds
+
+    with SessionLocal() as db:
+        assert hold_stock(db, USER_ID, product_id, 4)
+        assert hold_stock(db, USER_ID, product_id, 3)
+        # Only 3 of the 10 are left to hold
+        assert not hold_stock(db, USER_ID, product_id, 4)
+        db.commit()
+    assert _stock(product_id) == (10, 7)
+
+    with SessionLocal() as db:
+        assert release_holds(db, USER_ID, product_id) == {product_id: 7}
+        assert release_holds(db, USER_ID, product_id) == {}
+        db.commit()
+    assert _stock(product_id) == (10, 0)
+
+
+def test_expired_holds_are_swept(client, product_id):
+    from sqlalchemy import update
+
+    import models
+    from database import SessionLocal
+    from services.reservations import hold_stock, sweep_expired
+
+    with SessionLocal() as db:
+        assert hold_stock(db, USER_ID, product_id, 5)
+        db.execute(
+            update(models.StockReservation)
+            .where(models.StockReservation.product_id == product_id)
+            .values(expires_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+        )
+        db.commit()
+    assert _stock(product_id) == (10, 5)
+
+    assert sweep_expired() >= 1
+    assert _stock(product_id) == (10, 0)
+
+
+@pytest.mark.parametrize("quantity", [0, -1000])
+def test_non_positive_quantities_are_rejected(client, admin_headers, product_id, quantity):
+    from database import SessionLocal
+    from services.reservations import hold_stock, hold_stock_bulk, take_stock
+
+    response = client.post("/api/cart", json={"product_id": product_id, "quantity": quantity}, headers=admin_headers)
+    assert response.status_code == 400
+
+    with SessionLocal() as db:
+        assert not hold_stock(db, USER_ID, product_id, quantity)
+        assert hold_stock_bulk(db, USER_ID, {product_id: quantity}) == {}
+        assert not take_stock(db, product_id, quantity)
+        db.commit()
+    assert _stock(product_id) == (10, 0)
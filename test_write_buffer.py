@@ -0,0 +1,62 @@
+"""
+Write-behind buffer: rows survive a locked database, bad rows are dropped alone
+Run this from the Backend directory: python -m pytest test_write_buffer.py
+"""
+import sqlite3
+import uuid
+
+
+def _buffer():
+    import models
+    from services.write_buffer import WriteBehindBuffer
+
+    return WriteBehindBuffer(models.ContactMessage, flush_interval=0.01, max_backoff=0.05)
+
+
+def _messages(tag):
+    import models
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        return db.query(models.ContactMessage).filter(models.ContactMessage.message == tag).count()
+
+
+def test_rows_are_kept_while_the_database_is_locked(client):
+    buffer = _buffer()
+    tag = uuid.uuid4().hex
+    for name in ("a", "b", "c"):
+        buffer.add({"name": name, "email": "a@b.co", "mobile": "1", "message": tag})
+
+    # Another writer (a backup, a migration) holds the write lock
+    blocker = sqlite3.connect("gaeinova.db")
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        assert buffer.flush() == 0
+    finally:
+        blocker.rollback()
+        blocker.close()
+
+    assert buffer.pending() == 3
+    assert buffer.stats()["dropped_rows"] == 0
+    assert buffer.flush(force=True) == 3
+    assert buffer.pending() == 0
+    assert _messages(tag) == 3
+
+
+def test_only_the_bad_row_is_dropped(client):
+    buffer = _buffer()
+    tag = uuid.uuid4().hex
+    buffer.add({"name": "ok", "email": "a@b.co", "mobile": "1", "message": tag})
+    assert buffer.flush() == 1
+
+    import models
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        taken_id = db.query(models.ContactMessage.id).filter(models.ContactMessage.message == tag).scalar()
+    # The same primary key again fails on its own; its neighbours still go in
+    for row_id, name in ((taken_id + 1000, "first"), (taken_id, "dup"), (taken_id + 1001, "last")):
+        buffer.add({"id": row_id, "name": name, "email": "a@b.co", "mobile": "1", "message": tag})
+    assert buffer.flush() == 2
+    assert buffer.stats()["dropped_rows"] == 1
+    assert _messages(tag) == 3